@@ -1,9 +1,9 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from routes.data.logger import app_logger
 from routes.data.config import get_config
-from routes.db.database import init_db
+from routes.db.database import db, init_db
 
 app_logger.info("=" * 50)
 app_logger.info("Запуск приложения Flask")
@@ -14,55 +14,93 @@ app = Flask(__name__)
 config = get_config()
 app.config.from_object(config)
 
-app_logger.info(f"Конфигурация загружена: {config.__name__}")
-app_logger.info(f"БД: {app.config['SQLALCHEMY_DATABASE_URI']}")
+app_logger.info("Конфигурация загружена: %s", config.__name__)
+app_logger.info("БД: %s", app.config['SQLALCHEMY_DATABASE_URI'])
 
 try:
     init_db(app)
     app_logger.info("SQLAlchemy инициализирована")
 except Exception as e:
-    app_logger.warning(f"Не удалось подключиться к БД: {e}")
+    app_logger.warning("Не удалось подключиться к БД: %s", e)
     app_logger.info("Приложение запустится без БД")
 
-CORS(app, resources={r"/*": {"origins": "*"}})
+CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=['X-Access-Token'])
 app_logger.info("CORS инициализирован")
 
 jwt = JWTManager(app)
 app_logger.info("JWT инициализирован")
 
+from routes.utils.llm_providers import init_providers
+
+init_providers()
+
 from routes.auth import auth_bp
 from routes.assessment import assessment_bp
 from routes.dashboard import dashboard_bp
 from routes.recommendations import recommendations_bp
 from routes.ai import ai_bp
+from routes.ai_manager import ai_manager_bp
+from routes.avatars import avatars_bp
+from routes.admin import admin_bp
 
 app.register_blueprint(auth_bp, url_prefix='/auth')
 app.register_blueprint(assessment_bp, url_prefix='/assessment')
 app.register_blueprint(dashboard_bp, url_prefix='/dashboard')
 app.register_blueprint(recommendations_bp, url_prefix='/recommendations')
 app.register_blueprint(ai_bp, url_prefix='/ai')
+app.register_blueprint(ai_manager_bp, url_prefix='/ai')
+app.register_blueprint(avatars_bp, url_prefix='/avatars')
+app.register_blueprint(admin_bp, url_prefix='/admin')
 
 app_logger.info("Все blueprints зарегистрированы")
 
+from routes.utils import metrics
+from routes.utils.instrumentation import init_metrics
+from routes.utils.tracing import init_tracing
+
+init_metrics(app, db)
+init_tracing(app)
+
+from routes.utils.burnout_batch import score_employees_command
+from routes.utils.employee_import import import_employees_command
+from routes.utils.recommendation_bandit import evaluate_bandit_command
+from routes.utils.org_stats import rebuild_org_stats_command
+from routes.utils.avatars import migrate_avatars_command
+from routes.utils.synthetic_org import generate_org_command
+
+app.cli.add_command(score_employees_command)
+app.cli.add_command(import_employees_command)
+app.cli.add_command(evaluate_bandit_command)
+app.cli.add_command(rebuild_org_stats_command)
+app.cli.add_command(migrate_avatars_command)
+app.cli.add_command(generate_org_command)
+
 # Health check endpoint для Docker
 @app.route('/health', methods=['GET'])
 def health():
     """Проверка здоровья приложения"""
     return jsonify({'status': 'healthy', 'message': 'Application is running'}), 200
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Метрики в текстовом формате Prometheus (все процессы при METRICS_MULTIPROC_DIR)"""
+    if metrics.METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {metrics.METRICS_TOKEN}':
+        return jsonify({'detail': 'Unauthorized'}), 401
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.errorhandler(401)
 def unauthorized(error):
-    app_logger.warning(f"Ошибка авторизации: {error}")
+    app_logger.warning("Ошибка авторизации: %s", error)
     return jsonify({'detail': 'Unauthorized'}), 401
 
 @app.errorhandler(404)
 def not_found(error):
-    app_logger.warning(f"Ресурс не найден: {error}")
+    app_logger.warning("Ресурс не найден: %s", error)
     return jsonify({'detail': 'Not found'}), 404
 
 @app.errorhandler(500)
 def internal_error(error):
-    app_logger.error(f"Внутренняя ошибка сервера: {error}", exc_info=True)
+    app_logger.error("Внутренняя ошибка сервера: %s", error, exc_info=True)
     return jsonify({'detail': 'Internal server error'}), 500
 
 if __name__ == '__main__':
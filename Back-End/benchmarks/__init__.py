@@ -0,0 +1,3 @@
+"""
+Микробенчмарки функций горячего пути (cases) и их запуск с историей результатов (run)
+"""
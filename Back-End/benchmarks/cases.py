@@ -0,0 +1,260 @@
+"""
+Микробенчмарки чистых функций горячего пути: расчёт выгорания, разбор стажа
+и ответов LLM, приоритет и длительность рекомендаций, to_dict моделей.
+
+Входные данные фиксированы (без случайности), чтобы прогоны были сравнимы.
+Каждый бенчмарк — фабрика, которая один раз готовит данные и возвращает
+функцию без аргументов; замеряется только её вызов.
+
+Бенчмарки с sizes прогоняются на нескольких размерах входа: если время на
+элемент растёт с размером, это признак квадратичного алгоритма (см. run.py).
+"""
+import json
+from datetime import datetime
+
+from flask import Flask
+
+from routes.assessment import calculate_burnout_scores
+from routes.burnoutScore import calculate_burnout_score_from_employee, parse_tenure
+from routes.db.database import db
+from routes.db.db_models import (Assessment, DashboardSnapshot, EmployeeData, Metric, OrgUnit,
+                                 Recommendation, User)
+from routes.utils.recommendations_selector import (RECOMMENDATIONS_DB, _get_duration, _get_priority,
+                                                   _parse_ai_response, _parse_batch_ids)
+
+BENCHMARKS = {}
+
+NOW = datetime(2025, 11, 1, 12, 0, 0)
+
+
+def benchmark(name: str, sizes: tuple = None):
+    """Зарегистрировать фабрику бенчмарка; с sizes фабрика принимает размер входа"""
+    def decorator(factory):
+        BENCHMARKS[name] = (factory, sizes)
+        return factory
+    return decorator
+
+
+# --- Входные данные ----------------------------------------------------------
+
+ANSWERS = [
+    {str(i): 0.1 for i in range(11)},
+    {str(i): 0.5 for i in range(11)},
+    {str(i): 0.9 for i in range(11)},
+    {str(i): (i % 4) / 3 for i in range(11)},
+    # Ответы с фронтенда приходят и строками
+    {str(i): str(round(0.35 + i * 0.05, 2)) for i in range(11)},
+]
+
+TENURE_STRINGS = [
+    '5 лет 3 месяца',
+    '1 год',
+    '11 месяцев',
+    '2 года 7 месяцев',
+    '10 лет',
+    '21 год 1 месяц',
+    'меньше года',
+    '3 г. 2 мес.',
+    'Стаж: 4 года и 6 месяцев',
+    '',
+    None,
+]
+
+_TITLES = [rec['title'] for rec in RECOMMENDATIONS_DB]
+_CATEGORIES = sorted({rec['category'] for rec in RECOMMENDATIONS_DB})
+
+AI_REPLIES = [
+    # Structured output: ровно JSON
+    '{"ids": [1, 5, 12, 33, 40]}',
+    # JSON в блоке кода с пояснением
+    'Вот подходящие рекомендации:\n```json\n{"ids": [3, 7, 18, 25, 41, 52]}\n```',
+    # Список без объекта и с лишними значениями
+    '[2, "9", 14, null, 27, 999]',
+    # Модель проигнорировала формат и перечислила названия
+    'Рекомендую следующее:\n'
+    + ''.join(f'{n}. {title}\n' for n, title in enumerate(_TITLES[4:10], start=1))
+    + 'Эти шаги помогут снизить уровень стресса.',
+    # Названия с опечатками и markdown
+    '- **' + _TITLES[0].lower() + '**\n- ' + _TITLES[2].replace('е', 'ё') + '\n- ' + _TITLES[6][:-3] + '\n',
+    # Ни JSON, ни названий
+    'К сожалению, не могу дать рекомендации без дополнительной информации.',
+]
+
+
+def _batch_reply(profiles: int) -> str:
+    return json.dumps({'results': [
+        {'profile': n, 'ids': [(n * 7 + k * 11) % len(RECOMMENDATIONS_DB) + 1 for k in range(6)]}
+        for n in range(1, profiles + 1)
+    ]})
+
+
+def _employee(n: int) -> EmployeeData:
+    positions = ['Курьер', 'Руководитель группы', 'Начальник отдела', 'Специалист', None]
+    trainings = ['завершена', 'в процессе', 'нет', 'не прошла', None]
+    return EmployeeData(
+        id=n,
+        user_id=n,
+        full_name=f'Сотрудник {n}',
+        legal_entity='ООО «Ромашка»',
+        gender='Ж' if n % 2 else 'М',
+        city='Новосибирск',
+        position=positions[n % len(positions)],
+        department='Доставка/Курьеры',
+        tenure=TENURE_STRINGS[n % len(TENURE_STRINGS)],
+        age=25 + n % 30,
+        subordinates='5' if n % 3 == 0 else None,
+        kpi_june=0.8, kpi_july=0.85, kpi_august=0.9, kpi_september=0.75, kpi_october=0.95,
+        attestation='пройдена',
+        training=trainings[n % len(trainings)],
+        last_vacation=datetime(2025, 1 + n % 10, 1 + n % 28) if n % 6 else None,
+        sick_leave='нет',
+        reprimand='нет',
+        corporate_activities='да',
+        burnout_self_assessment='средний',
+    )
+
+
+# --- Расчёт выгорания ----------------------------------------------------------
+
+def _app():
+    """Минимальное приложение с SQLite в памяти: calculate_burnout_scores читает EmployeeData"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, email='bench@example.com', password='x', name='Бенчмарк'))
+        db.session.add(User(id=2, email='bench2@example.com', password='x', name='Бенчмарк 2'))
+        db.session.add(_employee(1))
+        db.session.commit()
+    return app
+
+
+@benchmark('calculate_burnout_scores')
+def _calculate_burnout_scores():
+    app = _app()
+
+    def run():
+        with app.app_context():
+            for n, answers in enumerate(ANSWERS):
+                # user 1 — с данными сотрудника, user 2 — без
+                calculate_burnout_scores(answers, 1 + n % 2)
+    return run
+
+
+@benchmark('calculate_burnout_score_from_employee')
+def _calculate_burnout_score_from_employee():
+    employees = [_employee(n) for n in range(20)]
+    types = ['G', 'S', 'A', 'B', None]
+
+    def run():
+        for n, employee in enumerate(employees):
+            calculate_burnout_score_from_employee(employee, types[n % len(types)], NOW)
+    return run
+
+
+@benchmark('parse_tenure')
+def _parse_tenure():
+    strings = TENURE_STRINGS
+
+    def run():
+        for value in strings:
+            parse_tenure(value)
+    return run
+
+
+@benchmark('parse_tenure.long', sizes=(10, 100))
+def _parse_tenure_long(size: int):
+    text = ' '.join(['1 год 2 месяца'] * size)
+    return lambda: parse_tenure(text)
+
+
+# --- Разбор ответов LLM и свойства рекомендаций --------------------------------
+
+@benchmark('_parse_ai_response')
+def _parse_ai_response_bench():
+    replies = AI_REPLIES
+
+    def run():
+        for reply in replies:
+            _parse_ai_response(reply)
+    return run
+
+
+@benchmark('_parse_ai_response.text', sizes=(10, 100))
+def _parse_ai_response_text(size: int):
+    # Длинный ответ текстом: названия вперемешку с пояснениями
+    lines = []
+    for n in range(size):
+        lines.append(f'{n + 1}. {_TITLES[n % len(_TITLES)]}' if n % 2 else f'Пояснение к пункту {n}: это поможет.')
+    reply = '\n'.join(lines)
+    return lambda: _parse_ai_response(reply)
+
+
+@benchmark('_parse_batch_ids', sizes=(5, 50))
+def _parse_batch_ids_bench(size: int):
+    reply = 'Результат:\n' + _batch_reply(size)
+    return lambda: _parse_batch_ids(reply)
+
+
+@benchmark('_get_priority')
+def _get_priority_bench():
+    titles = _TITLES
+
+    def run():
+        for title in titles:
+            _get_priority(title)
+    return run
+
+
+@benchmark('_get_duration')
+def _get_duration_bench():
+    categories = _CATEGORIES + ['Неизвестная категория']
+
+    def run():
+        for category in categories:
+            _get_duration(category)
+    return run
+
+
+# --- to_dict моделей -----------------------------------------------------------
+
+def _to_dict_benchmark(name: str, make):
+    @benchmark(f'to_dict.{name}')
+    def factory():
+        objects = [make(n) for n in range(50)]
+
+        def run():
+            for obj in objects:
+                obj.to_dict()
+        return run
+    return factory
+
+
+_to_dict_benchmark('User', lambda n: User(
+    id=n, email=f'user{n}@example.com', password='x', name=f'Пользователь {n}', position='Курьер',
+    department='Доставка', join_date=NOW, days_in_system=n, completed_recommendations=n % 7,
+    avatar_hash='ab' * 32 if n % 2 else None,
+))
+_to_dict_benchmark('Assessment', lambda n: Assessment(
+    id=n, user_id=n, date=NOW, burnout_level='medium', score=0.55, emotional_exhaustion=0.5,
+    depersonalization=0.6, reduced_accomplishment=0.55, answers=ANSWERS[n % len(ANSWERS)],
+    recommendations_status='ready',
+))
+_to_dict_benchmark('Recommendation', lambda n: Recommendation(
+    id=n, user_id=n, assessment_id=n, category=RECOMMENDATIONS_DB[n % len(RECOMMENDATIONS_DB)]['category'],
+    title=_TITLES[n % len(_TITLES)], description=RECOMMENDATIONS_DB[n % len(RECOMMENDATIONS_DB)]['description'],
+    priority='high', duration='Ежедневно', completed=bool(n % 2),
+))
+_to_dict_benchmark('Metric', lambda n: Metric(
+    id=n, user_id=n, date='Пн', burnout=0.5, stress=0.4, productivity=0.7,
+))
+_to_dict_benchmark('EmployeeData', _employee)
+_to_dict_benchmark('OrgUnit', lambda n: OrgUnit(
+    id=n, parent_id=n // 2 or None, path=f'ООО «Ромашка»/Отдел {n}', name=f'Отдел {n}', depth=2,
+    critical=n % 5, warning=n % 7, good=n % 11, score_sum=n * 0.5, score_count=n,
+))
+_to_dict_benchmark('DashboardSnapshot', lambda n: DashboardSnapshot(
+    user_id=n, latest_assessment={'id': n, 'score': 0.5}, total_assessments=n,
+    metrics=[{'date': 'Пн', 'burnout': 0.5, 'stress': 0.4, 'productivity': 0.7}] * 7,
+))
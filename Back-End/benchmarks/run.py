@@ -0,0 +1,222 @@
+"""
+Запуск микробенчмарков (benchmarks/cases.py) с историей результатов.
+
+Каждый бенчмарк калибруется так, чтобы один замер длился не меньше --min-time
+секунд, и повторяется --repeat раз; в результат идут минимум и медиана времени
+одного вызова. Результаты дописываются строкой JSON в --history и сравниваются
+с последним сохранённым результатом каждого бенчмарка на той же машине (хост и
+версия Python): бенчмарк, ставший медленнее больше чем на --tolerance, — регрессия.
+
+Бенчмарки на нескольких размерах входа дополнительно проверяются на рост
+времени на элемент: если при увеличении входа в k раз время растёт больше чем
+в k * --max-scaling раз, это ошибка независимо от истории.
+
+Запуск из директории Back-End:
+
+    python -m benchmarks.run
+    python -m benchmarks.run --filter parse --no-save
+    python -m benchmarks.run --tolerance 0.3 --history /tmp/bench-history.jsonl
+
+Код возврата: 0 — ок, 1 — регрессия или нелинейный рост.
+"""
+import os
+
+# Логи бенчмаркируемых функций не должны попадать в замеры
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import argparse
+import datetime
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from .cases import BENCHMARKS
+
+DEFAULT_HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.jsonl')
+
+
+def measure(fn, repeat: int, min_time: float) -> dict:
+    """Время одного вызова fn (нс): калибровка числа вызовов на замер, затем repeat замеров"""
+    loops = 1
+    while True:
+        elapsed = _timed(fn, loops)
+        if elapsed >= min_time * 1e9 or loops >= 10 ** 7:
+            break
+        # Сразу к нужному числу вызовов с запасом, но не больше чем в 10 раз за шаг
+        loops = min(loops * 10, max(loops * 2, int(loops * min_time * 1e9 / max(elapsed, 1) * 1.2)))
+
+    timings = [_timed(fn, loops) / loops for _ in range(repeat)]
+    return {
+        'min': round(min(timings), 1),
+        'median': round(statistics.median(timings), 1),
+        'loops': loops,
+        'repeat': repeat,
+    }
+
+
+def _timed(fn, loops: int) -> int:
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter_ns()
+        for _ in range(loops):
+            fn()
+        return time.perf_counter_ns() - started
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def run_benchmarks(names: list, repeat: int, min_time: float) -> dict:
+    results = {}
+    for name in names:
+        factory, sizes = BENCHMARKS[name]
+        for size in sizes or (None,):
+            key = name if size is None else f'{name}[{size}]'
+            fn = factory() if size is None else factory(size)
+            fn()  # прогрев: ленивые импорты, кэши шаблонов
+            results[key] = measure(fn, repeat, min_time)
+            if size is not None:
+                results[key]['size'] = size
+            print(f"{key:<48} {_format_ns(results[key]['min']):>12} {_format_ns(results[key]['median']):>12}"
+                  f" {results[key]['loops']:>9}")
+    return results
+
+
+def _format_ns(value: float) -> str:
+    if value >= 1e6:
+        return f'{value / 1e6:.2f} ms'
+    if value >= 1e3:
+        return f'{value / 1e3:.2f} µs'
+    return f'{value:.0f} ns'
+
+
+# --- Проверки --------------------------------------------------------------
+
+def check_scaling(results: dict, max_scaling: float) -> list:
+    """Бенчмарки, у которых время на элемент растёт с размером входа больше чем в max_scaling раз"""
+    problems = []
+    by_name = {}
+    for key, item in results.items():
+        if 'size' in item:
+            by_name.setdefault(key.split('[', 1)[0], []).append(item)
+    for name, items in by_name.items():
+        items.sort(key=lambda item: item['size'])
+        small, large = items[0], items[-1]
+        growth = (large['min'] / large['size']) / (small['min'] / small['size'])
+        if growth > max_scaling:
+            problems.append({'benchmark': name, 'sizes': [small['size'], large['size']], 'growth': round(growth, 2)})
+    return problems
+
+
+def compare(results: dict, previous: dict, tolerance: float, metric: str = 'min') -> list:
+    """Бенчмарки, ставшие медленнее предыдущего результата больше чем на tolerance (доля)"""
+    regressions = []
+    for key, item in results.items():
+        before, run_label = previous.get(key, (None, None))
+        if before is None or not before.get(metric):
+            continue
+        ratio = item[metric] / before[metric]
+        if ratio > 1 + tolerance:
+            regressions.append({'benchmark': key, 'before': before[metric], 'after': item[metric],
+                                'ratio': round(ratio, 2), 'run': run_label})
+    return regressions
+
+
+# --- История ---------------------------------------------------------------
+
+def _machine() -> dict:
+    return {'host': platform.node(), 'python': platform.python_version(), 'machine': platform.machine()}
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def previous_results(path: str, machine: dict) -> dict:
+    """Последний сохранённый результат каждого бенчмарка на той же машине: {имя: (результат, прогон)}"""
+    latest = {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get('machine') != machine:
+                    continue
+                run_label = entry.get('commit') or entry.get('createdAt')
+                for key, item in entry.get('results', {}).items():
+                    latest[key] = (item, run_label)
+    except FileNotFoundError:
+        pass
+    return latest
+
+
+def append_history(path: str, machine: dict, results: dict):
+    entry = {
+        'createdAt': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'machine': machine,
+        'results': results,
+    }
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Микробенчмарки функций горячего пути')
+    parser.add_argument('--filter', help='только бенчмарки, в имени которых есть подстрока')
+    parser.add_argument('--repeat', type=int, default=7, help='замеров на бенчмарк')
+    parser.add_argument('--min-time', type=float, default=0.05, help='минимальная длительность замера, секунды')
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help='файл истории (JSON Lines)')
+    parser.add_argument('--no-save', action='store_true', help='не дописывать результат в историю')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='допустимое замедление относительно прошлого прогона')
+    parser.add_argument('--max-scaling', type=float, default=2.0, help='допустимый рост времени на элемент входа')
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if not args.filter or args.filter in name]
+    if not names:
+        print(f'Нет бенчмарков по фильтру {args.filter!r}')
+        return 1
+
+    machine = _machine()
+    previous = previous_results(args.history, machine)
+
+    print(f"{'benchmark':<48} {'min':>12} {'median':>12} {'loops':>9}")
+    results = run_benchmarks(names, args.repeat, args.min_time)
+
+    failed = False
+    for item in check_scaling(results, args.max_scaling):
+        print(f"НЕЛИНЕЙНЫЙ РОСТ: {item['benchmark']} — время на элемент при размерах "
+              f"{item['sizes'][0]} -> {item['sizes'][1]} выросло в {item['growth']} раза")
+        failed = True
+
+    if not previous:
+        print(f'Предыдущих прогонов на этой машине нет ({args.history}), сравнение пропущено')
+    else:
+        regressions = compare(results, previous, args.tolerance)
+        for item in regressions:
+            print(f"РЕГРЕССИЯ: {item['benchmark']} {_format_ns(item['before'])} -> {_format_ns(item['after'])} "
+                  f"(x{item['ratio']}, прогон {item['run']})")
+        if regressions:
+            failed = True
+        else:
+            print(f'Регрессий относительно предыдущих прогонов нет (допуск {args.tolerance:.0%})')
+
+    # Регрессия не записывается в историю: следующий прогон сравнивается с последним хорошим
+    if not args.no_save and not failed:
+        append_history(args.history, machine, results)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
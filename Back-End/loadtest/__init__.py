@@ -0,0 +1,3 @@
+"""
+Нагрузочное тестирование: сценарий пользователя (run) и локальная замена LLM (fake_llm)
+"""
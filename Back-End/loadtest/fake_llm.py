@@ -0,0 +1,373 @@
+"""
+Локальная замена LLM провайдеров для нагрузочного тестирования.
+
+Отвечает в форматах Yandex GPT (/foundationModels/v1/completion), OpenAI
+(/v1/chat/completions) и локального endpoint ({'message'} -> {'reply'}),
+включая потоковые режимы. Задержка ответа — логнормальная (медиана и разброс),
+часть запросов завершается ошибкой 500, 429 или зависает до таймаута клиента.
+
+Запросы с JSON Schema (выбор рекомендаций) получают валидный JSON: ID берутся
+из каталога в промпте, для пачки — по результату на каждый профиль.
+
+Запуск:
+    python -m loadtest.fake_llm --port 8090 --latency 0.3 --error-rate 0.02
+
+Приложение направляется на сервер переменными окружения:
+    YANDEX_GPT_API_KEY=fake YANDEX_GPT_URL=http://127.0.0.1:8090/foundationModels/v1/completion
+    OPENAI_API_KEY=fake OPENAI_URL=http://127.0.0.1:8090/v1/chat/completions
+    LOCAL_LLM_ENDPOINT=http://127.0.0.1:8090/chat
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHAT_REPLIES = (
+    'Попробуйте делать короткие перерывы каждые 90 минут и заранее планировать '
+    'самые сложные задачи на утро.',
+    'Обсудите с руководителем приоритеты на неделю: ясные ожидания снижают '
+    'напряжение лучше, чем сверхурочная работа.',
+    'Старайтесь завершать рабочий день в одно и то же время и не проверять '
+    'рабочую почту вечером.',
+    'Небольшая физическая активность в середине дня помогает восстановить '
+    'концентрацию и снизить усталость.',
+)
+
+_CATALOG_LINE = re.compile(r'^(\d+): .+ \(.+\)$', re.MULTILINE)
+_PROFILE_LINE = re.compile(r'^(\d+)\. уровень выгорания:', re.MULTILINE)
+
+
+class FakeLLMSettings:
+    """Распределения задержек и ошибок; изменяемы на лету через POST /control"""
+
+    def __init__(self, latency: float = 0.3, latency_sigma: float = 0.5, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, timeout_rate: float = 0.0, hang: float = 120.0,
+                 stream_chunks: int = 8, seed: int = None):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.timeout_rate = timeout_rate
+        self.hang = hang
+        self.stream_chunks = stream_chunks
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def update(self, values: dict):
+        for name in ('latency', 'latency_sigma', 'error_rate', 'rate_limit_rate', 'timeout_rate', 'hang'):
+            if name in values:
+                setattr(self, name, float(values[name]))
+        if 'stream_chunks' in values:
+            self.stream_chunks = max(1, int(values['stream_chunks']))
+
+    def to_dict(self) -> dict:
+        return {
+            'latency': self.latency,
+            'latency_sigma': self.latency_sigma,
+            'error_rate': self.error_rate,
+            'rate_limit_rate': self.rate_limit_rate,
+            'timeout_rate': self.timeout_rate,
+            'hang': self.hang,
+            'stream_chunks': self.stream_chunks,
+        }
+
+    def draw(self):
+        """(исход, задержка, случайное число для выбора ответа); исход — ok, error, rate_limit или timeout"""
+        with self._lock:
+            roll = self._random.random()
+            if self.latency > 0:
+                delay = self._random.lognormvariate(math.log(self.latency), self.latency_sigma)
+            else:
+                delay = 0.0
+            choice = self._random.randrange(1 << 30)
+        if roll < self.timeout_rate:
+            return 'timeout', self.hang, choice
+        roll -= self.timeout_rate
+        if roll < self.error_rate:
+            return 'error', delay, choice
+        roll -= self.error_rate
+        if roll < self.rate_limit_rate:
+            return 'rate_limit', delay, choice
+        return 'ok', delay, choice
+
+
+def _prompt_text(messages: list) -> str:
+    return '\n'.join(str(m.get('content') or m.get('text') or '') for m in messages)
+
+
+def build_reply(prompt: str, json_schema: dict = None, choice: int = 0) -> str:
+    """Текст ответа: JSON по схеме выбора рекомендаций или обычный ответ чата"""
+    ids = [int(value) for value in _CATALOG_LINE.findall(prompt)]
+    properties = (json_schema or {}).get('properties', {})
+    wants_batch = 'results' in properties or '"results"' in prompt
+    wants_ids = 'ids' in properties or '"ids"' in prompt
+
+    if ids and wants_batch:
+        profiles = [int(value) for value in _PROFILE_LINE.findall(prompt)] or [1]
+        rng = random.Random(choice)
+        return json.dumps({'results': [
+            {'profile': n, 'ids': rng.sample(ids, min(len(ids), 5))} for n in profiles
+        ]})
+    if ids and wants_ids:
+        return json.dumps({'ids': random.Random(choice).sample(ids, min(len(ids), 5))})
+    return CHAT_REPLIES[choice % len(CHAT_REPLIES)]
+
+
+def _chunks(text: str, count: int) -> list:
+    words = re.findall(r'\S+\s*', text)
+    size = max(1, math.ceil(len(words) / count))
+    return [''.join(words[i:i + size]) for i in range(0, len(words), size)]
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeLLM/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    # --- Ответы ------------------------------------------------------------
+
+    def _send_json(self, status: int, data: dict):
+        body = json.dumps(data, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self, content_type: str):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _write_chunk(self, data: str):
+        body = data.encode()
+        self.wfile.write(f'{len(body):x}\r\n'.encode() + body + b'\r\n')
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return {}
+
+    # --- Маршруты ----------------------------------------------------------
+
+    def do_GET(self):
+        if self.path == '/stats':
+            return self._send_json(200, {'settings': self.server.settings.to_dict(), **self.server.stats()})
+        self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        payload = self._read_json()
+        if self.path == '/control':
+            self.server.settings.update(payload)
+            return self._send_json(200, self.server.settings.to_dict())
+
+        routes = {
+            '/foundationModels/v1/completion': self._yandex,
+            '/v1/chat/completions': self._openai,
+            '/chat': self._local,
+            '/': self._local,
+        }
+        handler = routes.get(self.path)
+        if handler is None:
+            return self._send_json(404, {'error': 'not found'})
+
+        outcome, delay, choice = self.server.settings.draw()
+        self.server.record(self.path, outcome)
+        time.sleep(delay)
+        if outcome == 'timeout':
+            # Клиент к этому моменту уже отвалился по таймауту
+            return self._send_json(504, {'error': 'timeout'})
+        handler(payload, outcome, choice)
+
+    def _yandex(self, payload, outcome, choice):
+        if outcome != 'ok':
+            code = 429 if outcome == 'rate_limit' else 500
+            return self._send_json(code, {'error': {
+                'grpcCode': 8 if code == 429 else 13,
+                'httpCode': code,
+                'message': 'ai.textGenerationCompletionSessionsCount.count gauge quota limit exceed'
+                           if code == 429 else 'Internal error',
+                'httpStatus': 'Too Many Requests' if code == 429 else 'Internal Server Error',
+            }})
+
+        messages = payload.get('messages') or []
+        schema = (payload.get('jsonSchema') or {}).get('schema')
+        prompt = _prompt_text(messages)
+        text = build_reply(prompt, schema, choice)
+        input_tokens, completion_tokens = len(prompt.split()), len(text.split())
+        usage = {'inputTextTokens': str(input_tokens), 'completionTokens': str(completion_tokens),
+                 'totalTokens': str(input_tokens + completion_tokens)}
+
+        def result(current, final):
+            return {'result': {
+                'alternatives': [{
+                    'message': {'role': 'assistant', 'text': current},
+                    'status': 'ALTERNATIVE_STATUS_FINAL' if final else 'ALTERNATIVE_STATUS_PARTIAL',
+                }],
+                'usage': usage,
+                'modelVersion': 'fake',
+            }}
+
+        if not (payload.get('completionOptions') or {}).get('stream'):
+            return self._send_json(200, result(text, True))
+
+        # Потоковый режим Yandex: строки JSON с накопленным текстом
+        self._start_stream('application/json; charset=utf-8')
+        current = ''
+        parts = _chunks(text, self.server.settings.stream_chunks)
+        for i, part in enumerate(parts):
+            current += part
+            self._write_chunk(json.dumps(result(current, i == len(parts) - 1), ensure_ascii=False) + '\n')
+        self._end_stream()
+
+    def _openai(self, payload, outcome, choice):
+        if outcome != 'ok':
+            code = 429 if outcome == 'rate_limit' else 500
+            return self._send_json(code, {'error': {
+                'message': 'Rate limit reached' if code == 429 else 'The server had an error processing your request',
+                'type': 'requests' if code == 429 else 'server_error',
+                'param': None,
+                'code': 'rate_limit_exceeded' if code == 429 else None,
+            }})
+
+        schema = ((payload.get('response_format') or {}).get('json_schema') or {}).get('schema')
+        prompt = _prompt_text(payload.get('messages') or [])
+        text = build_reply(prompt, schema, choice)
+        input_tokens, completion_tokens = len(prompt.split()), len(text.split())
+        model = payload.get('model', 'fake')
+        created = int(time.time())
+
+        if not payload.get('stream'):
+            return self._send_json(200, {
+                'id': f'chatcmpl-fake{choice}',
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': input_tokens, 'completion_tokens': completion_tokens,
+                          'total_tokens': input_tokens + completion_tokens},
+            })
+
+        # Server-Sent Events: дельты текста и завершающий [DONE]
+        self._start_stream('text/event-stream; charset=utf-8')
+        for part in _chunks(text, self.server.settings.stream_chunks):
+            chunk = {'id': f'chatcmpl-fake{choice}', 'object': 'chat.completion.chunk', 'created': created,
+                     'model': model, 'choices': [{'index': 0, 'delta': {'content': part}, 'finish_reason': None}]}
+            self._write_chunk(f'data: {json.dumps(chunk, ensure_ascii=False)}\n\n')
+        self._write_chunk('data: [DONE]\n\n')
+        self._end_stream()
+
+    def _local(self, payload, outcome, choice):
+        if outcome != 'ok':
+            return self._send_json(429 if outcome == 'rate_limit' else 500, {'detail': 'fake error'})
+        self._send_json(200, {'reply': build_reply(str(payload.get('message', '')), None, choice)})
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, settings: FakeLLMSettings):
+        super().__init__(address, FakeLLMHandler)
+        self.settings = settings
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, path: str, outcome: str):
+        with self._lock:
+            key = (path, outcome)
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        requests_by_path = {}
+        for (path, outcome), count in counts.items():
+            requests_by_path.setdefault(path, {})[outcome] = count
+        return {'requests': requests_by_path}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+def start_server(host: str = '127.0.0.1', port: int = 0, **settings) -> FakeLLMServer:
+    """Запустить сервер в фоновом потоке (port=0 — свободный порт); остановка — server.shutdown()"""
+    server = FakeLLMServer((host, port), FakeLLMSettings(**settings))
+    threading.Thread(target=server.serve_forever, name='fake-llm', daemon=True).start()
+    return server
+
+
+def provider_env(url: str, providers: str = 'yandex') -> dict:
+    """Переменные окружения, направляющие LLM провайдеров приложения на сервер url"""
+    return {
+        'YANDEX_GPT_API_KEY': 'fake',
+        'YANDEX_GPT_CATALOG_ID': 'fake',
+        'YANDEX_GPT_URL': f'{url}/foundationModels/v1/completion',
+        'OPENAI_API_KEY': 'fake',
+        'OPENAI_URL': f'{url}/v1/chat/completions',
+        'LOCAL_LLM_ENDPOINT': f'{url}/chat',
+        'LLM_PROVIDERS': providers,
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0.3, help='медиана задержки ответа, секунды')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='sigma логнормального распределения задержки')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='доля ответов 429')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='доля запросов, зависающих на --hang секунд')
+    parser.add_argument('--hang', type=float, default=120.0, help='время зависания, секунды')
+    parser.add_argument('--stream-chunks', type=int, default=8, help='фрагментов в потоковом ответе')
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def settings_from_args(args) -> dict:
+    return {
+        'latency': args.latency,
+        'latency_sigma': args.latency_sigma,
+        'error_rate': args.error_rate,
+        'rate_limit_rate': args.rate_limit_rate,
+        'timeout_rate': args.timeout_rate,
+        'hang': args.hang,
+        'stream_chunks': args.stream_chunks,
+        'seed': args.seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальная замена Yandex GPT / OpenAI для нагрузочных тестов')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeLLMServer((args.host, args.port), FakeLLMSettings(**settings_from_args(args)))
+    print(f'Fake LLM: {server.url}')
+    for name, value in provider_env(server.url).items():
+        print(f'  {name}={value}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Служебные endpoints администратора: профилирование CPU и памяти процесса.
+
+Доступны только при заданном ADMIN_TOKEN (заголовок X-Admin-Token), иначе 404.
+Каждый процесс профилируется отдельно — в ответах есть pid.
+"""
+import hmac
+import os
+from functools import wraps
+
+from flask import Blueprint, Response, g, jsonify, request
+
+from .data.logger import app_logger
+from .utils import profiling
+from .utils.profiling import ProfilingBusyError, ProfilingError
+
+admin_bp = Blueprint('admin', __name__)
+
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+
+def admin_required(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({'detail': 'Not found'}), 404
+        token = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+            app_logger.warning("Отказ в доступе к %s: неверный X-Admin-Token", request.path)
+            return jsonify({'detail': 'Forbidden'}), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def _profile_request():
+    if request.blueprint != 'admin':
+        g.profiling_session = profiling.request_started()
+
+
+def _finish_profiled_request(exc):
+    profiling.request_finished(g.pop('profiling_session', None))
+
+
+# Без ADMIN_TOKEN профилирование недоступно — хуки запросов не регистрируются вовсе
+if ADMIN_TOKEN:
+    admin_bp.before_app_request(_profile_request)
+    admin_bp.teardown_app_request(_finish_profiled_request)
+
+
+def _number(payload, name, cast):
+    value = payload.get(name)
+    if value is None:
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise ProfilingError(f'{name} must be a number')
+
+
+@admin_bp.route('/profiling/cpu', methods=['POST'])
+@admin_required
+def start_cpu_profiling():
+    """
+    Запустить сэмплирующее профилирование CPU.
+
+    Body: {"seconds": 30} — все потоки процесса в течение окна времени, или
+    {"requests": 20} — потоки следующих 20 запросов (не дольше PROFILING_MAX_SECONDS);
+    необязательно "interval" — период сэмплирования в секундах.
+    Результат — GET /admin/profiling/cpu/<id> после завершения.
+    """
+    try:
+        payload = request.get_json(silent=True) or {}
+        session = profiling.start_cpu_session(
+            seconds=_number(payload, 'seconds', float),
+            requests=_number(payload, 'requests', int),
+            interval=_number(payload, 'interval', float),
+        )
+        app_logger.info("Запущено профилирование CPU #%s: %s", session.id, session.mode)
+        return jsonify(session.to_dict()), 202
+    except ProfilingBusyError as e:
+        return jsonify({'detail': str(e)}), 409
+    except ProfilingError as e:
+        return jsonify({'detail': str(e)}), 400
+
+
+@admin_bp.route('/profiling/cpu/<int:session_id>', methods=['GET'])
+@admin_required
+def get_cpu_profile(session_id):
+    """Collapsed stacks завершённой сессии (text/plain); 202 и статус, пока сессия идёт"""
+    session = profiling.get_cpu_session(session_id)
+    if session is None:
+        return jsonify({'detail': 'Profiling session not found'}), 404
+    if not session.done:
+        return jsonify(session.to_dict()), 202
+    return Response(
+        session.profiler.collapsed(),
+        mimetype='text/plain',
+        headers={'Content-Disposition': f'attachment; filename=cpu-{os.getpid()}-{session.id}.collapsed'},
+    )
+
+
+@admin_bp.route('/profiling/cpu/<int:session_id>', methods=['DELETE'])
+@admin_required
+def stop_cpu_profiling(session_id):
+    """Завершить сессию досрочно"""
+    session = profiling.get_cpu_session(session_id)
+    if session is None:
+        return jsonify({'detail': 'Profiling session not found'}), 404
+    profiling.finish_cpu_session(session)
+    return jsonify(session.to_dict()), 200
+
+
+@admin_bp.route('/profiling/memory', methods=['GET'])
+@admin_required
+def get_memory_status():
+    return jsonify(profiling.memory_status()), 200
+
+
+@admin_bp.route('/profiling/memory/start', methods=['POST'])
+@admin_required
+def start_memory_tracing():
+    """Включить tracemalloc; body: {"frames": 10} — глубина сохраняемого стека"""
+    try:
+        frames = _number(request.get_json(silent=True) or {}, 'frames', int)
+        status = profiling.start_memory_tracing(frames or 10)
+        app_logger.info("tracemalloc включён: %s кадров", status['frames'])
+        return jsonify(status), 200
+    except ProfilingError as e:
+        return jsonify({'detail': str(e)}), 400
+
+
+@admin_bp.route('/profiling/memory/stop', methods=['POST'])
+@admin_required
+def stop_memory_tracing():
+    """Выключить tracemalloc и удалить снимки"""
+    app_logger.info("tracemalloc выключен")
+    return jsonify(profiling.stop_memory_tracing()), 200
+
+
+@admin_bp.route('/profiling/memory/snapshots', methods=['POST'])
+@admin_required
+def take_memory_snapshot():
+    try:
+        snapshot_id = profiling.take_snapshot()
+        return jsonify({'id': snapshot_id, **profiling.memory_status()}), 201
+    except ProfilingError as e:
+        return jsonify({'detail': str(e)}), 400
+
+
+@admin_bp.route('/profiling/memory/diff', methods=['GET'])
+@admin_required
+def diff_memory_snapshots():
+    """
+    Рост памяти между снимками.
+
+    Query: from, to — ID снимков (по умолчанию первый сохранённый и новый снимок),
+    group_by=lineno|traceback|filename, limit (по умолчанию 25)
+    """
+    try:
+        args = request.args
+        result = profiling.diff_snapshots(
+            from_id=_number(args, 'from', int),
+            to_id=_number(args, 'to', int),
+            group_by=args.get('group_by', 'lineno'),
+            limit=_number(args, 'limit', int) or 25,
+        )
+        return jsonify(result), 200
+    except ProfilingError as e:
+        return jsonify({'detail': str(e)}), 400
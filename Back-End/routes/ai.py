@@ -1,8 +1,8 @@
-from flask import Blueprint, request, jsonify
-import requests
-import os
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+import json
 
 from .data.logger import ai_logger
+from .utils.llm_providers import LLM_REQUEST_DURATION, complete, stream_complete, chunk_text
 
 ai_bp = Blueprint('ai', __name__)
 
@@ -12,10 +12,12 @@ def chat():
     """
     Endpoint для общения с LLM.
     Порядок приоритета:
-    1) Yandex GPT API (если задан YANDEX_GPT_IAM_TOKEN)
+    1) Yandex GPT API (если задан YANDEX_GPT_API_KEY или YANDEX_GPT_IAM_TOKEN)
     2) OpenAI API (если задан OPENAI_API_KEY)
     3) Локальный endpoint, указанный в LOCAL_LLM_ENDPOINT
     4) Локальная безопасная заглушка (всегда работает)
+    В режимах LLM_MODE=hedge/race провайдеры опрашиваются параллельно
+    (см. routes/utils/llm_providers.py), заглушка — только если не ответил никто.
 
     Ожидает JSON: { "message": "..." }
     Возвращает JSON: { "reply": "..." } с статусом 200
@@ -27,172 +29,78 @@ def chat():
             ai_logger.warning('AI chat: invalid payload')
             return jsonify({'detail': 'Field "message" is required'}), 400
 
-        # 1) Yandex GPT API
-        yandex_api_key = os.environ.get('YANDEX_GPT_API_KEY')
-        yandex_iam_token = os.environ.get('YANDEX_GPT_IAM_TOKEN')
+        reply = complete(message)
+        if reply:
+            return jsonify({'reply': reply}), 200
 
-        if yandex_api_key or yandex_iam_token:
-            try:
-                yandex_model = os.environ.get('YANDEX_GPT_MODEL', 'yandexgpt/latest')
-                yandex_catalog_id = os.environ.get('YANDEX_GPT_CATALOG_ID', '')
-                temperature = float(os.environ.get('YANDEX_GPT_TEMPERATURE', '0.7'))
-                max_tokens = int(os.environ.get('YANDEX_GPT_MAX_TOKENS', '512'))
-
-                headers = {
-                    'Content-Type': 'application/json',
-                    'x-folder-id': yandex_catalog_id,
-                }
-
-                # Используем либо API Key, либо IAM токен (приоритет: API Key)
-                if yandex_api_key:
-                    headers['Authorization'] = f'Api-Key {yandex_api_key}'
-                else:
-                    headers['Authorization'] = f'Bearer {yandex_iam_token}'
-
-                payload = {
-                    'modelUri': f'gpt://{yandex_catalog_id}/{yandex_model}',
-                    'completionOptions': {
-                        'temperature': temperature,
-                        'maxTokens': max_tokens,
-                    },
-                    'messages': [
-                        {
-                            'role': 'user',
-                            'text': message
-                        }
-                    ]
-                }
-
-                ai_logger.info(f'Sending request to Yandex GPT API: model={yandex_model}')
-                resp = requests.post(
-                    'https://llm.api.cloud.yandex.net/foundationModels/v1/completion',
-                    json=payload,
-                    headers=headers,
-                    timeout=60
-                )
-                ai_logger.info(f'Yandex GPT response status: {resp.status_code}')
-
-                if resp.status_code == 200:
-                    try:
-                        response_data = resp.json()
-                        reply = None
-                        if isinstance(response_data, dict):
-                            result = response_data.get('result')
-                            if isinstance(result, dict):
-                                alternatives = result.get('alternatives')
-                                if isinstance(alternatives, list) and len(alternatives) > 0:
-                                    first_alt = alternatives[0]
-                                    if isinstance(first_alt, dict):
-                                        reply = first_alt.get('message', {}).get('text')
-
-                        if reply:
-                            ai_logger.info('Successfully got reply from Yandex GPT')
-                            return jsonify({'reply': reply.strip()}), 200
-                    except Exception as e:
-                        ai_logger.warning(f'Error parsing Yandex GPT response: {e}')
-                else:
-                    ai_logger.warning(f'Yandex GPT returned status {resp.status_code}')
-                    try:
-                        error_data = resp.json()
-                        ai_logger.warning(f'Yandex GPT error: {error_data}')
-                    except:
-                        ai_logger.warning(f'Yandex GPT response: {resp.text}')
-
-                # Fallback к локальной заглушке
-                ai_logger.info('Yandex GPT error or invalid response, falling back to local mock')
-                reply = _local_mock_response(message)
-                return jsonify({'reply': reply}), 200
-
-            except requests.exceptions.Timeout:
-                ai_logger.warning('Timeout contacting Yandex GPT API, using local response')
-                reply = _local_mock_response(message)
-                return jsonify({'reply': reply}), 200
-            except Exception as e:
-                ai_logger.warning(f'Error contacting Yandex GPT API: {e}, using local response')
-                reply = _local_mock_response(message)
-                return jsonify({'reply': reply}), 200
+        # Локальная заглушка — всегда работает
+        ai_logger.info('Using local mock response')
+        reply = _mock_reply(message)
+        return jsonify({'reply': reply}), 200
 
-        # 2) Если указан OpenAI API key
-        openai_key = os.environ.get('OPENAI_API_KEY')
-        if openai_key:
-            try:
-                openai_model = os.environ.get('OPENAI_MODEL', 'gpt-3.5-turbo')
-                temperature = float(os.environ.get('OPENAI_TEMPERATURE', '0.7'))
-                max_tokens = int(os.environ.get('OPENAI_MAX_TOKENS', '512'))
-
-                headers = {
-                    'Authorization': f'Bearer {openai_key}',
-                    'Content-Type': 'application/json'
-                }
-
-                payload = {
-                    'model': openai_model,
-                    'messages': [
-                        {'role': 'user', 'content': message}
-                    ],
-                    'temperature': temperature,
-                    'max_tokens': max_tokens,
-                    'n': 1,
-                }
-
-                ai_logger.info('Sending request to OpenAI API')
-                resp = requests.post('https://api.openai.com/v1/chat/completions', json=payload, headers=headers, timeout=60)
-
-                if resp.status_code == 200:
-                    try:
-                        data = resp.json()
-                        reply = None
-                        if isinstance(data, dict):
-                            choices = data.get('choices')
-                            if isinstance(choices, list) and len(choices) > 0:
-                                msg = choices[0].get('message')
-                                if isinstance(msg, dict):
-                                    reply = msg.get('content')
-
-                        if reply:
-                            ai_logger.info('Successfully got reply from OpenAI')
-                            return jsonify({'reply': reply.strip()}), 200
-                    except Exception as e:
-                        ai_logger.warning(f'Error parsing OpenAI response: {e}')
-
-                # Fallback к локальной заглушке
-                ai_logger.info('OpenAI error or invalid response, falling back to local mock')
-                reply = _local_mock_response(message)
-                return jsonify({'reply': reply}), 200
+    except Exception as e:
+        ai_logger.error('AI chat error: %s', e, exc_info=True)
+        # Даже при ошибке возвращаем 200 с локальной заглушкой
+        reply = _mock_reply("Произошла ошибка при обработке запроса")
+        return jsonify({'reply': reply}), 200
 
-            except Exception as e:
-                ai_logger.warning(f'Error contacting OpenAI API: {e}, using local response')
-                reply = _local_mock_response(message)
-                return jsonify({'reply': reply}), 200
 
-        # 3) Попытка форварда на локальный LLM endpoint
-        local_endpoint = os.environ.get('LOCAL_LLM_ENDPOINT')
-        if local_endpoint:
+@ai_bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Потоковый вариант /ai/chat (Server-Sent Events).
+    Фрагменты ответа отправляются по мере генерации провайдером; если провайдеры
+    не настроены или не ответили, фрагментами отдаётся локальная заглушка.
+
+    Ожидает JSON: { "message": "..." }
+    События:
+        data: {"delta": "..."}              — очередной фрагмент
+        event: done / data: {"reply": "..."} — полный ответ, конец потока
+    """
+    data = request.get_json(force=True, silent=True)
+    message = (data or {}).get('message')
+    if not message or not isinstance(message, str):
+        ai_logger.warning('AI chat stream: invalid payload')
+        return jsonify({'detail': 'Field "message" is required'}), 400
+
+    def generate():
+        parts = []
+        chunks = stream_complete(message)
+        try:
             try:
-                ai_logger.info(f'Sending request to local endpoint: {local_endpoint}')
-                resp = requests.post(local_endpoint, json={'message': message}, timeout=30)
-                if resp.status_code == 200:
-                    try:
-                        payload = resp.json()
-                        reply = payload.get('reply') if isinstance(payload, dict) else None
-                        if reply:
-                            ai_logger.info('Successfully got reply from local LLM endpoint')
-                            return jsonify({'reply': reply}), 200
-                    except Exception as e:
-                        ai_logger.warning(f'Error parsing local LLM response: {e}')
+                for chunk in chunks:
+                    parts.append(chunk)
+                    yield _sse({'delta': chunk})
             except Exception as e:
-                ai_logger.warning(f'Error contacting local LLM endpoint: {e}')
+                ai_logger.error('AI chat stream error: %s', e, exc_info=True)
 
-        # 4) Локальная заглушка — всегда работает
-        ai_logger.info('Using local mock response')
-        reply = _local_mock_response(message)
-        return jsonify({'reply': reply}), 200
+            if not parts:
+                ai_logger.info('Using local mock response (stream)')
+                for chunk in chunk_text(_mock_reply(message, 'stream')):
+                    parts.append(chunk)
+                    yield _sse({'delta': chunk})
 
-    except Exception as e:
-        ai_logger.error(f'AI chat error: {e}', exc_info=True)
-        # Даже при ошибке возвращаем 200 с локальной заглушкой
-        reply = _local_mock_response("Произошла ошибка при обработке запроса")
-        return jsonify({'reply': reply}), 200
+            yield _sse({'reply': ''.join(parts).strip()}, event='done')
+        except GeneratorExit:
+            ai_logger.info('AI chat stream: client disconnected')
+            raise
+        finally:
+            chunks.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
+
+def _sse(payload: dict, event: str = None) -> str:
+    """Сформировать одно событие Server-Sent Events"""
+    prefix = f'event: {event}\n' if event else ''
+    return f'{prefix}data: {json.dumps(payload, ensure_ascii=False)}\n\n'
 
 
 def _extract_hf_reply(response_data) -> str:
@@ -224,6 +132,12 @@ def _extract_hf_reply(response_data) -> str:
     return reply.strip() if reply else None
 
 
+def _mock_reply(message: str, mode: str = 'complete') -> str:
+    """Ответ локальной заглушки с учётом в метриках LLM (provider="mock")"""
+    with LLM_REQUEST_DURATION.time('mock', mode, 'ok'):
+        return _local_mock_response(message)
+
+
 def _local_mock_response(message: str) -> str:
     """
     Простая эвристическая генерация ответа (локальная заглушка).
@@ -3,8 +3,9 @@ API endpoints для AI рекомендаций менеджеру
 """
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from .utils.ai import generate_manager_recommendations, generate_recommendations_groq
+from .utils.ai import generate_manager_recommendations, generate_recommendations_groq, manager_recommendations_stats
 from .data.logger import app_logger
+from .utils.org_stats import get_unit
 
 ai_manager_bp = Blueprint('ai_manager', __name__)
 
@@ -23,6 +24,7 @@ def get_manager_recommendations():
         "total": 5,
         "avg_burnout": 60
     }
+    или {"unit_id": 12} — статистика берётся из узла оргструктуры на сервере
 
     Returns:
     {
@@ -32,18 +34,30 @@ def get_manager_recommendations():
     """
     try:
         user_id = get_jwt_identity()
-        data = request.get_json()
-
-        # Валидация данных
-        team_stats = {
-            'critical': data.get('critical', 0),
-            'warning': data.get('warning', 0),
-            'good': data.get('good', 0),
-            'total': data.get('total', 0),
-            'avg_burnout': data.get('avg_burnout', 0),
-        }
-
-        app_logger.info(f"Генерация рекомендаций для менеджера {user_id}: {team_stats}")
+        data = request.get_json() or {}
+
+        if data.get('unit_id') is not None:
+            unit_id = data['unit_id']
+            if isinstance(unit_id, str) and unit_id.strip().isdigit():
+                unit_id = int(unit_id)
+            if not isinstance(unit_id, int) or isinstance(unit_id, bool):
+                return jsonify({'error': 'unit_id must be an integer'}), 400
+            unit = get_unit(unit_id)
+            if not unit:
+                return jsonify({'error': 'Узел оргструктуры не найден'}), 404
+            unit_stats = unit.to_dict()
+            team_stats = {key: unit_stats[key] for key in ('critical', 'warning', 'good', 'total', 'avg_burnout')}
+        else:
+            # Валидация данных
+            team_stats = {
+                'critical': data.get('critical', 0),
+                'warning': data.get('warning', 0),
+                'good': data.get('good', 0),
+                'total': data.get('total', 0),
+                'avg_burnout': data.get('avg_burnout', 0),
+            }
+
+        app_logger.info("Генерация рекомендаций для менеджера %s: %s", user_id, team_stats)
 
         # Генерация рекомендаций через Yandex GPT
         recommendations = generate_manager_recommendations(team_stats)
@@ -55,7 +69,7 @@ def get_manager_recommendations():
         }), 200
 
     except Exception as e:
-        app_logger.error(f"Ошибка при генерации рекомендаций: {str(e)}")
+        app_logger.error("Ошибка при генерации рекомендаций: %s", e)
         return jsonify({'error': 'Ошибка генерации рекомендаций'}), 500
 
 
@@ -85,5 +99,24 @@ def get_manager_recommendations_groq():
         }), 200
 
     except Exception as e:
-        app_logger.error(f"Ошибка Yandex GPT API: {str(e)}")
+        app_logger.error("Ошибка Yandex GPT API: %s", e)
         return jsonify({'error': 'Ошибка генерации рекомендаций'}), 500
+
+
+@ai_manager_bp.route('/manager-recommendations/stats', methods=['GET'])
+@jwt_required()
+def get_manager_recommendations_stats():
+    """
+    Метрики кэша и объединения одинаковых запросов рекомендаций менеджеру
+
+    Returns:
+    {
+        "cache": {"hits": ..., "misses": ..., "hit_rate": ...},
+        "singleFlight": {"calls": ..., "coalesced": ..., "in_flight": ...}
+    }
+    """
+    try:
+        return jsonify(manager_recommendations_stats()), 200
+    except Exception as e:
+        app_logger.error("Ошибка при получении метрик рекомендаций менеджеру: %s", e)
+        return jsonify({'error': 'Ошибка получения метрик'}), 500
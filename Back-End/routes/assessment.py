@@ -3,16 +3,35 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from .db.db_models import Assessment, User, Recommendation, EmployeeData
 from .db.database import db
 from .data.logger import assessment_logger
-from .utils.recommendations_selector import get_ai_recommendations
-from .burnoutScore import calculate_burnout_score_from_employee
+from .utils.recommendations_selector import request_ai_recommendations, recommendation_bandit
+from .utils.background import submit_task, submit_when_done
+from .utils.org_stats import record_assessment
+from .utils import dashboard_snapshot, tracing
+from .utils.pagination import ListParamsError, count_total, field, filter_date_range, keyset_page, parse_fields
+from .burnoutScore import calculate_burnout_score_from_employee, BURNOUT_LEVEL_TO_TYPE
 import psycopg2
 from sqlalchemy import exc as sa_exc
 from datetime import datetime
 
 assessment_bp = Blueprint('assessment', __name__)
 
-def calculate_burnout_scores(answers, user_id):
-    """Рассчитывает показатели выгорания на основе ответов и данных сотрудника"""
+# Поля истории диагностик для ?fields= (те же ключи, что в Assessment.to_dict)
+ASSESSMENT_FIELDS = {
+    'id': field(Assessment.id),
+    'userId': field(Assessment.user_id),
+    'date': field(Assessment.date, lambda value: value.strftime('%Y-%m-%d')),
+    'timestamp': field(Assessment.date, lambda value: value.isoformat() + 'Z'),
+    'burnoutLevel': field(Assessment.burnout_level),
+    'score': field(Assessment.score),
+    'emotionalExhaustion': field(Assessment.emotional_exhaustion),
+    'depersonalization': field(Assessment.depersonalization),
+    'reducedAccomplishment': field(Assessment.reduced_accomplishment),
+    'answers': field(Assessment.answers),
+    'recommendationsStatus': field(Assessment.recommendations_status),
+}
+
+def score_answers(answers):
+    """Баллы по группам вопросов, итоговый балл и уровень выгорания только по ответам"""
     professional_activity = [0, 1, 2, 3, 4]
     professional_score = sum(float(answers.get(str(i), 0)) for i in professional_activity) / len(professional_activity)
 
@@ -31,33 +50,39 @@ def calculate_burnout_scores(answers, user_id):
     else:
         burnout_level = 'low'
 
+    return {
+        'professionalActivityScore': round(professional_score, 2),
+        'mentalStabilityScore': round(mental_score, 2),
+        'emotionalAttitudeScore': round(emotional_score, 2),
+        'score': round(total_score, 2),
+        'burnoutLevel': burnout_level,
+    }
+
+def calculate_burnout_scores(answers, user_id):
+    """Рассчитывает показатели выгорания на основе ответов и данных сотрудника"""
+    scores = score_answers(answers)
+    burnout_level = scores['burnoutLevel']
+
     employee_burnout_score = None
     try:
-        employee_data = EmployeeData.query.filter_by(user_id=user_id).first()
+        with tracing.span('assessment.employee_lookup'):
+            employee_data = EmployeeData.query.filter_by(user_id=user_id).first()
         if employee_data:
-            burnout_type_mapping = {
-                'low': 'G',
-                'medium': 'S',
-                'high': 'A'
-            }
-            burnout_type = burnout_type_mapping.get(burnout_level, 'G')
-            employee_burnout_score = calculate_burnout_score_from_employee(
-                employee_data,
-                burnout_type,
-                datetime.utcnow()
-            )
-            assessment_logger.info(f"Рассчитан score для сотрудника: {employee_burnout_score}")
+            burnout_type = BURNOUT_LEVEL_TO_TYPE.get(burnout_level, 'G')
+            with tracing.span('assessment.employee_score'):
+                employee_burnout_score = calculate_burnout_score_from_employee(
+                    employee_data,
+                    burnout_type,
+                    datetime.utcnow()
+                )
+            assessment_logger.info("Рассчитан score для сотрудника: %s", employee_burnout_score)
     except Exception as e:
-        assessment_logger.warning(f"Не удалось рассчитать score из EmployeeData: {e}")
+        assessment_logger.warning("Не удалось рассчитать score из EmployeeData: %s", e)
         employee_burnout_score = None
 
     return {
-        'professionalActivityScore': round(professional_score, 2),
-        'mentalStabilityScore': round(mental_score, 2),
-        'emotionalAttitudeScore': round(emotional_score, 2),
-        'score': round(total_score, 2),
+        **scores,
         'employeeBurnoutScore': round(employee_burnout_score, 2) if employee_burnout_score else None,
-        'burnoutLevel': burnout_level,
     }
 
 ASSESSMENT_QUESTIONS = [
@@ -148,7 +173,7 @@ def get_questions():
             'total': len(ASSESSMENT_QUESTIONS),
         }), 200
     except Exception as e:
-        assessment_logger.error(f"Ошибка при получении вопросов: {str(e)}", exc_info=True)
+        assessment_logger.error("Ошибка при получении вопросов: %s", e, exc_info=True)
         return jsonify({'detail': str(e)}), 500
 
 @assessment_bp.route('/submit', methods=['POST'])
@@ -160,36 +185,38 @@ def submit_assessment():
         user_id = int(user_id_str)
         data = request.get_json()
 
-        assessment_logger.info(f"Получена диагностика от пользователя ID: {user_id}")
+        assessment_logger.info("Получена диагностика от пользователя ID: %s", user_id)
 
         if not data or 'answers' not in data:
-            assessment_logger.warning(f"Диагностика без ответов от пользователя ID: {user_id}")
+            assessment_logger.warning("Диагностика без ответов от пользователя ID: %s", user_id)
             return jsonify({'detail': 'Answers are required'}), 400
 
         answers = data.get('answers')
 
         if len(answers) != len(ASSESSMENT_QUESTIONS):
-            assessment_logger.warning(f"Неполные ответы от пользователя ID: {user_id}. Получено: {len(answers)}, ожидается: {len(ASSESSMENT_QUESTIONS)}")
+            assessment_logger.warning("Неполные ответы от пользователя ID: %s. Получено: %s, ожидается: %s", user_id, len(answers), len(ASSESSMENT_QUESTIONS))
             return jsonify({'detail': f'Expected {len(ASSESSMENT_QUESTIONS)} answers'}), 400
 
         for answer_id, answer_value in answers.items():
             try:
                 val = float(answer_value)
                 if not (0 <= val <= 1):
-                    assessment_logger.warning(f"Ответ вне диапазона 0-1 для вопроса {answer_id}: {val}")
+                    assessment_logger.warning("Ответ вне диапазона 0-1 для вопроса %s: %s", answer_id, val)
                     return jsonify({'detail': f'Answer for question {answer_id} must be between 0 and 1'}), 400
             except (ValueError, TypeError):
-                assessment_logger.warning(f"Некорректный ответ для вопроса {answer_id}: {answer_value}")
+                assessment_logger.warning("Некорректный ответ для вопроса %s: %s", answer_id, answer_value)
                 return jsonify({'detail': f'Answer for question {answer_id} must be a number between 0 and 1'}), 400
 
-        user = User.query.get(user_id)
+        with tracing.span('assessment.user_lookup'):
+            user = User.query.get(user_id)
         if not user:
-            assessment_logger.warning(f"Пользователь ID: {user_id} не найден")
+            assessment_logger.warning("Пользователь ID: %s не найден", user_id)
             return jsonify({'detail': 'User not found'}), 404
 
-        scores = calculate_burnout_scores(answers, user_id)
+        with tracing.span('assessment.scores'):
+            scores = calculate_burnout_scores(answers, user_id)
 
-        assessment_logger.info(f"Диагностика обработана для пользователя ID: {user_id}. Уровень выгорания: {scores['burnoutLevel']}, Балл: {scores['score']}")
+        assessment_logger.info("Диагностика обработана для пользователя ID: %s. Уровень выгорания: %s, Балл: %s", user_id, scores['burnoutLevel'], scores['score'])
 
         new_assessment = Assessment(
             user_id=user_id,
@@ -198,81 +225,163 @@ def submit_assessment():
             emotional_exhaustion=scores['professionalActivityScore'],
             depersonalization=scores['mentalStabilityScore'],
             reduced_accomplishment=scores['emotionalAttitudeScore'],
-            answers=answers
+            answers=answers,
+            recommendations_status='pending'
         )
 
-        db.session.add(new_assessment)
-        db.session.flush()
-
-        assessment_logger.info(f"Диагностика сохранена. ID диагностики: {new_assessment.id}")
+        with tracing.span('assessment.insert'):
+            db.session.add(new_assessment)
+            db.session.flush()
+
+        try:
+            with tracing.span('assessment.org_stats'), db.session.begin_nested():
+                record_assessment(user, scores['burnoutLevel'], scores['score'])
+        except Exception as e:
+            assessment_logger.warning("Не удалось обновить статистику оргструктуры для пользователя ID: %s: %s", user_id, e)
+
+        try:
+            with tracing.span('assessment.dashboard_snapshot'), db.session.begin_nested():
+                dashboard_snapshot.record_assessment(new_assessment)
+        except Exception as e:
+            # Снимок — производные данные: диагностика сохраняется, снимок пересчитается при чтении
+            assessment_logger.warning("Не удалось обновить снимок дашборда для пользователя ID: %s: %s", user_id, e)
+            dashboard_snapshot.invalidate(user_id)
+
+        with tracing.span('assessment.commit'):
+            db.session.commit()
+
+        assessment_logger.info("Диагностика сохранена. ID диагностики: %s", new_assessment.id)
+
+        try:
+            with tracing.span('assessment.enqueue_recommendations'):
+                submit_task(generate_assessment_recommendations, new_assessment.id, user_id, scores)
+        except Exception as e:
+            assessment_logger.error("Не удалось запустить генерацию рекомендаций для диагностики ID: %s: %s", new_assessment.id, e, exc_info=True)
+            new_assessment.recommendations_status = 'failed'
+            dashboard_snapshot.update_recommendations_status(user_id, new_assessment.id, 'failed')
+            db.session.commit()
+
+        with tracing.span('assessment.serialize'):
+            response = jsonify({
+                **new_assessment.to_dict(),
+                'professionalActivityScore': scores['professionalActivityScore'],
+                'mentalStabilityScore': scores['mentalStabilityScore'],
+                'emotionalAttitudeScore': scores['emotionalAttitudeScore'],
+                'employeeBurnoutScore': scores['employeeBurnoutScore'],
+                'recommendations': [],
+                'recommendationsCount': 0
+            })
+        return response, 201
 
-        assessment_logger.info(f"Запрашиваю рекомендации для пользователя ID: {user_id}")
+    except (psycopg2.OperationalError, sa_exc.OperationalError) as db_error:
+        db.session.rollback()
+        assessment_logger.error("Ошибка подключения к БД: %s", db_error, exc_info=True)
+        return jsonify({'detail': 'Database connection error'}), 503
+    except Exception as e:
+        db.session.rollback()
+        assessment_logger.error("Ошибка при сохранении диагностики: %s", e, exc_info=True)
+        return jsonify({'detail': str(e)}), 500
 
-        recommended_items = get_ai_recommendations(
-            burnout_level=scores['burnoutLevel'],
-            emotional_exhaustion=scores['professionalActivityScore'],
-            depersonalization=scores['mentalStabilityScore'],
-            reduced_accomplishment=scores['emotionalAttitudeScore'],
-            employee_burnout_score=scores['employeeBurnoutScore']
-        )
+def generate_assessment_recommendations(assessment_id, user_id, scores):
+    """
+    Фоновая генерация рекомендаций для сохранённой диагностики: запрос выбора
+    рекомендаций без ожидания ответа, запись — отдельной задачей по готовности
+    """
+    assessment_logger.info("Запрашиваю рекомендации для пользователя ID: %s, диагностика ID: %s", user_id, assessment_id)
 
-        for rec_data in recommended_items:
-            new_recommendation = Recommendation(
-                user_id=user_id,
-                category=rec_data['category'],
-                title=rec_data['title'],
-                description=rec_data['description'],
-                priority=rec_data.get('priority', 'medium'),
-                duration=rec_data.get('duration', ''),
+    try:
+        with tracing.span('recommendations.user_lookup'):
+            user = User.query.get(user_id)
+        department = user.department if user else None
+
+        with tracing.span('recommendations.select'):
+            selection = request_ai_recommendations(
+                burnout_level=scores['burnoutLevel'],
+                emotional_exhaustion=scores['professionalActivityScore'],
+                depersonalization=scores['mentalStabilityScore'],
+                reduced_accomplishment=scores['emotionalAttitudeScore'],
+                employee_burnout_score=scores['employeeBurnoutScore'],
+                department=department
             )
-            db.session.add(new_recommendation)
+        submit_when_done(selection, save_assessment_recommendations, assessment_id, user_id,
+                         scores['burnoutLevel'], department)
 
-        db.session.commit()
-
-        assessment_logger.info(f"Сохранено {len(recommended_items)} рекомендаций для пользователя ID: {user_id}")
+    except Exception as e:
+        _mark_recommendations_failed(assessment_id, user_id, e)
 
-        return jsonify({
-            **new_assessment.to_dict(),
-            'professionalActivityScore': scores['professionalActivityScore'],
-            'mentalStabilityScore': scores['mentalStabilityScore'],
-            'emotionalAttitudeScore': scores['emotionalAttitudeScore'],
-            'employeeBurnoutScore': scores['employeeBurnoutScore'],
-            'recommendations': [r.to_dict() for r in recommended_items],
-            'recommendationsCount': len(recommended_items)
-        }), 201
+def save_assessment_recommendations(selection, assessment_id, user_id, burnout_level, department):
+    """Запись выбранных рекомендаций (selection — Future из request_ai_recommendations)"""
+    try:
+        recommended_items = selection.result()
+
+        with tracing.span('recommendations.insert', count=len(recommended_items)):
+            for rec_data in recommended_items:
+                new_recommendation = Recommendation(
+                    user_id=user_id,
+                    assessment_id=assessment_id,
+                    category=rec_data['category'],
+                    title=rec_data['title'],
+                    description=rec_data['description'],
+                    priority=rec_data.get('priority', 'medium'),
+                    duration=rec_data.get('duration', ''),
+                )
+                db.session.add(new_recommendation)
+            db.session.flush()
+
+        Assessment.query.filter_by(id=assessment_id).update({'recommendations_status': 'ready'})
+        dashboard_snapshot.update_recommendations_status(user_id, assessment_id, 'ready')
+        with tracing.span('recommendations.commit'):
+            db.session.commit()
+
+        recommendation_bandit.record_impressions(burnout_level, department,
+                                                 [rec_data['title'] for rec_data in recommended_items])
+
+        assessment_logger.info("Сохранено %s рекомендаций для пользователя ID: %s", len(recommended_items), user_id)
 
-    except (psycopg2.OperationalError, sa_exc.OperationalError) as db_error:
-        db.session.rollback()
-        assessment_logger.error(f"Ошибка подключения к БД: {str(db_error)}", exc_info=True)
-        return jsonify({'detail': 'Database connection error'}), 503
     except Exception as e:
-        db.session.rollback()
-        assessment_logger.error(f"Ошибка при сохранении диагностики: {str(e)}", exc_info=True)
-        return jsonify({'detail': str(e)}), 500
+        _mark_recommendations_failed(assessment_id, user_id, e)
+
+def _mark_recommendations_failed(assessment_id, user_id, error):
+    db.session.rollback()
+    assessment_logger.error("Ошибка генерации рекомендаций для диагностики ID: %s: %s", assessment_id, error, exc_info=True)
+    Assessment.query.filter_by(id=assessment_id).update({'recommendations_status': 'failed'})
+    dashboard_snapshot.update_recommendations_status(user_id, assessment_id, 'failed')
+    db.session.commit()
 
 @assessment_bp.route('/history', methods=['GET'])
 @jwt_required()
 def get_assessment_history():
-    """Получить историю диагностик пользователя"""
+    """
+    Получить историю диагностик пользователя (от новых к старым, постранично).
+
+    Query: limit, cursor (nextCursor предыдущей страницы), fields=id,date,score,...,
+    from / to (YYYY-MM-DD или ISO 8601)
+    """
     try:
         user_id_str = get_jwt_identity()
         user_id = int(user_id_str)
 
-        assessment_logger.info(f"Запрос истории диагностик для пользователя ID: {user_id}")
+        assessment_logger.info("Запрос истории диагностик для пользователя ID: %s", user_id)
 
-        assessments = Assessment.query.filter_by(user_id=user_id).order_by(
-            Assessment.date.desc()
-        ).all()
+        selected = parse_fields(request.args, ASSESSMENT_FIELDS)
+        query = filter_date_range(Assessment.query.filter_by(user_id=user_id), Assessment.date, request.args)
+        assessments, next_cursor = keyset_page(query, Assessment.date, Assessment.id,
+                                               ASSESSMENT_FIELDS, selected, request.args)
 
-        assessment_logger.info(f"Найдено {len(assessments)} диагностик для пользователя ID: {user_id}")
+        assessment_logger.info("Найдено %s диагностик для пользователя ID: %s", len(assessments), user_id)
 
         return jsonify({
-            'assessments': [a.to_dict() for a in assessments],
-            'total': len(assessments),
+            'assessments': assessments,
+            'total': count_total(query, assessments, request.args),
+            'nextCursor': next_cursor,
         }), 200
 
+    except ListParamsError as e:
+        assessment_logger.warning("Некорректные параметры истории диагностик: %s", e)
+        return jsonify({'detail': str(e)}), 400
+
     except Exception as e:
-        assessment_logger.error(f"Ошибка при получении истории: {str(e)}", exc_info=True)
+        assessment_logger.error("Ошибка при получении истории: %s", e, exc_info=True)
         return jsonify({'detail': str(e)}), 500
 
 @assessment_bp.route('/<int:assessment_id>', methods=['GET'])
@@ -283,7 +392,7 @@ def get_assessment(assessment_id):
         user_id_str = get_jwt_identity()
         user_id = int(user_id_str)
 
-        assessment_logger.info(f"Запрос деталей диагностики ID: {assessment_id} для пользователя ID: {user_id}")
+        assessment_logger.info("Запрос деталей диагностики ID: %s для пользователя ID: %s", assessment_id, user_id)
 
         assessment = Assessment.query.filter_by(
             id=assessment_id,
@@ -291,12 +400,47 @@ def get_assessment(assessment_id):
         ).first()
 
         if not assessment:
-            assessment_logger.warning(f"Диагностика ID: {assessment_id} не найдена для пользователя ID: {user_id}")
+            assessment_logger.warning("Диагностика ID: %s не найдена для пользователя ID: %s", assessment_id, user_id)
             return jsonify({'detail': 'Assessment not found'}), 404
 
-        assessment_logger.info(f"Диагностика ID: {assessment_id} найдена")
+        assessment_logger.info("Диагностика ID: %s найдена", assessment_id)
         return jsonify(assessment.to_dict()), 200
 
     except Exception as e:
-        assessment_logger.error(f"Ошибка при получении диагностики: {str(e)}", exc_info=True)
+        assessment_logger.error("Ошибка при получении диагностики: %s", e, exc_info=True)
+        return jsonify({'detail': str(e)}), 500
+
+@assessment_bp.route('/<int:assessment_id>/recommendations', methods=['GET'])
+@jwt_required()
+def get_assessment_recommendations(assessment_id):
+    """Получить статус генерации и рекомендации по диагностике"""
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+
+        assessment = Assessment.query.filter_by(
+            id=assessment_id,
+            user_id=user_id
+        ).first()
+
+        if not assessment:
+            assessment_logger.warning("Диагностика ID: %s не найдена для пользователя ID: %s", assessment_id, user_id)
+            return jsonify({'detail': 'Assessment not found'}), 404
+
+        recommendations = []
+        if assessment.recommendations_status == 'ready':
+            recommendations = Recommendation.query.filter_by(
+                assessment_id=assessment_id,
+                user_id=user_id
+            ).all()
+
+        return jsonify({
+            'assessmentId': assessment_id,
+            'status': assessment.recommendations_status,
+            'recommendations': [r.to_dict() for r in recommendations],
+            'total': len(recommendations),
+        }), 200
+
+    except Exception as e:
+        assessment_logger.error("Ошибка при получении рекомендаций диагностики: %s", e, exc_info=True)
         return jsonify({'detail': str(e)}), 500
@@ -1,8 +1,10 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from .db.db_models import User
 from .db.database import db
 from .data.logger import auth_logger
+from .utils.avatars import AvatarError, decode_avatar, store_avatar
+from .utils.profile_cache import PROFILE_VERSION_CLAIM, attach_token, get_profile, issue_token
 import psycopg2
 import sqlalchemy
 
@@ -17,7 +19,7 @@ def register():
         required_fields = ['email', 'password', 'name', 'position', 'department']
         for field in required_fields:
             if not data.get(field):
-                auth_logger.warning(f"Ошибка регистрации: отсутствует поле {field}")
+                auth_logger.warning("Ошибка регистрации: отсутствует поле %s", field)
                 return jsonify({'detail': f'Field "{field}" is required'}), 400
 
         email = data.get('email').lower().strip()
@@ -28,11 +30,11 @@ def register():
 
         existing_user = User.query.filter_by(email=email).first()
         if existing_user:
-            auth_logger.warning(f"Попытка регистрации с существующим email: {email}")
+            auth_logger.warning("Попытка регистрации с существующим email: %s", email)
             return jsonify({'detail': 'Email already registered'}), 409
 
         if len(password) < 6:
-            auth_logger.warning(f"Попытка регистрации с коротким паролем для {email}")
+            auth_logger.warning("Попытка регистрации с коротким паролем для %s", email)
             return jsonify({'detail': 'Password must be at least 6 characters'}), 400
 
         new_user = User(
@@ -48,9 +50,9 @@ def register():
         db.session.add(new_user)
         db.session.commit()
 
-        auth_logger.info(f"Новый пользователь зарегистрирован: {email} (ID: {new_user.id})")
+        auth_logger.info("Новый пользователь зарегистрирован: %s (ID: %s)", email, new_user.id)
 
-        access_token = create_access_token(identity=str(new_user.id))
+        access_token = issue_token(new_user)
 
         return jsonify({
             'access_token': access_token,
@@ -63,7 +65,7 @@ def register():
             db.session.rollback()
         except Exception:
             pass
-        auth_logger.error(f"Ошибка подключения к БД при регистрации: {e}", exc_info=True)
+        auth_logger.error("Ошибка подключения к БД при регистрации: %s", e, exc_info=True)
         return jsonify({'detail': 'Service unavailable (database)'}), 503
 
     except Exception as e:
@@ -71,7 +73,7 @@ def register():
             db.session.rollback()
         except Exception:
             pass
-        auth_logger.error(f"Ошибка при регистрации: {str(e)}", exc_info=True)
+        auth_logger.error("Ошибка при регистрации: %s", e, exc_info=True)
         return jsonify({'detail': str(e)}), 500
 
 @auth_bp.route('/token', methods=['POST'])
@@ -86,21 +88,21 @@ def login():
             username = request.form.get('username') or request.form.get('email')
             password = request.form.get('password')
 
-        auth_logger.info(f"Попытка входа для пользователя: {username}")
+        auth_logger.info("Попытка входа для пользователя: %s", username)
 
         if not username or not password:
-            auth_logger.warning(f"Ошибка входа: отсутствуют учетные данные для {username}")
+            auth_logger.warning("Ошибка входа: отсутствуют учетные данные для %s", username)
             return jsonify({'detail': 'Email and password are required'}), 400
 
         user = User.query.filter_by(email=username.lower().strip()).first()
 
         if not user or user.password != password:
-            auth_logger.warning(f"Неверные учетные данные для пользователя: {username}")
+            auth_logger.warning("Неверные учетные данные для пользователя: %s", username)
             return jsonify({'detail': 'Invalid email or password'}), 401
 
-        access_token = create_access_token(identity=str(user.id))
+        access_token = issue_token(user)
 
-        auth_logger.info(f"Пользователь {username} (ID: {user.id}) успешно авторизован")
+        auth_logger.info("Пользователь %s (ID: %s) успешно авторизован", username, user.id)
 
         return jsonify({
             'access_token': access_token,
@@ -109,11 +111,11 @@ def login():
         }), 200
 
     except (psycopg2.OperationalError, sqlalchemy.exc.OperationalError) as e:
-        auth_logger.error(f"Ошибка подключения к БД при авторизации: {e}", exc_info=True)
+        auth_logger.error("Ошибка подключения к БД при авторизации: %s", e, exc_info=True)
         return jsonify({'detail': 'Service unavailable (database)'}), 503
 
     except Exception as e:
-        auth_logger.error(f"Ошибка при авторизации: {str(e)}", exc_info=True)
+        auth_logger.error("Ошибка при авторизации: %s", e, exc_info=True)
         return jsonify({'detail': str(e)}), 500
 
 @auth_bp.route('/verify', methods=['GET'])
@@ -125,24 +127,24 @@ def verify_token():
         user_id = get_jwt_identity()
         user_id_int = int(user_id)
 
-        user = User.query.get(user_id_int)
+        profile = get_profile(user_id_int, get_jwt().get(PROFILE_VERSION_CLAIM))
 
-        if not user:
-            auth_logger.warning(f"Пользователь не найден по ID: {user_id}")
+        if profile is None:
+            auth_logger.warning("Пользователь не найден по ID: %s", user_id)
             return jsonify({'detail': 'User not found'}), 404
 
         return jsonify({
             'valid': True,
             'user_id': user_id,
-            'user': user.to_dict()
+            'user': profile
         }), 200
 
     except (psycopg2.OperationalError, sqlalchemy.exc.OperationalError) as e:
-        auth_logger.error(f"Ошибка подключения к БД при проверке токена: {e}", exc_info=True)
+        auth_logger.error("Ошибка подключения к БД при проверке токена: %s", e, exc_info=True)
         return jsonify({'detail': 'Service unavailable (database)'}), 503
 
     except Exception as e:
-        auth_logger.error(f"Ошибка при проверке токена: {str(e)}", exc_info=True)
+        auth_logger.error("Ошибка при проверке токена: %s", e, exc_info=True)
         return jsonify({'detail': str(e)}), 500
 
 @auth_bp.route('/me', methods=['GET'])
@@ -154,21 +156,110 @@ def get_current_user():
         user_id = get_jwt_identity()
         user_id_int = int(user_id)
 
-        auth_logger.info(f"Запрос данных пользователя ID: {user_id_int}")
+        auth_logger.info("Запрос данных пользователя ID: %s", user_id_int)
+
+        profile = get_profile(user_id_int, get_jwt().get(PROFILE_VERSION_CLAIM))
+
+        if profile is None:
+            auth_logger.warning("Пользователь не найден по ID: %s", user_id_int)
+            return jsonify({'detail': 'User not found'}), 404
+
+        auth_logger.info("Пользователь ID: %s найден", user_id_int)
+        return jsonify(profile), 200
+
+    except (psycopg2.OperationalError, sqlalchemy.exc.OperationalError) as e:
+        auth_logger.error("Ошибка подключения к БД при получении пользователя: %s", e, exc_info=True)
+        return jsonify({'detail': 'Service unavailable (database)'}), 503
+
+    except Exception as e:
+        auth_logger.error("Ошибка при получении пользователя: %s", e, exc_info=True)
+        return jsonify({'detail': str(e)}), 500
+
+@auth_bp.route('/me/avatar', methods=['PUT'])
+@jwt_required()
+def upload_avatar():
+    """
+    Загрузить аватар текущего пользователя: multipart (поле "avatar") или
+    JSON {"avatar": "data:image/png;base64,..."}. Возвращает данные пользователя с URL аватара
+    и новый токен в заголовке X-Access-Token.
+    """
+    try:
+        user_id_int = int(get_jwt_identity())
 
         user = User.query.get(user_id_int)
+        if not user:
+            auth_logger.warning("Пользователь не найден по ID: %s", user_id_int)
+            return jsonify({'detail': 'User not found'}), 404
 
+        upload = request.files.get('avatar')
+        if upload is not None:
+            data = upload.read()
+        else:
+            payload = request.get_json(silent=True) or {}
+            if not payload.get('avatar'):
+                return jsonify({'detail': 'Field "avatar" is required'}), 400
+            data = decode_avatar(payload['avatar'])
+
+        avatar = store_avatar(data)
+        user.avatar_hash = avatar.hash
+        user.avatar = None
+        db.session.commit()
+
+        auth_logger.info("Аватар пользователя ID: %s обновлён: %s", user_id_int, avatar.hash[:12])
+        return attach_token(jsonify(user.to_dict()), user), 200
+
+    except AvatarError as e:
+        db.session.rollback()
+        auth_logger.warning("Некорректный аватар: %s", e)
+        return jsonify({'detail': str(e)}), 400
+
+    except (psycopg2.OperationalError, sqlalchemy.exc.OperationalError) as e:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        auth_logger.error("Ошибка подключения к БД при загрузке аватара: %s", e, exc_info=True)
+        return jsonify({'detail': 'Service unavailable (database)'}), 503
+
+    except Exception as e:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        auth_logger.error("Ошибка при загрузке аватара: %s", e, exc_info=True)
+        return jsonify({'detail': str(e)}), 500
+
+@auth_bp.route('/me/avatar', methods=['DELETE'])
+@jwt_required()
+def delete_avatar():
+    """Удалить аватар текущего пользователя (новый токен — в заголовке X-Access-Token)"""
+    try:
+        user_id_int = int(get_jwt_identity())
+
+        user = User.query.get(user_id_int)
         if not user:
-            auth_logger.warning(f"Пользователь не найден по ID: {user_id_int}")
+            auth_logger.warning("Пользователь не найден по ID: %s", user_id_int)
             return jsonify({'detail': 'User not found'}), 404
 
-        auth_logger.info(f"Пользователь ID: {user_id_int} найден")
-        return jsonify(user.to_dict()), 200
+        user.avatar_hash = None
+        user.avatar = None
+        db.session.commit()
+
+        auth_logger.info("Аватар пользователя ID: %s удалён", user_id_int)
+        return attach_token(jsonify(user.to_dict()), user), 200
 
     except (psycopg2.OperationalError, sqlalchemy.exc.OperationalError) as e:
-        auth_logger.error(f"Ошибка подключения к БД при получении пользователя: {e}", exc_info=True)
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        auth_logger.error("Ошибка подключения к БД при удалении аватара: %s", e, exc_info=True)
         return jsonify({'detail': 'Service unavailable (database)'}), 503
 
     except Exception as e:
-        auth_logger.error(f"Ошибка при получении пользователя: {str(e)}", exc_info=True)
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        auth_logger.error("Ошибка при удалении аватара: %s", e, exc_info=True)
         return jsonify({'detail': str(e)}), 500
@@ -0,0 +1,57 @@
+"""
+Раздача аватаров по хэшу содержимого
+"""
+from flask import Blueprint, jsonify, request, make_response
+from .db.db_models import Avatar
+from .db.database import db
+from .data.logger import app_logger
+import psycopg2
+from sqlalchemy import exc as sa_exc
+
+avatars_bp = Blueprint('avatars', __name__)
+
+# Содержимое по хэшу не меняется: кэшировать можно «навсегда»
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def _send_image(digest, etag, column, type_column):
+    """Изображение со строгим ETag; при совпадении If-None-Match — 304 без чтения BLOB"""
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        row = db.session.query(column, type_column).filter(Avatar.hash == digest).first()
+        if row is None:
+            return jsonify({'detail': 'Avatar not found'}), 404
+        response = make_response(row[0])
+        response.headers['Content-Type'] = row[1]
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+@avatars_bp.route('/<string:digest>', methods=['GET'])
+def get_avatar(digest):
+    """Оригинал аватара"""
+    try:
+        return _send_image(digest, digest, Avatar.data, Avatar.content_type)
+    except (psycopg2.OperationalError, sa_exc.OperationalError) as e:
+        app_logger.error("Ошибка подключения к БД при получении аватара: %s", e, exc_info=True)
+        return jsonify({'detail': 'Service unavailable (database)'}), 503
+    except Exception as e:
+        app_logger.error("Ошибка при получении аватара: %s", e, exc_info=True)
+        return jsonify({'detail': str(e)}), 500
+
+
+@avatars_bp.route('/<string:digest>/thumb', methods=['GET'])
+def get_avatar_thumbnail(digest):
+    """Миниатюра аватара"""
+    try:
+        return _send_image(digest, f'{digest}-thumb', Avatar.thumbnail, Avatar.thumb_content_type)
+    except (psycopg2.OperationalError, sa_exc.OperationalError) as e:
+        app_logger.error("Ошибка подключения к БД при получении аватара: %s", e, exc_info=True)
+        return jsonify({'detail': 'Service unavailable (database)'}), 503
+    except Exception as e:
+        app_logger.error("Ошибка при получении аватара: %s", e, exc_info=True)
+        return jsonify({'detail': str(e)}), 500
@@ -4,6 +4,13 @@ from .db.db_models import EmployeeData
 
 DEFAULT_CURRENT_DATE = datetime.utcnow()
 
+# Соответствие уровня выгорания по диагностике типу выгорания сотрудника
+BURNOUT_LEVEL_TO_TYPE = {
+    'low': 'G',
+    'medium': 'S',
+    'high': 'A'
+}
+
 def normalize_type(burnout_type: Optional[str]) -> float:
     mapping = {'G': 0, 'S': 0.3, 'A': 0.7, 'B': 1}
     if burnout_type is None:
@@ -1,38 +1,61 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from .db.db_models import Metric, Assessment, User
+from .db.db_models import Metric, OrgUnit
 from .data.logger import dashboard_logger
+from .utils.org_stats import get_unit
+from .utils.dashboard_snapshot import get_summary as get_dashboard_summary
+from .utils.pagination import ListParamsError, count_total, field, filter_date_range, keyset_page, parse_fields
 import psycopg2
 from sqlalchemy import exc as sa_exc
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
+# Поля метрик для ?fields= (те же ключи, что в Metric.to_dict)
+METRIC_FIELDS = {
+    'date': field(Metric.date),
+    'burnout': field(Metric.burnout),
+    'stress': field(Metric.stress),
+    'productivity': field(Metric.productivity),
+}
+
 @dashboard_bp.route('/metrics', methods=['GET'])
 @jwt_required()
 def get_metrics():
-    """Получить метрики дашборда"""
+    """
+    Получить метрики дашборда: последние limit записей в хронологическом порядке.
+
+    Query: limit, cursor (более ранние метрики), fields=date,burnout,..., from / to
+    """
     try:
         user_id_str = get_jwt_identity()
         user_id = int(user_id_str)
 
-        dashboard_logger.info(f"Запрос метрик для пользователя ID: {user_id}")
+        dashboard_logger.info("Запрос метрик для пользователя ID: %s", user_id)
 
-        metrics = Metric.query.filter_by(user_id=user_id).all()
+        selected = parse_fields(request.args, METRIC_FIELDS)
+        query = filter_date_range(Metric.query.filter_by(user_id=user_id), Metric.created_at, request.args)
+        metrics, next_cursor = keyset_page(query, Metric.created_at, Metric.id, METRIC_FIELDS, selected,
+                                           request.args, chronological=True)
 
-        dashboard_logger.info(f"Найдено {len(metrics)} метрик для пользователя ID: {user_id}")
+        dashboard_logger.info("Найдено %s метрик для пользователя ID: %s", len(metrics), user_id)
 
         return jsonify({
-            'metrics': [m.to_dict() for m in metrics],
+            'metrics': metrics,
             'period': 'week',
-            'total': len(metrics),
+            'total': count_total(query, metrics, request.args),
+            'nextCursor': next_cursor,
         }), 200
 
+    except ListParamsError as e:
+        dashboard_logger.warning("Некорректные параметры метрик: %s", e)
+        return jsonify({'detail': str(e)}), 400
+
     except (psycopg2.OperationalError, sa_exc.OperationalError) as e:
-        dashboard_logger.error(f"Ошибка подключения к БД при получении метрик: {e}", exc_info=True)
+        dashboard_logger.error("Ошибка подключения к БД при получении метрик: %s", e, exc_info=True)
         return jsonify({'detail': 'Service unavailable (database)'}), 503
 
     except Exception as e:
-        dashboard_logger.error(f"Ошибка при получении метрик: {str(e)}", exc_info=True)
+        dashboard_logger.error("Ошибка при получении метрик: %s", e, exc_info=True)
         return jsonify({'detail': str(e)}), 500
 
 @dashboard_bp.route('/summary', methods=['GET'])
@@ -43,39 +66,55 @@ def get_summary():
         user_id_str = get_jwt_identity()
         user_id = int(user_id_str)
 
-        dashboard_logger.info(f"Запрос сводки дашборда для пользователя ID: {user_id}")
+        dashboard_logger.info("Запрос сводки дашборда для пользователя ID: %s", user_id)
 
-        user = User.query.get(user_id)
-        if not user:
-            dashboard_logger.warning(f"Пользователь ID: {user_id} не найден")
+        summary = get_dashboard_summary(user_id)
+        if summary is None:
+            dashboard_logger.warning("Пользователь ID: %s не найден", user_id)
             return jsonify({'detail': 'User not found'}), 404
 
-        latest_assessment = Assessment.query.filter_by(user_id=user_id).order_by(
-            Assessment.date.desc()
-        ).first()
+        latest_assessment = summary['latestAssessment']
+        if latest_assessment:
+            dashboard_logger.info("Последняя диагностика для пользователя ID: %s - уровень: %s, балл: %s", user_id, latest_assessment['burnoutLevel'], latest_assessment['score'])
+        else:
+            dashboard_logger.info("Нет диагностик для пользователя ID: %s", user_id)
+
+        return jsonify(summary), 200
 
-        all_assessments = Assessment.query.filter_by(user_id=user_id).all()
+    except (psycopg2.OperationalError, sa_exc.OperationalError) as e:
+        dashboard_logger.error("Ошибка подключения к БД при получении сводки: %s", e, exc_info=True)
+        return jsonify({'detail': 'Service unavailable (database)'}), 503
 
-        metrics = Metric.query.filter_by(user_id=user_id).all()
+    except Exception as e:
+        dashboard_logger.error("Ошибка при получении сводки: %s", e, exc_info=True)
+        return jsonify({'detail': str(e)}), 500
 
-        summary = {
-            'latestAssessment': None,
-            'metrics': [m.to_dict() for m in metrics],
-            'totalAssessments': len(all_assessments),
-        }
+@dashboard_bp.route('/org', methods=['GET'])
+@dashboard_bp.route('/org/<int:unit_id>', methods=['GET'])
+@jwt_required()
+def get_org_unit_stats(unit_id=None):
+    """
+    Статистика выгорания по узлу оргструктуры (без unit_id — вся организация).
+    Агрегаты поддерева хранятся в узле, поэтому ответ не зависит от числа сотрудников.
+    ?children=true — добавить статистику дочерних узлов.
+    """
+    try:
+        unit = get_unit(unit_id)
+        if not unit:
+            dashboard_logger.warning("Узел оргструктуры ID: %s не найден", unit_id)
+            return jsonify({'detail': 'Org unit not found'}), 404
 
-        if latest_assessment:
-            summary['latestAssessment'] = latest_assessment.to_dict()
-            dashboard_logger.info(f"Последняя диагностика для пользователя ID: {user_id} - уровень: {latest_assessment.burnout_level}, балл: {latest_assessment.score}")
-        else:
-            dashboard_logger.info(f"Нет диагностик для пользователя ID: {user_id}")
+        result = unit.to_dict()
+        if request.args.get('children', '').lower() in ('1', 'true', 'yes'):
+            children = OrgUnit.query.filter_by(parent_id=unit.id).order_by(OrgUnit.name).all()
+            result['children'] = [child.to_dict() for child in children]
 
-        return jsonify(summary), 200
+        return jsonify(result), 200
 
     except (psycopg2.OperationalError, sa_exc.OperationalError) as e:
-        dashboard_logger.error(f"Ошибка подключения к БД при получении сводки: {e}", exc_info=True)
+        dashboard_logger.error("Ошибка подключения к БД при получении статистики оргструктуры: %s", e, exc_info=True)
         return jsonify({'detail': 'Service unavailable (database)'}), 503
 
     except Exception as e:
-        dashboard_logger.error(f"Ошибка при получении сводки: {str(e)}", exc_info=True)
+        dashboard_logger.error("Ошибка при получении статистики оргструктуры: %s", e, exc_info=True)
         return jsonify({'detail': str(e)}), 500
@@ -22,10 +22,13 @@ class Config:
     DB_PASSWORD = os.getenv('DB_PASSWORD')
     DB_NAME = os.getenv('DB_NAME')
 
-    # SQLAlchemy
-    SQLALCHEMY_DATABASE_URI = f'postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+    # SQLAlchemy (DATABASE_URL задаёт строку подключения целиком, например sqlite:///load.db)
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL') or f'postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ECHO = True  # Логирование SQL запросов
+    SQLALCHEMY_ECHO = os.getenv('SQLALCHEMY_ECHO', 'false').lower() in ('1', 'true', 'yes')  # Логирование SQL запросов
+
+    # Фоновая генерация рекомендаций
+    RECOMMENDATIONS_WORKERS = int(os.getenv('RECOMMENDATIONS_WORKERS', 4))
 
 class DevelopmentConfig(Config):
     """Конфигурация для разработки"""
@@ -1,62 +1,254 @@
+"""
+Логирование приложения.
+
+Логгеры пишут записи в очередь (QueueHandler), а форматирование и запись в
+файлы/консоль выполняет отдельный поток QueueListener — рабочий поток запроса
+только кладёт запись в очередь. Сообщения — в %-стиле (logger.info("... %s", x)),
+строка собирается уже в потоке записи.
+
+Настройки окружения:
+    LOG_LEVEL, LOG_LEVEL_<ИМЯ> — уровень всех логгеров / отдельного (LOG_LEVEL_AUTH=WARNING)
+    LOG_CONSOLE_LEVEL — уровень вывода в консоль
+    LOG_FORMAT — text или json (одна JSON-запись на строку)
+    LOG_SAMPLE_RATE, LOG_SAMPLE_RATE_<ИМЯ> — доля записываемых DEBUG/INFO записей
+    LOG_DUPLICATE_WINDOW, LOG_DUPLICATE_BURST — не больше BURST одинаковых сообщений
+        (по шаблону) за WINDOW секунд; число подавленных пишется в следующую запись
+    LOG_QUEUE_SIZE — размер очереди; при переполнении записи отбрасываются
+"""
+import atexit
+import json
 import logging
 import logging.handlers
 import os
+import queue
+import random
+import threading
+import time
 from datetime import datetime
 
 LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
 if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
 
-# Настройка логирования
-def setup_logger(name):
-    """Настроить логгер с файловым и консольным выводом"""
-    logger = logging.getLogger(name)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_CONSOLE_LEVEL = os.getenv('LOG_CONSOLE_LEVEL', LOG_LEVEL).upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+LOG_DUPLICATE_WINDOW = float(os.getenv('LOG_DUPLICATE_WINDOW', '10'))
+LOG_DUPLICATE_BURST = int(os.getenv('LOG_DUPLICATE_BURST', '50'))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
 
-    # Очищаем существующие handlers, если логгер уже был настроен
-    if logger.handlers:
-        for handler in logger.handlers[:]:
-            logger.removeHandler(handler)
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(funcName)s:%(lineno)d] - %(message)s'
 
-    logger.setLevel(logging.DEBUG)
-    logger.propagate = False
 
-    # Формат логов
-    log_format = '%(asctime)s - %(name)s - %(levelname)s - [%(funcName)s:%(lineno)d] - %(message)s'
-    formatter = logging.Formatter(log_format)
-
-    # Обработчик для файлов (ротация по размеру)
-    log_file = os.path.join(LOG_DIR, f'{name}.log')
-    try:
-        file_handler = logging.handlers.RotatingFileHandler(
-            log_file,
-            maxBytes=10*1024*1024,  # 10MB
-            backupCount=5,
-            encoding='utf-8'
-        )
-        file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-    except Exception as e:
-        # Пытаемся создать обработчик в текущей директории как fallback
+class TextFormatter(logging.Formatter):
+    """Текстовый формат; к записи добавляется число подавленных повторов"""
+
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            text += f' [подавлено повторов: {suppressed}]'
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """Структурированный формат: одна JSON-запись на строку"""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'func': record.funcName,
+            'line': record.lineno,
+            'thread': record.threadName,
+        }
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            payload['suppressed'] = suppressed
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class HotMessageFilter(logging.Filter):
+    """
+    Сэмплирование DEBUG/INFO и подавление повторов одного шаблона сообщения
+    DEBUG/INFO. WARNING и выше пишутся всегда: под одним шаблоном у них разные
+    аргументы (ID, текст ошибки), и каждая запись нужна для разбора.
+    Работает в потоке запроса, поэтому только считает — без форматирования.
+    """
+
+    MAX_KEYS = 10000
+
+    def __init__(self, sample_rate: float = 1.0, window: float = 10, burst: int = 50):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.window = window
+        self.burst = burst
+        self._windows = {}  # (logger, level, шаблон) -> [начало окна, записано, подавлено]
+        self._lock = threading.Lock()
+        self.sampled_out = 0
+        self.suppressed = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return False
+        if self.window <= 0 or self.burst <= 0:
+            return True
+
+        key = (record.name, record.levelno, record.msg if isinstance(record.msg, str) else type(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                if len(self._windows) >= self.MAX_KEYS:
+                    self._windows.clear()
+                record.suppressed = state[2] if state is not None else 0
+                self._windows[key] = [now, 1, 0]
+                return True
+            if state[1] < self.burst:
+                state[1] += 1
+                return True
+            state[2] += 1
+            self.suppressed += 1
+            return False
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler без форматирования в потоке запроса и без блокировки при переполнении"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Очередь внутри процесса: запись передаётся как есть, сообщение собирает
+        # форматтер в потоке QueueListener
+        return record
+
+    def enqueue(self, record):
         try:
-            fallback_log_file = os.path.join(os.getcwd(), f'{name}.log')
-            file_handler = logging.handlers.RotatingFileHandler(
-                fallback_log_file,
-                maxBytes=10*1024*1024,
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _RouteHandler(logging.Handler):
+    """Передаёт запись файловому обработчику её логгера"""
+
+    def __init__(self):
+        super().__init__()
+        self.handlers = {}
+
+    def emit(self, record):
+        handler = self.handlers.get(record.name)
+        if handler is not None and record.levelno >= handler.level:
+            handler.handle(record)
+
+
+def _make_formatter():
+    return JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter(TEXT_FORMAT)
+
+
+def _make_file_handler(name):
+    for directory in (LOG_DIR, os.getcwd()):
+        try:
+            handler = logging.handlers.RotatingFileHandler(
+                os.path.join(directory, f'{name}.log'),
+                maxBytes=10*1024*1024,  # 10MB
                 backupCount=5,
                 encoding='utf-8'
             )
-        except:
+        except OSError:
+            continue
+        handler.setFormatter(_make_formatter())
+        return handler
+    return None
+
+
+_router = _RouteHandler()
+_console_handler = logging.StreamHandler()
+_console_handler.setLevel(LOG_CONSOLE_LEVEL)
+_console_handler.setFormatter(_make_formatter())
+
+_queue_handlers = {}
+_listener = None
+
+
+def _start_listener():
+    """Запустить поток записи (заново — в дочернем процессе после fork)"""
+    global _listener
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    for handler in _queue_handlers.values():
+        handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, _router, _console_handler, respect_handler_level=True)
+    _listener.start()
+    return log_queue
+
+
+def _stop_listener():
+    if _listener is not None and _listener._thread is not None:
+        try:
+            _listener.stop()
+        except queue.Full:
             pass
 
-    # Обработчик для консоли
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.DEBUG)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+
+def _logger_setting(prefix, name, default):
+    return os.getenv(f'{prefix}_{name.upper()}', default)
+
+
+def setup_logger(name):
+    """Настроить логгер: запись в очередь, вывод в файл logs/<name>.log и консоль в отдельном потоке"""
+    logger = logging.getLogger(name)
+
+    # Очищаем существующие handlers, если логгер уже был настроен
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+
+    logger.setLevel(_logger_setting('LOG_LEVEL', name, LOG_LEVEL).upper())
+    logger.propagate = False
+
+    file_handler = _make_file_handler(name)
+    if file_handler is not None:
+        _router.handlers[name] = file_handler
+
+    queue_handler = _QueueHandler(_listener.queue)
+    queue_handler.addFilter(HotMessageFilter(
+        sample_rate=float(_logger_setting('LOG_SAMPLE_RATE', name, LOG_SAMPLE_RATE)),
+        window=LOG_DUPLICATE_WINDOW,
+        burst=LOG_DUPLICATE_BURST,
+    ))
+    _queue_handlers[name] = queue_handler
+    logger.addHandler(queue_handler)
 
     return logger
 
+
+def logging_stats() -> dict:
+    """Счётчики логирования по логгерам: отброшено при переполнении, отсэмплировано, подавлено"""
+    stats = {}
+    for name, handler in _queue_handlers.items():
+        hot_filter = handler.filters[0]
+        stats[name] = {
+            'dropped': handler.dropped,
+            'sampled_out': hot_filter.sampled_out,
+            'suppressed': hot_filter.suppressed,
+        }
+    return {'queue_size': _listener.queue.qsize(), 'loggers': stats}
+
+
+_start_listener()
+atexit.register(_stop_listener)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_start_listener)
+
 # Главные логгеры приложения
 app_logger = setup_logger('app')
 auth_logger = setup_logger('auth')
@@ -68,5 +260,5 @@ ai_logger = setup_logger('ai')
 # Проверка инициализации
 app_logger.info("=" * 50)
 app_logger.info("Логирование инициализировано успешно")
-app_logger.info(f"Директория логов: {LOG_DIR}")
+app_logger.info("Директория логов: %s", LOG_DIR)
 app_logger.info("=" * 50)
@@ -3,9 +3,25 @@ ORM модели для SQLAlchemy
 """
 from .database import db
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, JSON, Index, LargeBinary
 from sqlalchemy.orm import relationship
 
+
+def _not_postgresql(ddl, target, bind, dialect=None, **kw):
+    return dialect.name != 'postgresql'
+
+
+def _keyset_index(name, user_column, sort_column, id_column):
+    """
+    Индекс под порядок курсорной пагинации (sort DESC NULLS LAST, id DESC, см. utils/pagination).
+    В PostgreSQL — с тем же порядком; в SQLite NULLS LAST в индексе не поддерживается,
+    а при DESC NULL и так идут последними, поэтому обычный индекс.
+    """
+    return (
+        Index(name, user_column, sort_column.desc().nulls_last(), id_column.desc()).ddl_if(dialect='postgresql'),
+        Index(name, user_column, sort_column, id_column).ddl_if(callable_=_not_postgresql),
+    )
+
 class User(db.Model):
     """Модель пользователя"""
     __tablename__ = 'users'
@@ -19,7 +35,9 @@ class User(db.Model):
     join_date = Column(DateTime, default=datetime.utcnow)
     days_in_system = Column(Integer, default=0)
     completed_recommendations = Column(Integer, default=0)
-    avatar = Column(Text, nullable=True)
+    avatar = Column(Text, nullable=True)  # устаревшее: base64 внутри строки, см. migrate-avatars
+    avatar_hash = Column(String(64), ForeignKey('avatars.hash'), nullable=True)
+    profile_version = Column(Integer, nullable=False, default=1)  # версия профиля в JWT, см. utils/profile_cache
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -27,6 +45,7 @@ class User(db.Model):
     assessments = relationship('Assessment', back_populates='user', cascade='all, delete-orphan')
     recommendations = relationship('Recommendation', back_populates='user', cascade='all, delete-orphan')
     employee_data = relationship('EmployeeData', back_populates='user', uselist=False, cascade='all, delete-orphan')
+    dashboard_snapshot = relationship('DashboardSnapshot', uselist=False, cascade='all, delete-orphan')
 
     def to_dict(self):
         """Преобразование объекта в словарь"""
@@ -39,13 +58,30 @@ class User(db.Model):
             'joinDate': self.join_date.strftime('%Y-%m-%d') if self.join_date else None,
             'daysInSystem': self.days_in_system,
             'completedRecommendations': self.completed_recommendations,
-            'avatar': self.avatar,
+            'avatar': f'/avatars/{self.avatar_hash}' if self.avatar_hash else None,
+            'avatarThumb': f'/avatars/{self.avatar_hash}/thumb' if self.avatar_hash else None,
         }
 
     def __repr__(self):
         return f'<User {self.email}>'
 
 
+class Avatar(db.Model):
+    """Изображение аватара, адресуемое SHA-256 содержимого (одинаковые файлы хранятся один раз)"""
+    __tablename__ = 'avatars'
+
+    hash = Column(String(64), primary_key=True)
+    content_type = Column(String(50), nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    thumb_content_type = Column(String(50), nullable=False)
+    thumbnail = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Avatar {self.hash[:12]}>'
+
+
 class Assessment(db.Model):
     """Модель диагностики (оценки выгорания)"""
     __tablename__ = 'assessments'
@@ -59,11 +95,15 @@ class Assessment(db.Model):
     depersonalization = Column(Float, nullable=False)
     reduced_accomplishment = Column(Float, nullable=False)
     answers = Column(JSON, nullable=False)  # Ответы на вопросы (словарь)
+    recommendations_status = Column(String(20), nullable=False, default='ready')  # pending, ready, failed
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Связь
     user = relationship('User', back_populates='assessments')
 
+    # Курсорная пагинация истории: WHERE user_id = ? AND (date, id) < (?, ?) ORDER BY date DESC NULLS LAST, id DESC
+    __table_args__ = _keyset_index('ix_assessments_user_date_id', user_id, date, id)
+
     def to_dict(self):
         """Преобразование объекта в словарь"""
         return {
@@ -77,6 +117,7 @@ class Assessment(db.Model):
             'depersonalization': self.depersonalization,
             'reducedAccomplishment': self.reduced_accomplishment,
             'answers': self.answers,
+            'recommendationsStatus': self.recommendations_status,
         }
 
     def __repr__(self):
@@ -89,6 +130,7 @@ class Recommendation(db.Model):
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    assessment_id = Column(Integer, ForeignKey('assessments.id'), nullable=True, index=True)
     category = Column(String(100), nullable=False)
     title = Column(String(255), nullable=False)
     description = Column(Text, nullable=False)
@@ -101,6 +143,8 @@ class Recommendation(db.Model):
     # Связь
     user = relationship('User', back_populates='recommendations')
 
+    __table_args__ = _keyset_index('ix_recommendations_user_created_id', user_id, created_at, id)
+
     def to_dict(self):
         """Преобразование объекта в словарь"""
         return {
@@ -130,6 +174,8 @@ class Metric(db.Model):
     productivity = Column(Float, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = _keyset_index('ix_metrics_user_created_id', user_id, created_at, id)
+
     def to_dict(self):
         """Преобразование объекта в словарь"""
         return {
@@ -229,3 +275,76 @@ class EmployeeData(db.Model):
 
     def __repr__(self):
         return f'<EmployeeData {self.id} - {self.full_name}>'
+
+
+class OrgUnit(db.Model):
+    """Узел оргструктуры (организация -> юрлицо -> отдел) с накопительной статистикой выгорания"""
+    __tablename__ = 'org_units'
+
+    id = Column(Integer, primary_key=True)
+    parent_id = Column(Integer, ForeignKey('org_units.id'), nullable=True, index=True)
+    path = Column(String(1024), unique=True, nullable=False)  # '' — корень, 'Юрлицо/Отдел'
+    name = Column(String(255), nullable=False)
+    depth = Column(Integer, nullable=False, default=0)
+
+    # Агрегаты по последним диагностикам сотрудников поддерева
+    critical = Column(Integer, nullable=False, default=0)
+    warning = Column(Integer, nullable=False, default=0)
+    good = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0.0)
+    score_count = Column(Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        """Преобразование в словарь (формат team_stats для рекомендаций менеджеру)"""
+        return {
+            'id': self.id,
+            'parentId': self.parent_id,
+            'name': self.name,
+            'path': self.path,
+            'depth': self.depth,
+            'critical': self.critical,
+            'warning': self.warning,
+            'good': self.good,
+            'total': self.score_count,
+            'avg_burnout': round(self.score_sum / self.score_count * 100, 1) if self.score_count else 0,
+        }
+
+    def __repr__(self):
+        return f'<OrgUnit {self.id} - {self.path or "/"}>'
+
+
+class OrgMember(db.Model):
+    """Вклад сотрудника в агрегаты оргструктуры (последняя учтённая диагностика)"""
+    __tablename__ = 'org_members'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    unit_id = Column(Integer, ForeignKey('org_units.id'), nullable=False, index=True)
+    burnout_level = Column(String(50), nullable=False)
+    score = Column(Float, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<OrgMember {self.user_id} - Unit {self.unit_id}>'
+
+
+class DashboardSnapshot(db.Model):
+    """Готовая сводка дашборда пользователя (обновляется вместе с диагностикой)"""
+    __tablename__ = 'dashboard_snapshots'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    latest_assessment = Column(JSON, nullable=True)  # Assessment.to_dict() последней диагностики
+    total_assessments = Column(Integer, nullable=False, default=0)
+    metrics = Column(JSON, nullable=False, default=list)  # последние метрики, Metric.to_dict()
+    computed_at = Column(DateTime, default=datetime.utcnow)  # последний полный пересчёт
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        """Формат ответа /dashboard/summary"""
+        return {
+            'latestAssessment': self.latest_assessment,
+            'metrics': self.metrics or [],
+            'totalAssessments': self.total_assessments,
+        }
+
+    def __repr__(self):
+        return f'<DashboardSnapshot User {self.user_id}>'
@@ -1,43 +1,92 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from .db.db_models import Recommendation, User
+from .db.db_models import Recommendation, User, Assessment
 from .db.database import db
 from .data.logger import recommendations_logger
+from .utils.recommendations_selector import recommendation_bandit
+from .utils.pagination import ListParamsError, count_total, field, filter_date_range, keyset_page, parse_bool, parse_fields
 import psycopg2
 from sqlalchemy import exc as sa_exc
 
 recommendations_bp = Blueprint('recommendations', __name__)
 
+# Поля списка рекомендаций для ?fields= (те же ключи, что в Recommendation.to_dict)
+RECOMMENDATION_FIELDS = {
+    'id': field(Recommendation.id),
+    'userId': field(Recommendation.user_id),
+    'category': field(Recommendation.category),
+    'title': field(Recommendation.title),
+    'description': field(Recommendation.description),
+    'priority': field(Recommendation.priority),
+    'duration': field(Recommendation.duration),
+    'completed': field(Recommendation.completed),
+}
+
+def _record_feedback(rec, completed):
+    """Передать смену отметки выполнения в статистику бандита"""
+    try:
+        if rec.assessment_id is None:
+            return
+        assessment = Assessment.query.get(rec.assessment_id)
+        if assessment is None:
+            return
+        recommendation_bandit.record_completion(
+            assessment.burnout_level,
+            rec.user.department if rec.user else None,
+            rec.title,
+            completed
+        )
+    except Exception as e:
+        recommendations_logger.warning("Не удалось обновить статистику выполнения рекомендации ID: %s: %s", rec.id, e)
+
 @recommendations_bp.route('', methods=['GET'])
 @jwt_required()
 def get_recommendations():
-    """Получить список рекомендаций для пользователя"""
+    """
+    Получить список рекомендаций для пользователя (от новых к старым, постранично).
+
+    Query: limit, cursor, fields=id,title,completed,..., completed=true|false,
+    from / to — дата создания
+    """
     try:
         user_id_str = get_jwt_identity()
         user_id = int(user_id_str)
 
-        recommendations_logger.info(f"Запрос рекомендаций для пользователя ID: {user_id}")
+        recommendations_logger.info("Запрос рекомендаций для пользователя ID: %s", user_id)
 
         user = User.query.get(user_id)
         if not user:
-            recommendations_logger.warning(f"Пользователь ID: {user_id} не найден")
+            recommendations_logger.warning("Пользователь ID: %s не найден", user_id)
             return jsonify({'detail': 'User not found'}), 404
 
-        recommendations = Recommendation.query.filter_by(user_id=user_id).all()
+        selected = parse_fields(request.args, RECOMMENDATION_FIELDS)
+        query = Recommendation.query.filter_by(user_id=user_id)
+        completed = parse_bool(request.args.get('completed'), 'completed')
+        if completed is not None:
+            query = query.filter(Recommendation.completed.is_(completed))
+        query = filter_date_range(query, Recommendation.created_at, request.args)
 
-        recommendations_logger.info(f"Найдено {len(recommendations)} рекомендаций для пользователя ID: {user_id}")
+        recommendations, next_cursor = keyset_page(query, Recommendation.created_at, Recommendation.id,
+                                                   RECOMMENDATION_FIELDS, selected, request.args)
+
+        recommendations_logger.info("Найдено %s рекомендаций для пользователя ID: %s", len(recommendations), user_id)
 
         return jsonify({
-            'recommendations': [r.to_dict() for r in recommendations],
-            'total': len(recommendations),
+            'recommendations': recommendations,
+            'total': count_total(query, recommendations, request.args),
+            'nextCursor': next_cursor,
         }), 200
 
+    except ListParamsError as e:
+        recommendations_logger.warning("Некорректные параметры списка рекомендаций: %s", e)
+        return jsonify({'detail': str(e)}), 400
+
     except (psycopg2.OperationalError, sa_exc.OperationalError) as e:
-        recommendations_logger.error(f"Ошибка подключения к БД при получении рекомендаций: {e}", exc_info=True)
+        recommendations_logger.error("Ошибка подключения к БД при получении рекомендаций: %s", e, exc_info=True)
         return jsonify({'detail': 'Service unavailable (database)'}), 503
 
     except Exception as e:
-        recommendations_logger.error(f"Ошибка при получении рекомендаций: {str(e)}", exc_info=True)
+        recommendations_logger.error("Ошибка при получении рекомендаций: %s", e, exc_info=True)
         return jsonify({'detail': str(e)}), 500
 
 @recommendations_bp.route('/<int:recommendation_id>/complete', methods=['POST'])
@@ -48,7 +97,7 @@ def mark_recommendation_complete(recommendation_id):
         user_id_str = get_jwt_identity()
         user_id = int(user_id_str)
 
-        recommendations_logger.info(f"Попытка отметить рекомендацию ID: {recommendation_id} как выполненную для пользователя ID: {user_id}")
+        recommendations_logger.info("Попытка отметить рекомендацию ID: %s как выполненную для пользователя ID: %s", recommendation_id, user_id)
 
         rec = Recommendation.query.filter_by(
             id=recommendation_id,
@@ -56,13 +105,17 @@ def mark_recommendation_complete(recommendation_id):
         ).first()
 
         if not rec:
-            recommendations_logger.warning(f"Рекомендация ID: {recommendation_id} не найдена для пользователя ID: {user_id}")
+            recommendations_logger.warning("Рекомендация ID: %s не найдена для пользователя ID: %s", recommendation_id, user_id)
             return jsonify({'detail': 'Recommendation not found'}), 404
 
+        changed = not rec.completed
         rec.completed = True
         db.session.commit()
 
-        recommendations_logger.info(f"Рекомендация ID: {recommendation_id} отмечена как выполненная")
+        if changed:
+            _record_feedback(rec, True)
+
+        recommendations_logger.info("Рекомендация ID: %s отмечена как выполненная", recommendation_id)
 
         return jsonify(rec.to_dict()), 200
 
@@ -71,7 +124,7 @@ def mark_recommendation_complete(recommendation_id):
             db.session.rollback()
         except Exception:
             pass
-        recommendations_logger.error(f"Ошибка подключения к БД при отметке рекомендации: {e}", exc_info=True)
+        recommendations_logger.error("Ошибка подключения к БД при отметке рекомендации: %s", e, exc_info=True)
         return jsonify({'detail': 'Service unavailable (database)'}), 503
 
     except Exception as e:
@@ -79,7 +132,7 @@ def mark_recommendation_complete(recommendation_id):
             db.session.rollback()
         except Exception:
             pass
-        recommendations_logger.error(f"Ошибка при отметке рекомендации: {str(e)}", exc_info=True)
+        recommendations_logger.error("Ошибка при отметке рекомендации: %s", e, exc_info=True)
         return jsonify({'detail': str(e)}), 500
 
 @recommendations_bp.route('/<int:recommendation_id>/incomplete', methods=['POST'])
@@ -90,7 +143,7 @@ def mark_recommendation_incomplete(recommendation_id):
         user_id_str = get_jwt_identity()
         user_id = int(user_id_str)
 
-        recommendations_logger.info(f"Попытка отметить рекомендацию ID: {recommendation_id} как невыполненную для пользователя ID: {user_id}")
+        recommendations_logger.info("Попытка отметить рекомендацию ID: %s как невыполненную для пользователя ID: %s", recommendation_id, user_id)
 
         rec = Recommendation.query.filter_by(
             id=recommendation_id,
@@ -98,13 +151,17 @@ def mark_recommendation_incomplete(recommendation_id):
         ).first()
 
         if not rec:
-            recommendations_logger.warning(f"Рекомендация ID: {recommendation_id} не найдена для пользователя ID: {user_id}")
+            recommendations_logger.warning("Рекомендация ID: %s не найдена для пользователя ID: %s", recommendation_id, user_id)
             return jsonify({'detail': 'Recommendation not found'}), 404
 
+        changed = bool(rec.completed)
         rec.completed = False
         db.session.commit()
 
-        recommendations_logger.info(f"Рекомендация ID: {recommendation_id} отмечена как невыполненная")
+        if changed:
+            _record_feedback(rec, False)
+
+        recommendations_logger.info("Рекомендация ID: %s отмечена как невыполненная", recommendation_id)
 
         return jsonify(rec.to_dict()), 200
 
@@ -113,7 +170,7 @@ def mark_recommendation_incomplete(recommendation_id):
             db.session.rollback()
         except Exception:
             pass
-        recommendations_logger.error(f"Ошибка подключения к БД при отметке рекомендации: {e}", exc_info=True)
+        recommendations_logger.error("Ошибка подключения к БД при отметке рекомендации: %s", e, exc_info=True)
         return jsonify({'detail': 'Service unavailable (database)'}), 503
 
     except Exception as e:
@@ -121,7 +178,7 @@ def mark_recommendation_incomplete(recommendation_id):
             db.session.rollback()
         except Exception:
             pass
-        recommendations_logger.error(f"Ошибка при отметке рекомендации: {str(e)}", exc_info=True)
+        recommendations_logger.error("Ошибка при отметке рекомендации: %s", e, exc_info=True)
         return jsonify({'detail': str(e)}), 500
 
 @recommendations_bp.route('/<int:recommendation_id>', methods=['GET'])
@@ -132,7 +189,7 @@ def get_recommendation(recommendation_id):
         user_id_str = get_jwt_identity()
         user_id = int(user_id_str)
 
-        recommendations_logger.info(f"Запрос деталей рекомендации ID: {recommendation_id} для пользователя ID: {user_id}")
+        recommendations_logger.info("Запрос деталей рекомендации ID: %s для пользователя ID: %s", recommendation_id, user_id)
 
         rec = Recommendation.query.filter_by(
             id=recommendation_id,
@@ -140,12 +197,12 @@ def get_recommendation(recommendation_id):
         ).first()
 
         if not rec:
-            recommendations_logger.warning(f"Рекомендация ID: {recommendation_id} не найдена для пользователя ID: {user_id}")
+            recommendations_logger.warning("Рекомендация ID: %s не найдена для пользователя ID: %s", recommendation_id, user_id)
             return jsonify({'detail': 'Recommendation not found'}), 404
 
-        recommendations_logger.info(f"Рекомендация ID: {recommendation_id} найдена")
+        recommendations_logger.info("Рекомендация ID: %s найдена", recommendation_id)
         return jsonify(rec.to_dict()), 200
 
     except Exception as e:
-        recommendations_logger.error(f"Ошибка при получении рекомендации: {str(e)}", exc_info=True)
+        recommendations_logger.error("Ошибка при получении рекомендации: %s", e, exc_info=True)
         return jsonify({'detail': str(e)}), 500
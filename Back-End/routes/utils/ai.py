@@ -2,15 +2,81 @@
 Модуль для работы с AI (Yandex GPT)
 """
 import os
-import requests
-from dotenv import load_dotenv
 
-load_dotenv()
+from ..data.logger import ai_logger
+from .llm_providers import complete
+from .cache import TTLCache
+from .single_flight import SingleFlight
+
+# Рекомендации менеджеру зависят только от статистики команды: одинаковые запросы
+# объединяются в один вызов LLM (single-flight), успешные ответы кэшируются по
+# статистике с округлённым средним выгоранием
+MANAGER_RECOMMENDATIONS_CACHE_TTL = float(os.getenv('MANAGER_RECOMMENDATIONS_CACHE_TTL', '900'))
+MANAGER_RECOMMENDATIONS_CACHE_SIZE = int(os.getenv('MANAGER_RECOMMENDATIONS_CACHE_SIZE', '256'))
+MANAGER_RECOMMENDATIONS_BURNOUT_STEP = float(os.getenv('MANAGER_RECOMMENDATIONS_BURNOUT_STEP', '5'))
+
+manager_recommendations_cache = TTLCache(
+    maxsize=MANAGER_RECOMMENDATIONS_CACHE_SIZE,
+    ttl=MANAGER_RECOMMENDATIONS_CACHE_TTL,
+    name='manager_recommendations'
+)
+_manager_flight = SingleFlight(name='manager_recommendations')
+
+
+def team_stats_key(team_stats, namespace='manager'):
+    """Ключ кэша: счётчики команды и средний уровень выгорания, округлённый до шага"""
+    step = MANAGER_RECOMMENDATIONS_BURNOUT_STEP
+    avg_burnout = float(team_stats.get('avg_burnout', 0) or 0)
+    if step > 0:
+        avg_burnout = round(avg_burnout / step) * step
+    return (
+        namespace,
+        int(team_stats.get('critical', 0) or 0),
+        int(team_stats.get('warning', 0) or 0),
+        int(team_stats.get('good', 0) or 0),
+        int(team_stats.get('total', 0) or 0),
+        round(avg_burnout, 1),
+    )
+
+
+def cached_team_recommendations(namespace, team_stats, fetch):
+    """
+    Рекомендации из кэша или от fetch(team_stats) — не более одного вызова
+    на ключ одновременно. fetch возвращает список строк или None (нет ответа LLM);
+    тогда используются резервные рекомендации, в кэш они не попадают.
+    """
+    key = team_stats_key(team_stats, namespace)
+    cached = manager_recommendations_cache.get(key)
+    if cached is not None:
+        return list(cached)
+
+    def fetch_and_cache(stats):
+        # Кэш заполняется до снятия ключа в single-flight: запрос, пришедший
+        # между ними, иначе не нашёл бы ни вызова, ни кэша и обратился бы к LLM
+        result = fetch(stats)
+        if result:
+            manager_recommendations_cache.set(key, list(result))
+        return result
+
+    recommendations, _ = _manager_flight.do(key, fetch_and_cache, team_stats)
+    if recommendations:
+        return list(recommendations)
+
+    return get_fallback_recommendations(team_stats)
+
+
+def manager_recommendations_stats():
+    """Счётчики кэша и объединённых вызовов рекомендаций менеджеру"""
+    return {
+        'cache': manager_recommendations_cache.stats(),
+        'singleFlight': _manager_flight.stats(),
+    }
 
 
 def generate_manager_recommendations(team_stats):
     """
-    Генерация рекомендаций для менеджера на основе статистики команды через Yandex GPT
+    Генерация рекомендаций для менеджера на основе статистики команды через LLM-провайдеров
+    (Yandex GPT в приоритете, см. llm_providers)
 
     Args:
         team_stats (dict): Статистика команды
@@ -26,16 +92,18 @@ def generate_manager_recommendations(team_stats):
         list: Список рекомендаций
     """
     try:
-        yandex_api_key = os.getenv('YANDEX_GPT_API_KEY')
-        yandex_iam_token = os.getenv('YANDEX_GPT_IAM_TOKEN')
-        yandex_catalog_id = os.getenv('YANDEX_GPT_CATALOG_ID', '')
-        yandex_model = os.getenv('YANDEX_GPT_MODEL', 'yandexgpt/latest')
+        return cached_team_recommendations('manager', team_stats, _request_manager_recommendations)
+
+    except Exception as e:
+        # Fallback на статичные рекомендации при ошибке
+        ai_logger.error("Ошибка генерации AI рекомендаций: %s", e, exc_info=True)
+        return get_fallback_recommendations(team_stats)
 
-        if not yandex_api_key and not yandex_iam_token:
-            print("Ошибка: YANDEX_GPT_API_KEY или YANDEX_GPT_IAM_TOKEN не установлены")
-            return get_fallback_recommendations(team_stats)
 
-        # Формируем промпт для Yandex GPT
+def _request_manager_recommendations(team_stats):
+    """Запрос рекомендаций у LLM; None, если ни один провайдер не ответил"""
+    try:
+        # Формируем промпт для LLM
         prompt = f"""
 Ты - эксперт по управлению персоналом и профилактике профессионального выгорания.
 
@@ -56,74 +124,23 @@ def generate_manager_recommendations(team_stats):
 Формат ответа: каждая рекомендация с новой строки, без номеров и маркеров.
 """
 
-        headers = {
-            'Content-Type': 'application/json',
-            'x-folder-id': yandex_catalog_id,
-        }
-
-        # Используем либо API Key, либо IAM токен (приоритет: API Key)
-        if yandex_api_key:
-            headers['Authorization'] = f'Api-Key {yandex_api_key}'
-        else:
-            headers['Authorization'] = f'Bearer {yandex_iam_token}'
-
-        payload = {
-            'modelUri': f'gpt://{yandex_catalog_id}/{yandex_model}',
-            'completionOptions': {
-                'temperature': 0.7,
-                'maxTokens': 500,
-            },
-            'messages': [
-                {
-                    'role': 'system',
-                    'text': 'Ты - эксперт по HR и профилактике выгорания.'
-                },
-                {
-                    'role': 'user',
-                    'text': prompt
-                }
-            ]
-        }
-
-        response = requests.post(
-            'https://llm.api.cloud.yandex.net/foundationModels/v1/completion',
-            json=payload,
-            headers=headers,
-            timeout=60
+        reply = complete(
+            prompt,
+            system='Ты - эксперт по HR и профилактике выгорания.',
+            temperature=0.7,
+            max_tokens=500,
         )
 
-        if response.status_code == 200:
-            try:
-                response_data = response.json()
-                reply = None
-                if isinstance(response_data, dict):
-                    result = response_data.get('result')
-                    if isinstance(result, dict):
-                        alternatives = result.get('alternatives')
-                        if isinstance(alternatives, list) and len(alternatives) > 0:
-                            first_alt = alternatives[0]
-                            if isinstance(first_alt, dict):
-                                reply = first_alt.get('message', {}).get('text')
-
-                if reply:
-                    recommendations = [r.strip() for r in reply.split('\n') if r.strip()]
-                    return recommendations[:5]
-            except Exception as e:
-                print(f"Ошибка парсинга ответа Yandex GPT: {e}")
-        else:
-            print(f"Yandex GPT вернул статус {response.status_code}")
-            try:
-                error_data = response.json()
-                print(f"Ошибка: {error_data}")
-            except:
-                print(f"Ответ: {response.text}")
+        if reply:
+            recommendations = [r.strip() for r in reply.split('\n') if r.strip()]
+            return recommendations[:5]
 
-        return get_fallback_recommendations(team_stats)
+        ai_logger.warning("LLM не вернула ответ, используются резервные рекомендации менеджеру")
+        return None
 
     except Exception as e:
-        # Fallback на статичные рекомендации при ошибке
-        print(f"Ошибка генерации AI рекомендаций: {e}")
-        return get_fallback_recommendations(team_stats)
+        ai_logger.error("Ошибка генерации AI рекомендаций: %s", e, exc_info=True)
+        return None
 
 
 def get_fallback_recommendations(team_stats):
@@ -1,22 +1,13 @@
 """
 Модуль для генерации рекомендаций через Yandex GPT API
-Копия логики из `ai.py`, но дублируется здесь для удобства.
+Тонкая обёртка над llm_providers с параметрами, отличными от `ai.py`.
 """
-import os
-import json
-import requests
-from dotenv import load_dotenv
-
-load_dotenv()
-
-YANDEX_GPT_API_KEY = os.getenv('YANDEX_GPT_API_KEY')
-YANDEX_GPT_IAM_TOKEN = os.getenv('YANDEX_GPT_IAM_TOKEN')
-YANDEX_GPT_MODEL = os.getenv('YANDEX_GPT_MODEL', 'yandexgpt/latest')
-YANDEX_GPT_CATALOG_ID = os.getenv('YANDEX_GPT_CATALOG_ID', '')
+from ..data.logger import ai_logger
+from .llm_providers import complete, get_provider
 
 # Импортируем резервную функцию из оригинального модуля
 try:
-    from .ai import get_fallback_recommendations
+    from .ai import get_fallback_recommendations, cached_team_recommendations
 except Exception:
     # На случай прямого запуска или если относительный импорт недоступен,
     # определим простую резервную функцию
@@ -32,6 +23,9 @@ except Exception:
         recs.append("Внедрить программу поддержки психологического здоровья сотрудников")
         return recs[:5]
 
+    def cached_team_recommendations(namespace, team_stats, fetch):
+        return fetch(team_stats) or get_fallback_recommendations(team_stats)
+
 
 def generate_recommendations_yandex(team_stats):
     """
@@ -44,9 +38,15 @@ def generate_recommendations_yandex(team_stats):
         list: до 5 рекомендаций (строк)
     """
     try:
-        if not YANDEX_GPT_API_KEY and not YANDEX_GPT_IAM_TOKEN:
-            raise RuntimeError('YANDEX_GPT_API_KEY или YANDEX_GPT_IAM_TOKEN не настроены в окружении')
+        return cached_team_recommendations('yandex', team_stats, _request_recommendations_yandex)
+    except Exception as e:
+        ai_logger.error("Ошибка Yandex GPT inference: %s", e, exc_info=True)
+        return get_fallback_recommendations(team_stats)
+
 
+def _request_recommendations_yandex(team_stats):
+    """Запрос рекомендаций у LLM; None, если ответа нет"""
+    try:
         prompt = f"""
 Ты - эксперт по управлению персоналом и профилактике профессионального выгорания.
 
@@ -62,58 +62,17 @@ def generate_recommendations_yandex(team_stats):
 Формат ответа: каждая рекомендация с новой строки, без номеров и маркеров.
 """
 
-        headers = {
-            'Content-Type': 'application/json',
-            'x-folder-id': YANDEX_GPT_CATALOG_ID,
-        }
-
-        # Используем либо API Key, либо IAM токен (приоритет: API Key)
-        if YANDEX_GPT_API_KEY:
-            headers['Authorization'] = f'Api-Key {YANDEX_GPT_API_KEY}'
-        else:
-            headers['Authorization'] = f'Bearer {YANDEX_GPT_IAM_TOKEN}'
-
-        payload = {
-            'modelUri': f'gpt://{YANDEX_GPT_CATALOG_ID}/{YANDEX_GPT_MODEL}',
-            'completionOptions': {
-                'temperature': 0.7,
-                'maxTokens': 400,
-            },
-            'messages': [
-                {
-                    'role': 'user',
-                    'text': prompt
-                }
-            ]
-        }
-
-        url = 'https://llm.api.cloud.yandex.net/foundationModels/v1/completion'
-        resp = requests.post(url, headers=headers, json=payload, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
-
-        # Обработка ответа от Yandex GPT
-        text = ""
-        if isinstance(data, dict):
-            result = data.get('result')
-            if isinstance(result, dict):
-                alternatives = result.get('alternatives')
-                if isinstance(alternatives, list) and len(alternatives) > 0:
-                    first_alt = alternatives[0]
-                    if isinstance(first_alt, dict):
-                        message = first_alt.get('message')
-                        if isinstance(message, dict):
-                            text = message.get('text', '')
+        text = complete(prompt, temperature=0.7, max_tokens=400, timeout=30)
 
         if text:
             recommendations = [r.strip() for r in text.split('\n') if r.strip()]
             return recommendations[:5]
-        else:
-            return get_fallback_recommendations(team_stats)
+        ai_logger.warning("Yandex GPT не вернул рекомендации менеджеру, используются резервные")
+        return None
 
     except Exception as e:
-        print(f"Ошибка Yandex GPT inference: {e}")
-        return get_fallback_recommendations(team_stats)
+        ai_logger.error("Ошибка Yandex GPT inference: %s", e, exc_info=True)
+        return None
 
 
 # Для обратной совместимости - алиас основной функции
@@ -123,5 +82,6 @@ generate_recommendations = generate_recommendations_yandex
 # Небольшой самотест при запуске файла напрямую
 if __name__ == '__main__':
     sample = {'critical': 1, 'warning': 2, 'good': 7, 'total': 10, 'avg_burnout': 45}
-    print('YANDEX_GPT_MODEL:', YANDEX_GPT_MODEL)
+    yandex = get_provider('yandex')
+    print('YANDEX_GPT_MODEL:', yandex.model if yandex else None)
     print(generate_recommendations_yandex(sample))
@@ -0,0 +1,141 @@
+"""
+Хранение аватаров по содержимому: имя записи — SHA-256 исходного файла.
+
+Содержимое по хэшу никогда не меняется, поэтому изображения отдаются со строгим
+ETag и заголовками immutable-кэширования, а в ответах API остаётся только URL.
+Миниатюра строится при загрузке (Pillow); без Pillow вместо неё хранится оригинал.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import exc as sa_exc
+
+from ..db.database import db
+from ..db.db_models import Avatar, User
+from ..data.logger import auth_logger
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - Pillow необязателен
+    Image = None
+
+AVATAR_MAX_BYTES = int(os.getenv('AVATAR_MAX_BYTES', str(5 * 1024 * 1024)))
+AVATAR_THUMB_SIZE = int(os.getenv('AVATAR_THUMB_SIZE', '128'))
+
+_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+_DATA_URL = re.compile(r'^data:(?P<type>[\w/+.-]+)?(?:;[\w=-]+)*;base64,', re.IGNORECASE)
+
+
+class AvatarError(ValueError):
+    """Некорректное изображение аватара — ответ 400"""
+
+
+def sniff_content_type(data: bytes):
+    """Тип изображения по сигнатуре файла (PNG, JPEG, GIF, WebP) или None"""
+    for signature, content_type in _SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def decode_avatar(value: str) -> bytes:
+    """Байты изображения из data URL или строки base64"""
+    value = _DATA_URL.sub('', value.strip(), count=1)
+    try:
+        return base64.b64decode(value, validate=False)
+    except (binascii.Error, ValueError):
+        raise AvatarError('Avatar must be a base64 encoded image')
+
+
+def make_thumbnail(data: bytes, content_type: str):
+    """Миниатюра AVATAR_THUMB_SIZE x AVATAR_THUMB_SIZE (обрезка по центру): (bytes, content_type)"""
+    if Image is None:
+        return data, content_type
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            has_alpha = image.mode in ('RGBA', 'LA', 'P')
+            image = ImageOps.fit(image.convert('RGBA' if has_alpha else 'RGB'),
+                                 (AVATAR_THUMB_SIZE, AVATAR_THUMB_SIZE))
+            output = io.BytesIO()
+            if has_alpha:
+                image.save(output, format='PNG', optimize=True)
+                return output.getvalue(), 'image/png'
+            image.save(output, format='JPEG', quality=85, optimize=True)
+            return output.getvalue(), 'image/jpeg'
+    except Exception as e:
+        raise AvatarError(f'Cannot read avatar image: {e}')
+
+
+def store_avatar(data: bytes) -> Avatar:
+    """Сохранить изображение (если такого ещё нет) и вернуть запись; коммит — на вызывающем"""
+    if not data:
+        raise AvatarError('Avatar is empty')
+    if len(data) > AVATAR_MAX_BYTES:
+        raise AvatarError(f'Avatar is larger than {AVATAR_MAX_BYTES} bytes')
+
+    content_type = sniff_content_type(data)
+    if content_type is None:
+        raise AvatarError('Avatar must be a PNG, JPEG, GIF or WebP image')
+
+    digest = hashlib.sha256(data).hexdigest()
+    avatar = Avatar.query.get(digest)
+    if avatar is not None:
+        return avatar
+
+    thumbnail, thumb_content_type = make_thumbnail(data, content_type)
+    try:
+        with db.session.begin_nested():
+            avatar = Avatar(hash=digest, content_type=content_type, data=data, size=len(data),
+                            thumbnail=thumbnail, thumb_content_type=thumb_content_type)
+            db.session.add(avatar)
+        return avatar
+    except sa_exc.IntegrityError:
+        # То же изображение успел сохранить параллельный запрос
+        return Avatar.query.get(digest)
+
+
+@click.command('migrate-avatars')
+@click.option('--batch-size', type=int, default=200, show_default=True,
+              help='Сколько пользователей обрабатывать за одну транзакцию')
+@with_appcontext
+def migrate_avatars_command(batch_size):
+    """Перенести аватары из users.avatar (base64) в таблицу avatars"""
+    started = time.perf_counter()
+    moved = failed = 0
+    last_id = 0
+    while True:
+        users = User.query.filter(
+            User.id > last_id, User.avatar.isnot(None), User.avatar != ''
+        ).order_by(User.id).limit(batch_size).all()
+        if not users:
+            break
+        for user in users:
+            last_id = user.id
+            try:
+                avatar = store_avatar(decode_avatar(user.avatar))
+                db.session.flush()
+                user.avatar_hash = avatar.hash
+                user.avatar = None
+                moved += 1
+            except AvatarError as e:
+                failed += 1
+                auth_logger.warning("Аватар пользователя ID: %s не перенесён: %s", user.id, e)
+        db.session.commit()
+
+    click.echo(f"Перенесено аватаров: {moved}, пропущено некорректных: {failed} за {time.perf_counter() - started:.2f} с")
@@ -0,0 +1,77 @@
+"""
+Фоновое выполнение задач вне HTTP-запроса (пул потоков на процесс)
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from ..data.logger import app_logger
+from . import tracing
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Ленивая инициализация пула; размер берётся из RECOMMENDATIONS_WORKERS"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = current_app.config.get('RECOMMENDATIONS_WORKERS', 4)
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='background')
+                app_logger.info("Фоновый пул задач запущен: %s потоков", workers)
+    return _executor
+
+
+def submit_task(fn, *args, **kwargs):
+    """
+    Запустить fn(*args, **kwargs) в фоновом потоке внутри контекста приложения.
+    Возвращает Future.
+    """
+    app = current_app._get_current_object()
+    trace_context = tracing.current_context()
+
+    def run():
+        with app.app_context(), tracing.continue_trace(trace_context, f'task.{fn.__name__}'):
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                app_logger.error("Ошибка фоновой задачи %s: %s", fn.__name__, e, exc_info=True)
+                raise
+
+    return get_executor().submit(run)
+
+
+def submit_when_done(future, fn, *args, **kwargs):
+    """
+    Когда future завершится, запустить fn(future, *args, **kwargs) фоновой задачей
+    (в контексте приложения и трассы вызывающего). Вызывающий поток future не ждёт:
+    так фоновые потоки не простаивают, пока, например, собирается пачка микробатчинга.
+    Результат или ошибку fn получает через future.result().
+    """
+    app = current_app._get_current_object()
+    trace_context = tracing.current_context()
+    executor = get_executor()
+
+    def run(done):
+        with app.app_context(), tracing.continue_trace(trace_context, f'task.{fn.__name__}'):
+            try:
+                return fn(done, *args, **kwargs)
+            except Exception as e:
+                app_logger.error("Ошибка фоновой задачи %s: %s", fn.__name__, e, exc_info=True)
+                raise
+
+    future.add_done_callback(lambda done: executor.submit(run, done))
+
+
+def executor_stats() -> dict:
+    """Размер фонового пула и число задач в очереди (0, если пул ещё не запущен)"""
+    if _executor is None:
+        return {'workers': 0, 'threads': 0, 'pending': 0}
+    return {
+        'workers': _executor._max_workers,
+        'threads': len(_executor._threads),
+        'pending': _executor._work_queue.qsize(),
+    }
@@ -0,0 +1,93 @@
+"""
+Микробатчинг: задания из разных потоков собираются в пачку за короткое окно
+(или до max_batch штук) и обрабатываются одним вызовом handler.
+"""
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from ..data.logger import ai_logger
+
+
+class MicroBatcher:
+    """
+    Очередь заданий с фоновым сборщиком пачек.
+
+    handler(items) получает список заданий и возвращает список результатов той же
+    длины; результат i-го элемента попадает в Future, возвращённый submit.
+    Пачки обрабатываются в отдельном пуле, поэтому сбор следующей пачки
+    не ждёт ответа по предыдущей.
+    """
+
+    instances = weakref.WeakSet()  # все батчеры процесса (для метрик)
+
+    def __init__(self, handler, max_batch: int = 16, window: float = 0.1,
+                 concurrency: int = 4, name: str = 'batcher'):
+        self.handler = handler
+        self.max_batch = max(1, max_batch)
+        self.window = window
+        self.name = name
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=name)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        MicroBatcher.instances.add(self)
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self._ensure_started()
+        self._queue.put((item, future))
+        return future
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._collect, name=f'{self.name}-collector', daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._run, batch)
+
+    def _run(self, batch: list):
+        items = [item for item, _ in batch]
+        with self._lock:
+            self.batches += 1
+            self.items += len(items)
+        try:
+            results = self.handler(items)
+            if len(results) != len(items):
+                raise ValueError(f'{self.name}: handler вернул {len(results)} результатов для {len(items)} заданий')
+        except Exception as e:
+            ai_logger.error("Ошибка обработки пачки %s (%s заданий): %s", self.name, len(items), e, exc_info=True)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'name': self.name,
+                'batches': self.batches,
+                'items': self.items,
+                'avg_batch': round(self.items / self.batches, 2) if self.batches else 0.0,
+                'pending': self._queue.qsize(),
+            }
@@ -0,0 +1,207 @@
+"""
+Пакетный (векторизованный) расчёт score выгорания по всем сотрудникам из EmployeeData.
+
+Результат для каждой строки совпадает с calculate_burnout_score_from_employee,
+но строковые поля (стаж, должность, обучение) разбираются один раз на каждое
+уникальное значение, а арифметика выполняется по колонкам NumPy за один проход.
+"""
+import csv
+import sys
+from datetime import datetime
+
+import click
+import numpy as np
+from flask.cli import with_appcontext
+from sqlalchemy import func, and_
+
+from ..burnoutScore import (
+    BURNOUT_LEVEL_TO_TYPE,
+    normalize_type,
+    normalize_tenure,
+    normalize_position,
+    normalize_training,
+    parse_tenure,
+)
+from ..db.database import db
+from ..db.db_models import EmployeeData, Assessment
+from ..data.logger import app_logger
+
+BATCH_SIZE = 10000
+ONE_DAY = np.timedelta64(1, 'D')
+
+
+def _factorize(values, fn, dtype=np.float64) -> np.ndarray:
+    """Применяет fn к каждому уникальному значению и раскладывает результат по строкам"""
+    codes_by_value = {}
+    codes = np.fromiter(
+        (codes_by_value.setdefault(v, len(codes_by_value)) for v in values),
+        dtype=np.intp,
+        count=len(values)
+    )
+    table = np.array([fn(v) for v in codes_by_value], dtype=dtype)
+    if not len(table):
+        return np.zeros(0, dtype=dtype)
+    return table[codes]
+
+
+def _training_penalty(training) -> float:
+    return 0.2 if normalize_training(training) > 0.3 else 0
+
+
+def load_employee_columns() -> dict:
+    """
+    Загружает EmployeeData в колоночном виде (без создания ORM объектов).
+
+    Returns:
+        dict: списки 'id', 'user_id', 'tenure', 'position', 'training', 'last_vacation'
+    """
+    columns = {
+        'id': [],
+        'user_id': [],
+        'tenure': [],
+        'position': [],
+        'training': [],
+        'last_vacation': [],
+    }
+
+    query = db.session.query(
+        EmployeeData.id,
+        EmployeeData.user_id,
+        EmployeeData.tenure,
+        EmployeeData.position,
+        EmployeeData.subordinates,
+        EmployeeData.training,
+        EmployeeData.last_vacation,
+    ).order_by(EmployeeData.id).execution_options(yield_per=BATCH_SIZE)
+
+    for emp_id, user_id, tenure, position, subordinates, training, last_vacation in query:
+        columns['id'].append(emp_id)
+        columns['user_id'].append(user_id)
+        columns['tenure'].append(tenure)
+        columns['position'].append(position or subordinates or '')
+        columns['training'].append(training)
+        columns['last_vacation'].append(last_vacation if isinstance(last_vacation, datetime) else None)
+
+    return columns
+
+
+def load_latest_burnout_types(user_ids) -> dict:
+    """Тип выгорания по последней диагностике пользователя: {user_id: 'G' | 'S' | 'A'}"""
+    latest = db.session.query(
+        Assessment.user_id,
+        func.max(Assessment.date).label('max_date')
+    ).group_by(Assessment.user_id).subquery()
+
+    rows = db.session.query(Assessment.user_id, Assessment.burnout_level).join(
+        latest,
+        and_(Assessment.user_id == latest.c.user_id, Assessment.date == latest.c.max_date)
+    )
+
+    wanted = {uid for uid in user_ids if uid is not None}
+    return {
+        user_id: BURNOUT_LEVEL_TO_TYPE.get(level, 'G')
+        for user_id, level in rows
+        if user_id in wanted
+    }
+
+
+def score_columns(columns: dict, burnout_types, current_date: datetime = None) -> np.ndarray:
+    """
+    Векторизованный аналог calculate_burnout_score_from_employee.
+
+    Args:
+        columns (dict): колонки из load_employee_columns
+        burnout_types: один тип для всех ('G', 'S', 'A', 'B' или None)
+            либо последовательность типов, выровненная по columns['id']
+        current_date (datetime): дата расчёта (по умолчанию — текущая UTC)
+
+    Returns:
+        np.ndarray: score для каждой строки, в порядке columns['id']
+    """
+    if current_date is None:
+        current_date = datetime.utcnow()
+
+    n = len(columns['id'])
+
+    if burnout_types is None or isinstance(burnout_types, str):
+        type_score = np.full(n, normalize_type(burnout_types), dtype=np.float64)
+    else:
+        type_score = _factorize(list(burnout_types), normalize_type)
+
+    last_vacation = np.array(columns['last_vacation'], dtype='datetime64[us]').reshape(n)
+    has_vacation = ~np.isnat(last_vacation)
+    vacation_days = np.zeros(n, dtype=np.int64)
+    vacation_days[has_vacation] = (
+        np.datetime64(current_date, 'us') - last_vacation[has_vacation]
+    ) // ONE_DAY
+    vacation_norm = np.where(has_vacation, np.minimum(vacation_days / 365, 1), 1.0)
+
+    tenure_norm = _factorize(columns['tenure'], lambda t: normalize_tenure(parse_tenure(t)))
+    position_norm = _factorize(columns['position'], normalize_position)
+    training_penalty = _factorize(columns['training'], _training_penalty)
+
+    interaction = tenure_norm * position_norm * 0.5
+    vacation_contrib = vacation_norm * 0.3
+
+    score = type_score + interaction + vacation_contrib + training_penalty
+    return np.minimum(score, 1.0)
+
+
+def score_employees(burnout_type=None, current_date: datetime = None):
+    """
+    Рассчитывает score выгорания для всех сотрудников за один проход.
+
+    Args:
+        burnout_type (str): тип выгорания для всех сотрудников; если не задан,
+            берётся из последней диагностики пользователя, связанного с сотрудником
+        current_date (datetime): дата расчёта (по умолчанию — текущая UTC)
+
+    Returns:
+        tuple: (ids, scores) — np.ndarray с employee_data.id и соответствующие score
+    """
+    columns = load_employee_columns()
+
+    if burnout_type is None:
+        types_by_user = load_latest_burnout_types(columns['user_id'])
+        burnout_types = [types_by_user.get(uid) for uid in columns['user_id']]
+    else:
+        burnout_types = burnout_type
+
+    scores = score_columns(columns, burnout_types, current_date)
+    ids = np.array(columns['id'], dtype=np.int64)
+
+    app_logger.info("Пакетный расчёт score выгорания: %s сотрудников", len(ids))
+    return ids, scores
+
+
+def scores_by_id(burnout_type=None, current_date: datetime = None) -> dict:
+    """Score выгорания в виде словаря {employee_data.id: score}"""
+    ids, scores = score_employees(burnout_type, current_date)
+    return dict(zip(ids.tolist(), scores.tolist()))
+
+
+@click.command('score-employees')
+@click.option('--type', 'burnout_type', type=click.Choice(['G', 'S', 'A', 'B']), default=None,
+              help='Тип выгорания для всех сотрудников (по умолчанию — по последней диагностике)')
+@click.option('--date', 'current_date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Дата расчёта в формате YYYY-MM-DD (по умолчанию — сегодня)')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), default=None,
+              help='CSV файл для результатов (по умолчанию — stdout)')
+@with_appcontext
+def score_employees_command(burnout_type, current_date, output):
+    """Рассчитать score выгорания по всем сотрудникам из EmployeeData"""
+    started = datetime.utcnow()
+    ids, scores = score_employees(burnout_type, current_date)
+    elapsed = (datetime.utcnow() - started).total_seconds()
+
+    stream = open(output, 'w', newline='', encoding='utf-8') if output else sys.stdout
+    try:
+        writer = csv.writer(stream)
+        writer.writerow(['employee_data_id', 'score'])
+        for emp_id, score in zip(ids.tolist(), scores.tolist()):
+            writer.writerow([emp_id, f'{score:.4f}'])
+    finally:
+        if output:
+            stream.close()
+
+    click.echo(f"Рассчитано {len(ids)} score за {elapsed:.2f} с", err=True)
@@ -0,0 +1,150 @@
+"""
+Снимок сводки дашборда пользователя: последняя диагностика, число диагностик и
+последние метрики в одной строке dashboard_snapshots.
+
+Снимок обновляется в транзакции submit_assessment, поэтому /dashboard/summary —
+одно чтение по первичному ключу. Если снимка нет или с последнего полного
+пересчёта прошло больше DASHBOARD_SNAPSHOT_TTL секунд (метрики пишутся вне
+приложения), он пересчитывается одним SQL запросом. Новый снимок создаётся
+через INSERT ... ON CONFLICT DO UPDATE, поэтому параллельные запросы одного
+пользователя не падают на первичном ключе.
+"""
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.dialects import postgresql, sqlite
+
+from ..db.database import db
+from ..db.db_models import Assessment, DashboardSnapshot, Metric, User
+
+DASHBOARD_SNAPSHOT_TTL = int(os.getenv('DASHBOARD_SNAPSHOT_TTL', '300'))
+DASHBOARD_METRICS_LIMIT = int(os.getenv('DASHBOARD_METRICS_LIMIT', '7'))
+
+
+def _is_fresh(snapshot: DashboardSnapshot) -> bool:
+    if snapshot is None or snapshot.computed_at is None:
+        return False
+    return datetime.utcnow() - snapshot.computed_at < timedelta(seconds=DASHBOARD_SNAPSHOT_TTL)
+
+
+def compute_summary(user_id: int):
+    """
+    Сводка одним запросом: пользователь, число диагностик (скалярный подзапрос),
+    последняя диагностика и последние метрики (LEFT JOIN). None — если пользователя нет.
+    """
+    total = select(func.count(Assessment.id)).where(
+        Assessment.user_id == user_id
+    ).scalar_subquery()
+    latest_id = select(Assessment.id).where(
+        Assessment.user_id == user_id
+    ).order_by(Assessment.date.desc(), Assessment.id.desc()).limit(1).scalar_subquery()
+    recent_metrics = select(Metric).where(
+        Metric.user_id == user_id
+    ).order_by(Metric.id.desc()).limit(DASHBOARD_METRICS_LIMIT).subquery()
+
+    rows = db.session.query(
+        User.id, total.label('total'), Assessment,
+        recent_metrics.c.id, recent_metrics.c.date, recent_metrics.c.burnout,
+        recent_metrics.c.stress, recent_metrics.c.productivity,
+    ).select_from(
+        User
+    ).outerjoin(
+        Assessment, Assessment.id == latest_id
+    ).outerjoin(
+        recent_metrics, recent_metrics.c.user_id == User.id
+    ).filter(
+        User.id == user_id
+    ).all()
+
+    if not rows:
+        return None
+
+    _, total_assessments, latest, *_ = rows[0]
+    metrics = [
+        {'date': date, 'burnout': burnout, 'stress': stress, 'productivity': productivity}
+        for _, _, _, metric_id, date, burnout, stress, productivity in sorted(rows, key=lambda r: r[3] or 0)
+        if metric_id is not None
+    ]
+    return {
+        'latestAssessment': latest.to_dict() if latest is not None else None,
+        'metrics': metrics,
+        'totalAssessments': total_assessments,
+    }
+
+
+def _upsert(user_id: int, values: dict):
+    """Создать снимок или перезаписать созданный параллельным запросом"""
+    dialect = db.engine.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(DashboardSnapshot.__table__).values(user_id=user_id, **values)
+        db.session.execute(stmt.on_conflict_do_update(index_elements=['user_id'], set_=values))
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(DashboardSnapshot(user_id=user_id, **values))
+    except sa_exc.IntegrityError:
+        DashboardSnapshot.query.filter_by(user_id=user_id).update(values, synchronize_session=False)
+
+
+def _store(user_id: int, summary: dict, snapshot: DashboardSnapshot = None):
+    now = datetime.utcnow()
+    values = {
+        'latest_assessment': summary['latestAssessment'],
+        'total_assessments': summary['totalAssessments'],
+        'metrics': summary['metrics'],
+        'computed_at': now,
+    }
+    if snapshot is None:
+        _upsert(user_id, {**values, 'updated_at': now})
+        return
+    for key, value in values.items():
+        setattr(snapshot, key, value)
+
+
+def get_summary(user_id: int):
+    """Сводка из снимка; при отсутствии или устаревании — пересчёт и сохранение. None — нет пользователя"""
+    snapshot = DashboardSnapshot.query.get(user_id)
+    if _is_fresh(snapshot):
+        return snapshot.to_dict()
+
+    summary = compute_summary(user_id)
+    if summary is None:
+        return None
+    _store(user_id, summary, snapshot)
+    db.session.commit()
+    return summary
+
+
+def record_assessment(assessment: Assessment):
+    """
+    Обновить снимок новой диагностикой (внутри транзакции submit_assessment).
+    Свежий снимок обновляется без запросов к assessments, иначе пересчитывается.
+    """
+    db.session.flush()
+    snapshot = DashboardSnapshot.query.get(assessment.user_id)
+    if not _is_fresh(snapshot):
+        _store(assessment.user_id, compute_summary(assessment.user_id), snapshot)
+        return
+
+    snapshot.latest_assessment = assessment.to_dict()
+    # Выражением в UPDATE, чтобы параллельные диагностики не теряли инкремент
+    snapshot.total_assessments = func.coalesce(DashboardSnapshot.total_assessments, 0) + 1
+
+
+def invalidate(user_id: int):
+    """Пометить снимок устаревшим: следующее чтение пересчитает его"""
+    DashboardSnapshot.query.filter_by(user_id=user_id).update({'computed_at': None}, synchronize_session=False)
+
+
+def update_recommendations_status(user_id: int, assessment_id: int, status: str):
+    """Обновить статус рекомендаций в снимке, если там эта диагностика"""
+    snapshot = DashboardSnapshot.query.get(user_id)
+    if snapshot is None or not snapshot.latest_assessment:
+        return
+    if snapshot.latest_assessment.get('id') != assessment_id:
+        return
+    # JSON колонка не отслеживает изменения внутри словаря — присваиваем новый
+    snapshot.latest_assessment = {**snapshot.latest_assessment, 'recommendationsStatus': status}
@@ -0,0 +1,408 @@
+"""
+Потоковый импорт выгрузки HR (CSV/XLSX) в таблицу employee_data.
+
+Строки читаются генератором и нормализуются на лету, запись идёт пачками
+многострочным INSERT ... ON CONFLICT (user_id) DO UPDATE, поэтому файл
+целиком в памяти не держится, а на 80k строк уходят секунды.
+
+Выгрузка — полный срез сотрудников, поэтому по умолчанию она заменяет
+employee_data целиком (в той же транзакции): у строк без привязки к
+пользователю нет ключа для upsert, и повторный импорт иначе дублировал бы их.
+"""
+import csv
+import os
+import re
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.dialects import postgresql, sqlite
+
+from ..db.database import db
+from ..db.db_models import EmployeeData, User
+from ..data.logger import app_logger
+
+BATCH_SIZE = 5000
+
+# Поле модели -> возможные заголовки колонки в выгрузке (после _normalize_text)
+COLUMN_ALIASES = {
+    'email': ['email', 'e-mail', 'почта', 'электронная почта'],
+    'full_name': ['full_name', 'фио', 'сотрудник', 'ф.и.о.'],
+    'legal_entity': ['legal_entity', 'юрлицо', 'юр. лицо', 'юридическое лицо'],
+    'gender': ['gender', 'пол'],
+    'city': ['city', 'город'],
+    'position': ['position', 'должность'],
+    'department': ['department', 'подразделение', 'отдел'],
+    'tenure': ['tenure', 'стаж', 'стаж работы'],
+    'age': ['age', 'возраст'],
+    'subordinates': ['subordinates', 'подчиненные', 'наличие подчиненных'],
+    'kpi_june': ['kpi_june', 'kpi июнь', 'kpi за июнь'],
+    'kpi_july': ['kpi_july', 'kpi июль', 'kpi за июль'],
+    'kpi_august': ['kpi_august', 'kpi август', 'kpi за август'],
+    'kpi_september': ['kpi_september', 'kpi сентябрь', 'kpi за сентябрь'],
+    'kpi_october': ['kpi_october', 'kpi октябрь', 'kpi за октябрь'],
+    'attestation': ['attestation', 'аттестация'],
+    'training': ['training', 'обучение'],
+    'last_vacation': ['last_vacation', 'последний отпуск', 'дата последнего отпуска'],
+    'sick_leave': ['sick_leave', 'больничный', 'больничные'],
+    'reprimand': ['reprimand', 'выговор', 'выговоры'],
+    'corporate_activities': ['corporate_activities', 'корпоративные мероприятия', 'корпоративы'],
+    'burnout_self_assessment': ['burnout_self_assessment', 'самооценка выгорания'],
+}
+
+KPI_FIELDS = ['kpi_june', 'kpi_july', 'kpi_august', 'kpi_september', 'kpi_october']
+DATE_FORMATS = ['%d.%m.%Y', '%Y-%m-%d', '%d/%m/%Y', '%d.%m.%y', '%Y-%m-%d %H:%M:%S']
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+TENURE_PATTERN = re.compile(r'(\d+(?:[.,]\d+)?)\s*(лет|год\w*|г\b\.?|мес\w*|м\b\.?)', re.IGNORECASE)
+
+
+def _normalize_text(header) -> str:
+    return ' '.join(str(header or '').replace('ё', 'е').replace('Ё', 'Е').lower().split())
+
+
+def _clean_str(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _plural(n: int, one: str, few: str, many: str) -> str:
+    if n % 10 == 1 and n % 100 != 11:
+        return one
+    if 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+        return few
+    return many
+
+
+def normalize_tenure_value(value):
+    """
+    Приводит стаж к виду «N лет M месяцев», который понимает parse_tenure.
+    Числа трактуются как стаж в годах; нераспознанные строки сохраняются как есть.
+    """
+    if value is None or value == '':
+        return None
+
+    if isinstance(value, (int, float)):
+        total_months = int(round(float(value) * 12))
+    else:
+        text = str(value).strip()
+        if not text:
+            return None
+        try:
+            total_months = int(round(float(text.replace(',', '.')) * 12))
+        except ValueError:
+            total_months = 0
+            matched = False
+            for number, unit in TENURE_PATTERN.findall(text):
+                amount = float(number.replace(',', '.'))
+                unit = unit.lower()
+                if unit.startswith('м'):
+                    total_months += amount
+                else:
+                    total_months += amount * 12
+                matched = True
+            if not matched:
+                return text
+            total_months = int(round(total_months))
+
+    years, months = divmod(max(total_months, 0), 12)
+    return f"{years} {_plural(years, 'год', 'года', 'лет')} {months} {_plural(months, 'месяц', 'месяца', 'месяцев')}"
+
+
+def normalize_date(value):
+    """Дата из datetime, серийного номера Excel или строки в одном из DATE_FORMATS"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return EXCEL_EPOCH + timedelta(days=float(value))
+
+    text = str(value).strip()
+    if not text:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    try:
+        return EXCEL_EPOCH + timedelta(days=float(text.replace(',', '.')))
+    except ValueError:
+        return None
+
+
+def normalize_kpi(value):
+    """KPI как float: поддерживаются '0,85', '85%' и пустые значения"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    text = str(value).strip().replace(' ', '').replace(',', '.')
+    if not text:
+        return None
+    is_percent = text.endswith('%')
+    try:
+        number = float(text.rstrip('%'))
+    except ValueError:
+        return None
+    return number / 100 if is_percent else number
+
+
+def normalize_age(value):
+    if value is None or value == '':
+        return None
+    try:
+        return int(float(str(value).strip().replace(',', '.')))
+    except ValueError:
+        return None
+
+
+def _iter_csv(path: str, encoding: str):
+    with open(path, newline='', encoding=encoding) as f:
+        sample = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=';,\t')
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+        header = next(reader, None)
+        if header is None:
+            return
+        yield header
+        yield from reader
+
+
+def _iter_xlsx(path: str, sheet: str = None):
+    try:
+        from openpyxl import load_workbook
+    except ImportError as e:
+        raise RuntimeError('Для импорта XLSX требуется пакет openpyxl') from e
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        yield from worksheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_raw_rows(path: str, sheet: str = None, encoding: str = 'utf-8-sig'):
+    """Генератор строк файла (первая строка — заголовок), без загрузки файла в память"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xlsm'):
+        return _iter_xlsx(path, sheet)
+    if ext in ('.csv', '.txt'):
+        return _iter_csv(path, encoding)
+    raise ValueError(f'Неподдерживаемый формат файла: {ext}')
+
+
+def iter_employee_rows(path: str, sheet: str = None, encoding: str = 'utf-8-sig'):
+    """
+    Генератор нормализованных строк выгрузки.
+
+    Yields:
+        dict: значения колонок EmployeeData и необязательный 'email' для привязки к users
+    """
+    rows = iter_raw_rows(path, sheet, encoding)
+    header = next(rows, None)
+    if header is None:
+        return
+
+    alias_to_field = {alias: field for field, aliases in COLUMN_ALIASES.items() for alias in aliases}
+    positions = {}
+    for index, title in enumerate(header):
+        field = alias_to_field.get(_normalize_text(title))
+        if field and field not in positions:
+            positions[field] = index
+
+    if 'full_name' not in positions:
+        raise ValueError('В файле нет колонки с ФИО сотрудника')
+
+    width = len(header)
+    for raw in rows:
+        if raw is None:
+            continue
+        if len(raw) < width:
+            raw = list(raw) + [None] * (width - len(raw))
+
+        values = {field: raw[index] for field, index in positions.items()}
+        full_name = _clean_str(values.get('full_name'))
+        if not full_name:
+            continue
+
+        row = {field: _clean_str(value) for field, value in values.items()
+               if field not in KPI_FIELDS and field not in ('tenure', 'age', 'last_vacation')}
+        row['full_name'] = full_name
+        row['tenure'] = normalize_tenure_value(values.get('tenure'))
+        row['age'] = normalize_age(values.get('age'))
+        row['last_vacation'] = normalize_date(values.get('last_vacation'))
+        for field in KPI_FIELDS:
+            row[field] = normalize_kpi(values.get(field))
+        yield row
+
+
+def _load_user_index():
+    """Индексы пользователей для привязки: по email и по уникальному имени"""
+    by_email = {}
+    by_name = {}
+    duplicate_names = set()
+    for user_id, email, name in db.session.query(User.id, User.email, User.name):
+        if email:
+            by_email[email.strip().lower()] = user_id
+        key = _normalize_text(name)
+        if key in by_name:
+            duplicate_names.add(key)
+        by_name[key] = user_id
+    for key in duplicate_names:
+        del by_name[key]
+    return by_email, by_name
+
+
+def _build_upsert():
+    """INSERT ... ON CONFLICT (user_id) DO UPDATE для текущего диалекта БД"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        stmt = postgresql.insert(EmployeeData.__table__)
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(EmployeeData.__table__)
+    else:
+        return EmployeeData.__table__.insert()
+
+    update_columns = {
+        column.name: stmt.excluded[column.name]
+        for column in EmployeeData.__table__.columns
+        if column.name not in ('id', 'user_id', 'created_at')
+    }
+    return stmt.on_conflict_do_update(index_elements=['user_id'], set_=update_columns)
+
+
+def _flush_batch(stmt, batch: list, seen_user_ids: set):
+    """
+    Записывает пачку; возвращает (записано строк, новых привязанных сотрудников, дубликатов).
+
+    В одной пачке строка на пользователя должна быть одна, иначе ON CONFLICT падает:
+    из повторов остаётся последняя строка. Повтор пользователя из прошлой пачки
+    перезаписывает ту же запись, поэтому тоже считается дубликатом.
+    """
+    linked = {}
+    unlinked = []
+    for row in batch:
+        if row['user_id'] is None:
+            unlinked.append(row)
+        else:
+            linked[row['user_id']] = row
+    rows = unlinked + list(linked.values())
+    db.session.execute(stmt, rows)
+
+    new_linked = linked.keys() - seen_user_ids
+    seen_user_ids.update(new_linked)
+    duplicates = len(batch) - len(unlinked) - len(new_linked)
+    if duplicates:
+        app_logger.warning("Импорт EmployeeData: %s повторных строк одного пользователя, сохранена последняя",
+                           duplicates)
+    return len(rows), len(new_linked), duplicates
+
+
+def import_employees(path: str, batch_size: int = BATCH_SIZE, sheet: str = None,
+                     encoding: str = 'utf-8-sig', append: bool = False) -> dict:
+    """
+    Импортирует выгрузку HR в employee_data.
+
+    Args:
+        path (str): путь к CSV или XLSX
+        batch_size (int): строк в одном многострочном INSERT
+        sheet (str): лист XLSX (по умолчанию — активный)
+        encoding (str): кодировка CSV
+        append (bool): не очищать employee_data перед загрузкой — строки
+            привязанных пользователей обновляются, строки без привязки
+            добавляются как новые (для дозагрузки другой выгрузки)
+
+    Returns:
+        dict: {'rows': int, 'linked': int, 'duplicates': int, 'seconds': float,
+               'rows_per_second': float}; linked — число разных привязанных
+               пользователей, duplicates — строки, перезаписанные более поздней
+               строкой того же пользователя
+    """
+    started = time.perf_counter()
+    by_email, by_name = _load_user_index()
+    stmt = _build_upsert()
+    now = datetime.utcnow()
+
+    total = 0
+    linked = 0
+    duplicates = 0
+    seen_user_ids = set()
+    batch = []
+
+    try:
+        if not append:
+            db.session.query(EmployeeData).delete(synchronize_session=False)
+
+        for row in iter_employee_rows(path, sheet, encoding):
+            email = (row.pop('email', None) or '').lower()
+            user_id = by_email.get(email) if email else None
+            if user_id is None:
+                user_id = by_name.get(_normalize_text(row['full_name']))
+
+            row['user_id'] = user_id
+            row['created_at'] = now
+            row['updated_at'] = now
+            for column in COLUMN_ALIASES:
+                if column != 'email':
+                    row.setdefault(column, None)
+            batch.append(row)
+
+            if len(batch) >= batch_size:
+                written, batch_linked, batch_duplicates = _flush_batch(stmt, batch, seen_user_ids)
+                total += written
+                linked += batch_linked
+                duplicates += batch_duplicates
+                batch = []
+                app_logger.debug("Импорт EmployeeData: записано %s строк", total)
+
+        if batch:
+            written, batch_linked, batch_duplicates = _flush_batch(stmt, batch, seen_user_ids)
+            total += written
+            linked += batch_linked
+            duplicates += batch_duplicates
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    seconds = time.perf_counter() - started
+    stats = {
+        'rows': total,
+        'linked': linked,
+        'duplicates': duplicates,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(total / seconds, 1) if seconds > 0 else float(total),
+    }
+    app_logger.info("Импорт EmployeeData из %s завершён: %s", path, stats)
+    return stats
+
+
+@click.command('import-employees')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', type=int, default=BATCH_SIZE, show_default=True,
+              help='Строк в одном многострочном INSERT')
+@click.option('--sheet', default=None, help='Лист XLSX (по умолчанию — активный)')
+@click.option('--encoding', default='utf-8-sig', show_default=True, help='Кодировка CSV')
+@click.option('--append', is_flag=True,
+              help='Дополнить employee_data, не удаляя прежние строки (строки без привязки добавляются заново)')
+@with_appcontext
+def import_employees_command(path, batch_size, sheet, encoding, append):
+    """Импортировать выгрузку HR (CSV/XLSX) в employee_data (по умолчанию заменяет прежние данные)"""
+    stats = import_employees(path, batch_size, sheet, encoding, append)
+    click.echo(
+        f"Загружено {stats['rows']} строк (привязано к пользователям: {stats['linked']}, "
+        f"повторов пользователя: {stats['duplicates']}) "
+        f"за {stats['seconds']} с — {stats['rows_per_second']} строк/с"
+    )
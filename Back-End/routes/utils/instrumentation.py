@@ -0,0 +1,135 @@
+"""
+Сбор метрик приложения: время HTTP запросов по маршрутам, время SQL запросов,
+состояние кэшей и пулов (БД, фоновые задачи, батчеры, логирование).
+"""
+import time
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import metrics
+from .background import executor_stats
+from .batcher import MicroBatcher
+from .cache import TTLCache
+from .single_flight import SingleFlight
+from ..data.logger import logging_stats
+
+HTTP_REQUEST_DURATION = metrics.histogram(
+    'http_request_duration_seconds', 'Время обработки HTTP запроса',
+    ('blueprint', 'route', 'method', 'status'),
+)
+DB_QUERY_DURATION = metrics.histogram(
+    'db_query_duration_seconds', 'Время выполнения SQL запроса',
+    ('operation',), buckets=metrics.DB_BUCKETS,
+)
+DB_QUERY_ERRORS = metrics.counter('db_query_errors_total', 'SQL запросы, завершившиеся ошибкой', ('operation',))
+
+CACHE_HITS = metrics.counter('cache_hits_total', 'Попадания в кэш', ('cache',))
+CACHE_MISSES = metrics.counter('cache_misses_total', 'Промахи кэша', ('cache',))
+CACHE_EVICTIONS = metrics.counter('cache_evictions_total', 'Вытеснения из кэша по размеру', ('cache',))
+CACHE_SIZE = metrics.gauge('cache_entries', 'Записей в кэше', ('cache',))
+
+DB_POOL_SIZE = metrics.gauge('db_pool_size', 'Размер пула соединений БД')
+DB_POOL_CHECKED_OUT = metrics.gauge('db_pool_checked_out', 'Соединений БД выдано')
+DB_POOL_OVERFLOW = metrics.gauge('db_pool_overflow', 'Соединений БД сверх размера пула')
+
+BACKGROUND_WORKERS = metrics.gauge('background_pool_workers', 'Размер фонового пула задач')
+BACKGROUND_THREADS = metrics.gauge('background_pool_threads', 'Запущено потоков фонового пула')
+BACKGROUND_PENDING = metrics.gauge('background_pool_pending', 'Задач в очереди фонового пула')
+
+BATCHER_PENDING = metrics.gauge('batcher_pending', 'Заданий в очереди микробатчера', ('batcher',))
+BATCHER_BATCHES = metrics.counter('batcher_batches_total', 'Обработано пачек', ('batcher',))
+BATCHER_ITEMS = metrics.counter('batcher_items_total', 'Обработано заданий', ('batcher',))
+
+SINGLE_FLIGHT_CALLS = metrics.counter('single_flight_calls_total', 'Выполненные вызовы', ('name',))
+SINGLE_FLIGHT_COALESCED = metrics.counter('single_flight_coalesced_total', 'Вызовы, дождавшиеся чужого результата', ('name',))
+
+LOG_DROPPED = metrics.counter('log_records_dropped_total', 'Записи лога, отброшенные при переполнении очереди', ('logger',))
+LOG_SUPPRESSED = metrics.counter('log_records_suppressed_total', 'Подавленные повторы и отсэмплированные записи лога', ('logger',))
+
+_SQL_OPERATIONS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'}
+
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)[0].upper() if statement and statement.strip() else ''
+    return word if word in _SQL_OPERATIONS else 'OTHER'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if started:
+        DB_QUERY_DURATION.observe(time.perf_counter() - started.pop(), _operation(statement))
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    started = context.connection.info.get('query_started') if context.connection is not None else None
+    if started:
+        started.pop()
+    DB_QUERY_ERRORS.inc(_operation(context.statement or ''))
+
+
+def _collect_runtime(engine):
+    for cache in list(TTLCache.instances):
+        CACHE_HITS.set_total(cache.hits, cache.name)
+        CACHE_MISSES.set_total(cache.misses, cache.name)
+        CACHE_EVICTIONS.set_total(cache.evictions, cache.name)
+        CACHE_SIZE.set(len(cache), cache.name)
+
+    for batcher in list(MicroBatcher.instances):
+        stats = batcher.stats()
+        BATCHER_PENDING.set(stats['pending'], batcher.name)
+        BATCHER_BATCHES.set_total(stats['batches'], batcher.name)
+        BATCHER_ITEMS.set_total(stats['items'], batcher.name)
+
+    for flight in list(SingleFlight.instances):
+        SINGLE_FLIGHT_CALLS.set_total(flight.calls, flight.name)
+        SINGLE_FLIGHT_COALESCED.set_total(flight.coalesced, flight.name)
+
+    background = executor_stats()
+    BACKGROUND_WORKERS.set(background['workers'])
+    BACKGROUND_THREADS.set(background['threads'])
+    BACKGROUND_PENDING.set(background['pending'])
+
+    for name, stats in logging_stats()['loggers'].items():
+        LOG_DROPPED.set_total(stats['dropped'], name)
+        LOG_SUPPRESSED.set_total(stats['suppressed'] + stats['sampled_out'], name)
+
+    pool = engine.pool if engine is not None else None
+    if pool is not None and hasattr(pool, 'checkedout'):
+        DB_POOL_SIZE.set(pool.size())
+        DB_POOL_CHECKED_OUT.set(pool.checkedout())
+        DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+
+def init_metrics(app, db):
+    """Подключить сбор метрик HTTP запросов и состояния пулов к приложению"""
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                request.blueprint or 'app', rule, request.method, response.status_code,
+            )
+        return response
+
+    try:
+        with app.app_context():
+            engine = db.engine
+    except Exception:
+        engine = None
+    metrics.register_collector(lambda: _collect_runtime(engine))
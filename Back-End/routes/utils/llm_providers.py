@@ -0,0 +1,547 @@
+"""
+Единый слой LLM-провайдеров (Yandex GPT, OpenAI, локальный endpoint).
+
+Настройки читаются из окружения один раз при инициализации, у каждого
+провайдера свой requests.Session с пулом соединений. Чат, выбор рекомендаций
+и рекомендации менеджеру вызывают провайдеров напрямую, без HTTP к /ai/chat.
+"""
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from ..data.logger import ai_logger
+from . import metrics, tracing
+
+YANDEX_GPT_URL = 'https://llm.api.cloud.yandex.net/foundationModels/v1/completion'
+OPENAI_URL = 'https://api.openai.com/v1/chat/completions'
+
+load_dotenv()
+
+# outcome: ok — получен ответ, empty — ответ без текста или не 200, timeout, error
+LLM_REQUEST_DURATION = metrics.histogram(
+    'llm_request_duration_seconds', 'Время запроса к LLM провайдеру',
+    ('provider', 'mode', 'outcome'), buckets=metrics.LLM_BUCKETS,
+)
+
+
+class LLMProvider:
+    """Базовый провайдер: пул соединений и общий интерфейс complete()"""
+
+    name = 'base'
+
+    def __init__(self, timeout: float, pool_size: int):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def complete(self, messages: list, temperature: float = None, max_tokens: int = None,
+                 timeout: float = None, json_schema: dict = None):
+        """
+        Получить ответ модели.
+
+        Args:
+            messages (list): [{'role': 'system' | 'user' | 'assistant', 'content': str}, ...]
+            json_schema (dict): JSON Schema ответа для провайдеров со structured output
+
+        Returns:
+            str | None: текст ответа или None, если провайдер не ответил
+        """
+        started = time.perf_counter()
+        outcome = 'error'
+        with tracing.span(f'llm.{self.name}', tracing.KIND_CLIENT) as llm_span:
+            try:
+                reply = self._complete(messages, temperature, max_tokens, timeout or self.timeout, json_schema)
+                outcome = 'ok' if reply else 'empty'
+                return reply
+            except requests.exceptions.Timeout:
+                outcome = 'timeout'
+                ai_logger.warning('Timeout contacting %s', self.name)
+            except Exception as e:
+                ai_logger.warning('Error contacting %s: %s', self.name, e)
+            finally:
+                LLM_REQUEST_DURATION.observe(time.perf_counter() - started, self.name, 'complete', outcome)
+                if llm_span is not None:
+                    llm_span.set('llm.outcome', outcome)
+        return None
+
+    def _complete(self, messages, temperature, max_tokens, timeout, json_schema=None):
+        raise NotImplementedError
+
+    def stream(self, messages: list, temperature: float = None, max_tokens: int = None,
+               timeout: float = None):
+        """
+        Генератор фрагментов ответа по мере их получения от провайдера.
+        Закрытие генератора (например, при отключении клиента) закрывает HTTP-ответ.
+        Ошибки логируются, генератор при этом просто завершается.
+        """
+        started = time.perf_counter()
+        outcome = 'empty'
+        try:
+            for chunk in self._stream(messages, temperature, max_tokens, timeout or self.timeout):
+                outcome = 'ok'
+                yield chunk
+        except requests.exceptions.Timeout:
+            outcome = 'timeout'
+            ai_logger.warning('Timeout streaming from %s', self.name)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            outcome = 'error'
+            ai_logger.warning('Error streaming from %s: %s', self.name, e)
+        finally:
+            LLM_REQUEST_DURATION.observe(time.perf_counter() - started, self.name, 'stream', outcome)
+
+    def _stream(self, messages, temperature, max_tokens, timeout):
+        # Провайдер без потокового API: получаем ответ целиком и режем на части
+        reply = self._complete(messages, temperature, max_tokens, timeout, None)
+        if reply:
+            yield from chunk_text(reply)
+
+
+def chunk_text(text: str, words_per_chunk: int = 3):
+    """Разбить текст на фрагменты по несколько слов (с сохранением пробелов)"""
+    words = re.findall(r'\S+\s*', text)
+    for i in range(0, len(words), words_per_chunk):
+        yield ''.join(words[i:i + words_per_chunk])
+
+
+class YandexGPTProvider(LLMProvider):
+    name = 'yandex'
+
+    def __init__(self, api_key, iam_token, catalog_id, model, temperature, max_tokens,
+                 timeout=60, pool_size=10, url=YANDEX_GPT_URL):
+        super().__init__(timeout, pool_size)
+        self.url = url
+        self.catalog_id = catalog_id
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.session.headers['Content-Type'] = 'application/json'
+        self.session.headers['x-folder-id'] = catalog_id
+        # Используем либо API Key, либо IAM токен (приоритет: API Key)
+        if api_key:
+            self.session.headers['Authorization'] = f'Api-Key {api_key}'
+        else:
+            self.session.headers['Authorization'] = f'Bearer {iam_token}'
+
+    def _payload(self, messages, temperature, max_tokens, stream=False, json_schema=None):
+        payload = {
+            'modelUri': f'gpt://{self.catalog_id}/{self.model}',
+            'completionOptions': {
+                'stream': stream,
+                'temperature': self.temperature if temperature is None else temperature,
+                'maxTokens': self.max_tokens if max_tokens is None else max_tokens,
+            },
+            'messages': [{'role': m['role'], 'text': m['content']} for m in messages],
+        }
+        if json_schema:
+            payload['jsonSchema'] = {'schema': json_schema}
+        return payload
+
+    @staticmethod
+    def _extract_text(response_data):
+        if isinstance(response_data, dict):
+            result = response_data.get('result')
+            if isinstance(result, dict):
+                alternatives = result.get('alternatives')
+                if isinstance(alternatives, list) and len(alternatives) > 0:
+                    first_alt = alternatives[0]
+                    if isinstance(first_alt, dict):
+                        return (first_alt.get('message') or {}).get('text')
+        return None
+
+    def _complete(self, messages, temperature, max_tokens, timeout, json_schema=None):
+        payload = self._payload(messages, temperature, max_tokens, json_schema=json_schema)
+
+        ai_logger.info('Sending request to Yandex GPT API: model=%s', self.model)
+        resp = self.session.post(self.url, json=payload, timeout=timeout)
+        ai_logger.info('Yandex GPT response status: %s', resp.status_code)
+
+        if resp.status_code != 200:
+            try:
+                ai_logger.warning('Yandex GPT error: %s', resp.json())
+            except ValueError:
+                ai_logger.warning('Yandex GPT response: %s', resp.text)
+            return None
+
+        reply = self._extract_text(resp.json())
+        return reply.strip() if reply else None
+
+    def _stream(self, messages, temperature, max_tokens, timeout):
+        # Потоковый режим: строки JSON, в каждой — весь текст на текущий момент
+        payload = self._payload(messages, temperature, max_tokens, stream=True)
+
+        ai_logger.info('Streaming from Yandex GPT API: model=%s', self.model)
+        with self.session.post(self.url, json=payload, timeout=timeout, stream=True) as resp:
+            if resp.status_code != 200:
+                ai_logger.warning('Yandex GPT returned status %s', resp.status_code)
+                return
+
+            sent = ''
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                text = self._extract_text(json.loads(line)) or ''
+                if len(text) > len(sent) and text.startswith(sent):
+                    yield text[len(sent):]
+                    sent = text
+
+
+# Модели OpenAI со structured outputs (response_format json_schema); остальные, например
+# gpt-3.5-turbo, отвечают на него 400 и получают json_object
+OPENAI_JSON_SCHEMA_MODELS = ('gpt-4o', 'gpt-4.1', 'gpt-5', 'o1', 'o3', 'o4')
+# Порядок деградации формата ответа при 400 от API
+OPENAI_JSON_MODES = ('json_schema', 'json_object', 'off')
+
+
+def openai_json_mode(model: str, setting: str = 'auto') -> str:
+    """Формат ответа для запросов со схемой: json_schema, json_object или off (OPENAI_JSON_SCHEMA)"""
+    setting = (setting or 'auto').strip().lower()
+    if setting in OPENAI_JSON_MODES:
+        return setting
+    if setting != 'auto':
+        ai_logger.warning('Unknown OPENAI_JSON_SCHEMA=%s, using auto', setting)
+    name = (model or '').lower().rsplit('/', 1)[-1]
+    return 'json_schema' if name.startswith(OPENAI_JSON_SCHEMA_MODELS) else 'json_object'
+
+
+def _rejects_response_format(resp) -> bool:
+    """Ответ 400 относится к response_format (а не к длине контекста, max_tokens и т. п.)"""
+    try:
+        error = resp.json().get('error') or {}
+    except (ValueError, AttributeError):
+        return False
+    if not isinstance(error, dict):
+        return False
+    if error.get('param') == 'response_format':
+        return True
+    return (error.get('type') == 'invalid_request_error'
+            and 'response_format' in str(error.get('message') or ''))
+
+
+class OpenAIProvider(LLMProvider):
+    name = 'openai'
+
+    def __init__(self, api_key, model, temperature, max_tokens, timeout=60, pool_size=10,
+                 url=OPENAI_URL, json_mode='auto'):
+        super().__init__(timeout, pool_size)
+        self.url = url
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.json_mode = openai_json_mode(model, json_mode)
+        self.session.headers['Content-Type'] = 'application/json'
+        self.session.headers['Authorization'] = f'Bearer {api_key}'
+
+    def _payload(self, messages, temperature, max_tokens, stream=False, json_schema=None, json_mode=None):
+        payload = {
+            'model': self.model,
+            'messages': messages,
+            'temperature': self.temperature if temperature is None else temperature,
+            'max_tokens': self.max_tokens if max_tokens is None else max_tokens,
+            'n': 1,
+            'stream': stream,
+        }
+        json_mode = json_mode or self.json_mode
+        if json_schema and json_mode == 'json_schema':
+            payload['response_format'] = {
+                'type': 'json_schema',
+                'json_schema': {'name': 'response', 'schema': json_schema, 'strict': True},
+            }
+        elif json_schema and json_mode == 'json_object':
+            payload['response_format'] = {'type': 'json_object'}
+        return payload
+
+    def _complete(self, messages, temperature, max_tokens, timeout, json_schema=None):
+        json_mode = self.json_mode
+        while True:
+            payload = self._payload(messages, temperature, max_tokens, json_schema=json_schema, json_mode=json_mode)
+
+            ai_logger.info('Sending request to OpenAI API')
+            resp = self.session.post(self.url, json=payload, timeout=timeout)
+
+            # Модель не поддерживает формат ответа: повтор с более простым, и дальше
+            # провайдер сразу использует его
+            if resp.status_code == 400 and 'response_format' in payload and _rejects_response_format(resp):
+                json_mode = OPENAI_JSON_MODES[OPENAI_JSON_MODES.index(json_mode) + 1]
+                ai_logger.warning('OpenAI rejected response_format for %s, falling back to %s',
+                                  self.model, json_mode)
+                self.json_mode = json_mode
+                continue
+            break
+
+        if resp.status_code != 200:
+            ai_logger.warning('OpenAI returned status %s', resp.status_code)
+            return None
+
+        reply = None
+        data = resp.json()
+        if isinstance(data, dict):
+            choices = data.get('choices')
+            if isinstance(choices, list) and len(choices) > 0:
+                msg = choices[0].get('message')
+                if isinstance(msg, dict):
+                    reply = msg.get('content')
+
+        return reply.strip() if reply else None
+
+    def _stream(self, messages, temperature, max_tokens, timeout):
+        # Server-Sent Events: "data: {...}" с choices[0].delta.content, в конце "data: [DONE]"
+        payload = self._payload(messages, temperature, max_tokens, stream=True)
+
+        ai_logger.info('Streaming from OpenAI API')
+        with self.session.post(self.url, json=payload, timeout=timeout, stream=True) as resp:
+            if resp.status_code != 200:
+                ai_logger.warning('OpenAI returned status %s', resp.status_code)
+                return
+
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                choices = json.loads(data).get('choices') or []
+                delta = (choices[0].get('delta') or {}).get('content') if choices else None
+                if delta:
+                    yield delta
+
+
+class LocalLLMProvider(LLMProvider):
+    """Локальный endpoint с протоколом {'message': ...} -> {'reply': ...}"""
+
+    name = 'local'
+
+    def __init__(self, endpoint, timeout=30, pool_size=10):
+        super().__init__(timeout, pool_size)
+        self.endpoint = endpoint
+
+    def _complete(self, messages, temperature, max_tokens, timeout, json_schema=None):
+        message = '\n\n'.join(m['content'] for m in messages)
+
+        ai_logger.info('Sending request to local endpoint: %s', self.endpoint)
+        resp = self.session.post(self.endpoint, json={'message': message}, timeout=timeout)
+
+        if resp.status_code != 200:
+            ai_logger.warning('Local LLM endpoint returned status %s', resp.status_code)
+            return None
+
+        payload = resp.json()
+        reply = payload.get('reply') if isinstance(payload, dict) else None
+        return reply.strip() if reply else None
+
+
+def load_providers(env=None) -> list:
+    """Создать провайдеров из окружения в порядке приоритета: Yandex GPT, OpenAI, локальный endpoint"""
+    env = os.environ if env is None else env
+    pool_size = int(env.get('LLM_POOL_SIZE', '10'))
+    providers = []
+
+    yandex_api_key = env.get('YANDEX_GPT_API_KEY')
+    yandex_iam_token = env.get('YANDEX_GPT_IAM_TOKEN')
+    if yandex_api_key or yandex_iam_token:
+        providers.append(YandexGPTProvider(
+            api_key=yandex_api_key,
+            iam_token=yandex_iam_token,
+            catalog_id=env.get('YANDEX_GPT_CATALOG_ID', ''),
+            model=env.get('YANDEX_GPT_MODEL', 'yandexgpt/latest'),
+            temperature=float(env.get('YANDEX_GPT_TEMPERATURE', '0.7')),
+            max_tokens=int(env.get('YANDEX_GPT_MAX_TOKENS', '512')),
+            pool_size=pool_size,
+            url=env.get('YANDEX_GPT_URL', YANDEX_GPT_URL),
+        ))
+
+    openai_key = env.get('OPENAI_API_KEY')
+    if openai_key:
+        providers.append(OpenAIProvider(
+            api_key=openai_key,
+            model=env.get('OPENAI_MODEL', 'gpt-3.5-turbo'),
+            temperature=float(env.get('OPENAI_TEMPERATURE', '0.7')),
+            max_tokens=int(env.get('OPENAI_MAX_TOKENS', '512')),
+            pool_size=pool_size,
+            url=env.get('OPENAI_URL', OPENAI_URL),
+            json_mode=env.get('OPENAI_JSON_SCHEMA', 'auto'),
+        ))
+
+    local_endpoint = env.get('LOCAL_LLM_ENDPOINT')
+    if local_endpoint:
+        providers.append(LocalLLMProvider(local_endpoint, pool_size=pool_size))
+
+    return providers
+
+
+def load_routing(env=None) -> dict:
+    """
+    Режим опроса провайдеров:
+    - sequential: по очереди, следующий — только после ошибки предыдущего
+    - hedge: следующий провайдер запускается, если предыдущий не ответил за LLM_HEDGE_DELAY секунд
+    - race: все провайдеры одновременно, берётся первый валидный ответ
+
+    LLM_PROVIDERS (например, "yandex,openai") задаёт набор и порядок провайдеров.
+    """
+    env = os.environ if env is None else env
+    mode = env.get('LLM_MODE', 'sequential').strip().lower()
+    if mode not in ('sequential', 'hedge', 'race'):
+        ai_logger.warning('Unknown LLM_MODE=%s, using sequential', mode)
+        mode = 'sequential'
+    providers = [name.strip() for name in env.get('LLM_PROVIDERS', '').split(',') if name.strip()]
+    return {
+        'mode': mode,
+        'hedge_delay': float(env.get('LLM_HEDGE_DELAY', '2.0')),
+        'providers': providers,
+    }
+
+
+_providers = None
+_routing = {'mode': 'sequential', 'hedge_delay': 2.0, 'providers': []}
+_executor = None
+_providers_lock = threading.Lock()
+
+
+def init_providers(env=None) -> list:
+    """Инициализировать провайдеров и режим опроса (вызывается при старте приложения)"""
+    global _providers, _routing, _executor
+    with _providers_lock:
+        _providers = load_providers(env)
+        _routing = load_routing(env)
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = None
+        if _routing['mode'] != 'sequential' and len(_providers) > 1:
+            pool_size = int((os.environ if env is None else env).get('LLM_POOL_SIZE', '10'))
+            _executor = ThreadPoolExecutor(max_workers=pool_size * len(_providers), thread_name_prefix='llm')
+    ai_logger.info("LLM провайдеры: %s, режим: %s", [p.name for p in _providers] or 'не настроены', _routing['mode'])
+    return _providers
+
+
+def get_providers() -> list:
+    if _providers is None:
+        return init_providers()
+    return _providers
+
+
+def get_provider(name: str):
+    for provider in get_providers():
+        if provider.name == name:
+            return provider
+    return None
+
+
+def _select_providers() -> list:
+    """Провайдеры из LLM_PROVIDERS (в заданном порядке) или все настроенные"""
+    providers = get_providers()
+    if not _routing['providers']:
+        return providers
+    by_name = {p.name: p for p in providers}
+    return [by_name[name] for name in _routing['providers'] if name in by_name]
+
+
+def build_messages(prompt: str, system: str = None) -> list:
+    messages = []
+    if system:
+        messages.append({'role': 'system', 'content': system})
+    messages.append({'role': 'user', 'content': prompt})
+    return messages
+
+
+def _complete_sequential(providers, messages, temperature, max_tokens, timeout, json_schema):
+    for provider in providers:
+        reply = provider.complete(messages, temperature, max_tokens, timeout, json_schema)
+        if reply:
+            ai_logger.info('Successfully got reply from %s', provider.name)
+            return reply
+        ai_logger.info('%s error or invalid response, trying next provider', provider.name)
+    return None
+
+
+def _complete_hedged(providers, messages, temperature, max_tokens, timeout, json_schema, delay):
+    """
+    Запускает провайдеров по одному с задержкой delay (0 — все сразу) и
+    возвращает первый валидный ответ. Следующий провайдер стартует раньше,
+    если все запущенные уже завершились ошибкой. Незапущенные запросы
+    отменяются, ответы уже отправленных игнорируются.
+    """
+    queue = list(providers)
+    pending = {}
+
+    def launch():
+        provider = queue.pop(0)
+        # copy_context: span'ы запроса провайдера попадают в трассу вызывающего потока
+        future = _executor.submit(contextvars.copy_context().run, provider.complete,
+                                  messages, temperature, max_tokens, timeout, json_schema)
+        pending[future] = provider
+
+    launch()
+    while delay <= 0 and queue:
+        launch()
+
+    try:
+        while pending:
+            done, _ = wait(pending, timeout=delay if queue else None, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                provider = pending.pop(future)
+                reply = future.result()
+                if reply:
+                    ai_logger.info('Successfully got reply from %s (hedged)', provider.name)
+                    return reply
+                ai_logger.info('%s error or invalid response', provider.name)
+
+            if queue and (not done or not pending):
+                launch()
+        return None
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def complete(prompt: str, system: str = None, temperature: float = None,
+             max_tokens: int = None, timeout: float = None, json_schema: dict = None):
+    """
+    Получить ответ от провайдеров в режиме LLM_MODE (см. load_routing).
+    json_schema включает structured output у Yandex GPT и OpenAI; локальный
+    endpoint его игнорирует, поэтому формат ответа всё равно нужно проверять.
+
+    Returns:
+        str | None: текст ответа или None, если ни один провайдер не ответил
+    """
+    messages = build_messages(prompt, system)
+    providers = _select_providers()
+
+    if _executor is None or len(providers) < 2:
+        return _complete_sequential(providers, messages, temperature, max_tokens, timeout, json_schema)
+
+    delay = 0 if _routing['mode'] == 'race' else _routing['hedge_delay']
+    return _complete_hedged(providers, messages, temperature, max_tokens, timeout, json_schema, delay)
+
+
+def stream_complete(prompt: str, system: str = None, temperature: float = None,
+                    max_tokens: int = None, timeout: float = None):
+    """
+    Генератор фрагментов ответа. Провайдеры опрашиваются по порядку: следующий
+    пробуется, только если предыдущий не отдал ни одного фрагмента.
+    """
+    messages = build_messages(prompt, system)
+    providers = _select_providers()
+
+    for provider in providers:
+        chunks = provider.stream(messages, temperature, max_tokens, timeout)
+        try:
+            got_reply = False
+            for chunk in chunks:
+                got_reply = True
+                yield chunk
+            if got_reply:
+                ai_logger.info('Successfully streamed reply from %s', provider.name)
+                return
+        finally:
+            chunks.close()
+        ai_logger.info('%s returned no stream, trying next provider', provider.name)
@@ -0,0 +1,122 @@
+"""
+Детерминированный локальный ранжировщик рекомендаций (без обращения к LLM).
+
+Каждой рекомендации каталога сопоставлен вектор признаков по трём шкалам
+диагностики (профессиональная активность, психическая стабильность,
+эмоциональное отношение) и итоговому баллу сотрудника. Профиль сотрудника
+сравнивается со всеми векторами одной матричной операцией, затем top-k
+набирается с ограничением числа рекомендаций из одной группы.
+
+Косинусное сходство учитывает только соотношение шкал, поэтому к нему
+добавляется соответствие тяжести выгорания (среднее по шкалам) уровню
+рекомендации по её приоритету: при высоком выгорании вперёд выходят
+рекомендации высокого приоритета, при низком — лёгкие.
+"""
+import numpy as np
+
+# Группа рекомендации -> сродство к (проф. активность, псих. стабильность, эмоц. отношение, итоговый балл)
+GROUP_FEATURES = {
+    'work': (1.0, 0.2, 0.1, 0.3),
+    'body': (0.3, 0.5, 0.2, 1.0),
+    'mind': (0.2, 1.0, 0.3, 0.6),
+    'social': (0.1, 0.3, 1.0, 0.3),
+    'leisure': (0.6, 0.3, 0.6, 0.2),
+}
+
+CATEGORY_GROUPS = {
+    'Тайм-менеджмент': 'work',
+    'Саморазвитие': 'work',
+    'Цели': 'work',
+    'Границы': 'work',
+    'Фокус': 'work',
+    'Тайм-блокинг': 'work',
+    'Правило 80/20': 'work',
+    'Цифровой детокс': 'work',
+    'Физическая активность': 'body',
+    'Сон': 'body',
+    'Питание': 'body',
+    'Гидратация': 'body',
+    'Йога': 'body',
+    'Кофеин': 'body',
+    'Зелёный чай': 'body',
+    'Сауна': 'body',
+    'Темнота': 'body',
+    'Танцы': 'body',
+    'Медитация': 'mind',
+    'Дыхание': 'mind',
+    'Дыхание 4-7-8': 'mind',
+    'Ароматерапия': 'mind',
+    'Медитация любящей доброты': 'mind',
+    'Самосострадание': 'mind',
+    'Ведение дневника': 'mind',
+    'Социальные связи': 'social',
+    'Волонтерство': 'social',
+    'Смех': 'social',
+    'Игры': 'social',
+    'Добрые дела': 'social',
+    'Объятия': 'social',
+    'Слушание': 'social',
+    'Благодарность': 'social',
+    'Чтение': 'leisure',
+    'Природа': 'leisure',
+    'Музыка': 'leisure',
+    'Хобби': 'leisure',
+    'Лесные ванны': 'leisure',
+    'Минимализм': 'leisure',
+    'Книги по привычкам': 'leisure',
+    'Подкасты': 'leisure',
+    'Эпикур': 'leisure',
+}
+
+DEFAULT_GROUP = 'leisure'
+# Приоритет рекомендации -> тяжесть выгорания (0..1), для которой она подходит лучше всего
+PRIORITY_SEVERITY = {'high': 0.8, 'medium': 0.5, 'low': 0.2}
+DEFAULT_SEVERITY = 0.5
+# Вес соответствия тяжести относительно косинусного сходства
+SEVERITY_WEIGHT = 0.3
+
+
+class LocalRanker:
+    """Ранжирование каталога по сходству векторов признаков с профилем сотрудника"""
+
+    def __init__(self, entries: list, priority_fn=None, max_per_group: int = 2):
+        self.entries = entries
+        self.max_per_group = max_per_group
+        self.groups = [CATEGORY_GROUPS.get(rec['category'], DEFAULT_GROUP) for rec in entries]
+
+        features = np.array([GROUP_FEATURES[group] for group in self.groups], dtype=np.float64)
+        self._features = features / np.linalg.norm(features, axis=1, keepdims=True)
+        self._severity = np.array(
+            [PRIORITY_SEVERITY.get(priority_fn(rec['title']), DEFAULT_SEVERITY) if priority_fn else DEFAULT_SEVERITY
+             for rec in entries],
+            dtype=np.float64
+        )
+
+    def scores(self, professional: float, mental: float, emotional: float, employee: float) -> np.ndarray:
+        """Косинусное сходство профиля с каждой рекомендацией плюс соответствие тяжести выгорания"""
+        profile = np.array([professional, mental, emotional, employee], dtype=np.float64)
+        severity = min(max(float(profile.mean()), 0.0), 1.0)
+        fit = SEVERITY_WEIGHT * (1.0 - np.abs(self._severity - severity))
+        norm = np.linalg.norm(profile)
+        if norm == 0:
+            return fit
+        return self._features @ (profile / norm) + fit
+
+    def top_k(self, professional: float, mental: float, emotional: float, employee: float,
+              k: int = 6) -> list:
+        """k лучших рекомендаций, не более max_per_group из одной группы"""
+        scores = self.scores(professional, mental, emotional, employee)
+        # Стабильная сортировка: при равных баллах сохраняется порядок каталога
+        order = np.argsort(-scores, kind='stable')
+
+        picked = []
+        per_group = {}
+        for index in order.tolist():
+            group = self.groups[index]
+            if per_group.get(group, 0) >= self.max_per_group:
+                continue
+            per_group[group] = per_group.get(group, 0) + 1
+            picked.append(self.entries[index])
+            if len(picked) >= k:
+                break
+        return picked
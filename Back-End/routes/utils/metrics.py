@@ -0,0 +1,340 @@
+"""
+Метрики приложения в текстовом формате Prometheus (/metrics).
+
+Счётчики, гистограммы и gauge хранятся в памяти процесса; запись — O(1) под
+коротким локом, без ввода-вывода. Значения, которые дёшево прочитать в момент
+сбора (размеры кэшей, пулы), снимаются функциями-сборщиками (register_collector).
+
+Несколько процессов (gunicorn workers): если задан METRICS_MULTIPROC_DIR, каждый
+процесс раз в METRICS_FLUSH_INTERVAL секунд и при завершении сохраняет свой снимок
+в файл этой директории, а /metrics суммирует снимки всех процессов. Счётчики и
+гистограммы завершившихся процессов сохраняются, gauge — только живых процессов.
+Директорию нужно очищать при перезапуске сервиса.
+"""
+import atexit
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR') or os.getenv('PROMETHEUS_MULTIPROC_DIR')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Metric:
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels) -> tuple:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f'{self.name}: ожидаются метки {self.labelnames}, получено {labels}')
+        return tuple(str(value) for value in labels)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = [[list(key), value] for key, value in self._values.items()]
+        return {'type': self.type, 'help': self.documentation, 'labels': list(self.labelnames),
+                'samples': samples}
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик"""
+
+    type = 'counter'
+
+    def inc(self, *labels, amount: float = 1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, *labels):
+        """Текущее значение внешнего счётчика (для сборщиков, например TTLCache.hits)"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(_Metric):
+    """Текущее значение; в режиме нескольких процессов суммируется по живым процессам"""
+
+    type = 'gauge'
+
+    def set(self, value: float, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels, amount: float = 1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """Гистограмма: счётчики по корзинам, сумма и число наблюдений"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = [[list(key), [list(counts), total]] for key, (counts, total) in self._values.items()]
+        return {'type': self.type, 'help': self.documentation, 'labels': list(self.labelnames),
+                'buckets': list(self.buckets), 'samples': samples}
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+_registry = {}
+_collectors = []
+_registry_lock = threading.Lock()
+
+
+def _register(cls, name, documentation, labelnames, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, documentation, labelnames, **kwargs)
+        return metric
+
+
+def counter(name: str, documentation: str, labelnames=()) -> Counter:
+    return _register(Counter, name, documentation, labelnames)
+
+
+def gauge(name: str, documentation: str, labelnames=()) -> Gauge:
+    return _register(Gauge, name, documentation, labelnames)
+
+
+def histogram(name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+def register_collector(fn):
+    """fn() вызывается перед каждым снимком и обновляет gauge/счётчики"""
+    _collectors.append(fn)
+    return fn
+
+
+def snapshot() -> dict:
+    """Снимок всех метрик процесса (после запуска сборщиков)"""
+    for collector in list(_collectors):
+        try:
+            collector()
+        except Exception:
+            pass
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {metric.name: metric.snapshot() for metric in metrics}
+
+
+# --- Несколько процессов ---------------------------------------------------
+
+_process_id = None
+_flush_thread = None
+_flush_stop = threading.Event()
+
+
+def _snapshot_path(process_id: str) -> str:
+    return os.path.join(METRICS_MULTIPROC_DIR, f'metrics_{process_id}.json')
+
+
+def flush():
+    """Сохранить снимок процесса в METRICS_MULTIPROC_DIR (запись через временный файл)"""
+    if not METRICS_MULTIPROC_DIR or _process_id is None:
+        return
+    path = _snapshot_path(_process_id)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'pid': os.getpid(), 'metrics': snapshot()}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _flush_loop():
+    while not _flush_stop.wait(METRICS_FLUSH_INTERVAL):
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def _start_process():
+    """Новый идентификатор снимка и поток сохранения (заново — в дочернем процессе после fork)"""
+    global _process_id, _flush_thread
+    _process_id = f'{os.getpid()}_{uuid.uuid4().hex[:8]}'
+    if not METRICS_MULTIPROC_DIR:
+        return
+    os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+    _flush_stop.clear()
+    _flush_thread = threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True)
+    _flush_thread.start()
+
+
+def _after_fork():
+    # Значения родителя уже учтены в его снимке
+    with _registry_lock:
+        metrics = list(_registry.values())
+    for metric in metrics:
+        metric.reset()
+    _start_process()
+
+
+def _stop():
+    _flush_stop.set()
+    try:
+        flush()
+    except OSError:
+        pass
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(total: dict, metrics: dict, include_gauges: bool):
+    for name, data in metrics.items():
+        if data['type'] == 'gauge' and not include_gauges:
+            continue
+        merged = total.setdefault(name, {**data, 'samples': {}})
+        samples = merged['samples']
+        for labels, value in data['samples']:
+            key = tuple(labels)
+            if data['type'] == 'histogram':
+                counts, total_sum = value
+                state = samples.get(key)
+                if state is None or len(state[0]) != len(counts):
+                    samples[key] = [list(counts), total_sum]
+                else:
+                    state[0] = [a + b for a, b in zip(state[0], counts)]
+                    state[1] += total_sum
+            else:
+                samples[key] = samples.get(key, 0) + value
+
+
+def collect() -> dict:
+    """Метрики текущего процесса и (в режиме нескольких процессов) снимков остальных"""
+    total = {}
+    _merge(total, snapshot(), include_gauges=True)
+    if not METRICS_MULTIPROC_DIR:
+        return total
+
+    own_path = _snapshot_path(_process_id) if _process_id else None
+    for path in glob.glob(os.path.join(METRICS_MULTIPROC_DIR, 'metrics_*.json')):
+        if path == own_path:
+            continue
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        _merge(total, data.get('metrics', {}), include_gauges=_pid_alive(data.get('pid', 0)))
+    return total
+
+
+# --- Текстовый формат Prometheus -------------------------------------------
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(metrics: dict = None) -> str:
+    """Текст в формате Prometheus exposition 0.0.4"""
+    metrics = collect() if metrics is None else metrics
+    lines = []
+    for name in sorted(metrics):
+        data = metrics[name]
+        lines.append(f'# HELP {name} {_escape(data["help"])}')
+        lines.append(f'# TYPE {name} {data["type"]}')
+        names = data['labels']
+        for labels, value in sorted(data['samples'].items()):
+            if data['type'] != 'histogram':
+                lines.append(f'{name}{_labels(names, labels)} {_number(value)}')
+                continue
+            counts, total_sum = value
+            cumulative = 0
+            for bound, count in zip(list(data['buckets']) + [float('inf')], counts):
+                cumulative += count
+                le = 'le="' + _number(float(bound)) + '"'
+                lines.append(f'{name}_bucket{_labels(names, labels, le)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(names, labels)} {_number(total_sum)}')
+            lines.append(f'{name}_count{_labels(names, labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+_start_process()
+atexit.register(_stop)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,204 @@
+"""
+Накопительная статистика выгорания по оргструктуре.
+
+Дерево: корень (вся организация) -> юрлицо (EmployeeData.legal_entity) -> отдел
+(EmployeeData.department или User.department; части через ORG_DEPARTMENT_SEPARATOR
+становятся вложенными узлами). Каждый узел хранит число сотрудников по уровням
+(critical/warning/good) и сумму/число баллов для среднего — по последней
+диагностике каждого сотрудника поддерева.
+
+При новой диагностике вклад сотрудника вычитается из узлов старого пути и
+добавляется к узлам нового одним UPDATE на путь — O(глубины). Статистика любого
+поддерева читается одной строкой org_units без агрегации по assessments.
+
+Путь узла (org_units.path) — имена от юрлица до узла через '/', символы '/' и
+'%' внутри имён экранируются (%2F, %25); name хранит имя как есть.
+"""
+import os
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, and_
+from sqlalchemy import exc as sa_exc
+
+from ..db.database import db
+from ..db.db_models import Assessment, EmployeeData, OrgMember, OrgUnit, User
+from ..data.logger import app_logger
+
+ORG_ROOT_NAME = os.getenv('ORG_ROOT_NAME', 'Организация')
+ORG_DEPARTMENT_SEPARATOR = os.getenv('ORG_DEPARTMENT_SEPARATOR', '/')
+NO_LEGAL_ENTITY = 'Без юрлица'
+NO_DEPARTMENT = 'Без отдела'
+PATH_SEPARATOR = '/'
+
+BAND_BY_LEVEL = {'high': 'critical', 'medium': 'warning', 'low': 'good'}
+
+
+def unit_names(department=None, legal_entity=None) -> list:
+    """Имена узлов от юрлица до отдела (без корня)"""
+    parts = [p.strip() for p in (department or '').split(ORG_DEPARTMENT_SEPARATOR) if p.strip()]
+    return [(legal_entity or '').strip() or NO_LEGAL_ENTITY] + (parts or [NO_DEPARTMENT])
+
+
+def unit_names_for_user(user: User) -> list:
+    employee = user.employee_data
+    department = employee.department if employee is not None and employee.department else user.department
+    legal_entity = employee.legal_entity if employee is not None else None
+    return unit_names(department, legal_entity)
+
+
+def _path_part(name: str) -> str:
+    """Имя узла в пути: '/' внутри имени («ООО «А/Б»») экранируется, чтобы пути разных узлов не совпадали"""
+    return name.replace('%', '%25').replace(PATH_SEPARATOR, '%2F')
+
+
+def _path_prefixes(path: str) -> list:
+    """Пути всех узлов от корня до узла с путём path (path — уже из экранированных частей)"""
+    parts = path.split(PATH_SEPARATOR) if path else []
+    return [''] + [PATH_SEPARATOR.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+def _prefixes(names: list) -> list:
+    """Пути всех узлов от корня до листа: ['', 'A', 'A/B', ...]"""
+    return _path_prefixes(PATH_SEPARATOR.join(_path_part(name) for name in names))
+
+
+def _create_unit(path: str, name: str, parent, depth: int) -> OrgUnit:
+    try:
+        with db.session.begin_nested():
+            unit = OrgUnit(path=path, name=name, parent_id=parent.id if parent else None, depth=depth,
+                           critical=0, warning=0, good=0, score_sum=0.0, score_count=0)
+            db.session.add(unit)
+        return unit
+    except sa_exc.IntegrityError:
+        # Узел успел создать параллельный запрос
+        return OrgUnit.query.filter_by(path=path).one()
+
+
+def ensure_unit_path(names: list) -> list:
+    """Узлы от корня до листа (недостающие создаются); один SELECT для существующих"""
+    prefixes = _prefixes(names)
+    existing = {unit.path: unit for unit in OrgUnit.query.filter(OrgUnit.path.in_(prefixes))}
+
+    units = []
+    parent = None
+    for depth, path in enumerate(prefixes):
+        unit = existing.get(path)
+        if unit is None:
+            name = names[depth - 1] if depth else ORG_ROOT_NAME
+            unit = _create_unit(path, name, parent, depth)
+        units.append(unit)
+        parent = unit
+    return units
+
+
+def _apply(unit_ids: list, burnout_level: str, score: float, sign: int):
+    """Добавить (sign=1) или убрать (sign=-1) вклад сотрудника во все узлы пути одним UPDATE"""
+    band = getattr(OrgUnit, BAND_BY_LEVEL.get(burnout_level, 'good'))
+    OrgUnit.query.filter(OrgUnit.id.in_(unit_ids)).update({
+        band: band + sign,
+        OrgUnit.score_sum: OrgUnit.score_sum + sign * score,
+        OrgUnit.score_count: OrgUnit.score_count + sign,
+    }, synchronize_session=False)
+
+
+def record_assessment(user: User, burnout_level: str, score: float):
+    """
+    Учесть новую диагностику сотрудника в агрегатах (внутри текущей транзакции).
+    Предыдущая учтённая диагностика вычитается, в том числе если сотрудник сменил отдел.
+    """
+    units = ensure_unit_path(unit_names_for_user(user))
+    unit_ids = [unit.id for unit in units]
+
+    member = OrgMember.query.filter_by(user_id=user.id).with_for_update().first()
+    if member is not None:
+        if member.unit_id == units[-1].id:
+            old_ids = unit_ids
+        else:
+            old_leaf = OrgUnit.query.get(member.unit_id)
+            old_ids = [unit.id for unit in OrgUnit.query.filter(
+                OrgUnit.path.in_(_path_prefixes(old_leaf.path))
+            )] if old_leaf is not None and old_leaf.path else []
+        _apply(old_ids, member.burnout_level, member.score, -1)
+        member.unit_id = units[-1].id
+        member.burnout_level = burnout_level
+        member.score = score
+    else:
+        db.session.add(OrgMember(user_id=user.id, unit_id=units[-1].id,
+                                 burnout_level=burnout_level, score=score))
+
+    _apply(unit_ids, burnout_level, score, 1)
+
+
+def get_unit(unit_id: int = None):
+    """Узел по ID или корень оргструктуры"""
+    if unit_id is None:
+        return OrgUnit.query.filter_by(path='').first()
+    return OrgUnit.query.get(unit_id)
+
+
+def rebuild_org_stats() -> dict:
+    """Пересобрать дерево и агрегаты с нуля по последним диагностикам (после импорта или миграции)"""
+    latest = db.session.query(
+        Assessment.user_id,
+        func.max(Assessment.date).label('max_date')
+    ).group_by(Assessment.user_id).subquery()
+
+    rows = db.session.query(
+        Assessment.user_id, Assessment.burnout_level, Assessment.score,
+        User.department, EmployeeData.department, EmployeeData.legal_entity,
+    ).join(
+        latest, and_(Assessment.user_id == latest.c.user_id, Assessment.date == latest.c.max_date)
+    ).join(
+        User, User.id == Assessment.user_id
+    ).outerjoin(
+        EmployeeData, EmployeeData.user_id == User.id
+    )
+
+    totals = {'': [ORG_ROOT_NAME, 0, 0, 0, 0, 0.0, 0]}  # path -> [name, depth, critical, warning, good, sum, count]
+    members = {}
+    for user_id, level, score, user_department, employee_department, legal_entity in rows:
+        if user_id in members:
+            continue
+        names = unit_names(employee_department or user_department, legal_entity)
+        prefixes = _prefixes(names)
+        band = 2 + ('critical', 'warning', 'good').index(BAND_BY_LEVEL.get(level, 'good'))
+        for depth, path in enumerate(prefixes):
+            node = totals.setdefault(path, [names[depth - 1] if depth else ORG_ROOT_NAME, depth, 0, 0, 0, 0.0, 0])
+            node[band] += 1
+            node[5] += score
+            node[6] += 1
+        members[user_id] = (prefixes[-1], level, score)
+
+    OrgMember.query.delete()
+    OrgUnit.query.delete()
+
+    ids = {}
+    for path in sorted(totals, key=lambda p: (totals[p][1], p)):
+        name, depth, critical, warning, good, score_sum, score_count = totals[path]
+        parent_path = path.rpartition(PATH_SEPARATOR)[0] if depth > 1 else ''
+        unit = OrgUnit(path=path, name=name, depth=depth, parent_id=ids.get(parent_path) if depth else None,
+                       critical=critical, warning=warning, good=good,
+                       score_sum=score_sum, score_count=score_count)
+        db.session.add(unit)
+        db.session.flush()
+        ids[path] = unit.id
+
+    db.session.bulk_insert_mappings(OrgMember, [
+        {'user_id': user_id, 'unit_id': ids[path], 'burnout_level': level, 'score': score}
+        for user_id, (path, level, score) in members.items()
+    ])
+    db.session.commit()
+    return {'units': len(ids), 'members': len(members)}
+
+
+@click.command('rebuild-org-stats')
+@with_appcontext
+def rebuild_org_stats_command():
+    """Пересобрать статистику выгорания по оргструктуре из последних диагностик"""
+    started = time.perf_counter()
+    result = rebuild_org_stats()
+    elapsed = time.perf_counter() - started
+    app_logger.info("Статистика оргструктуры пересобрана: %s узлов, %s сотрудников", result['units'], result['members'])
+    click.echo(f"Узлов: {result['units']}, сотрудников: {result['members']} за {elapsed:.2f} с")
@@ -0,0 +1,177 @@
+"""
+Курсорная (keyset) пагинация списков с выбором полей.
+
+Страница выбирается условием (sort, id) < (sort_курсора, id_курсора) по индексу
+(user_id, sort, id), поэтому время ответа не зависит от длины истории. Из БД
+читаются только колонки запрошенных полей (?fields=...). Записи с NULL в sort
+идут в конце списка, курсор кодирует и их.
+
+Пагинация включается параметром limit или cursor: без них возвращается весь
+список, как до её появления (клиенты, не знающие о nextCursor, видят все записи).
+"""
+import base64
+import os
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+LIST_DEFAULT_LIMIT = int(os.getenv('LIST_DEFAULT_LIMIT', '50'))
+LIST_MAX_LIMIT = int(os.getenv('LIST_MAX_LIMIT', '200'))
+
+
+class ListParamsError(ValueError):
+    """Некорректные параметры списка (limit, cursor, fields, даты) — ответ 400"""
+
+
+def field(column, serialize=None):
+    """Описание поля ответа: колонка модели и преобразование значения"""
+    return column, serialize
+
+
+def is_paginated(args) -> bool:
+    """Клиент запросил страницу (limit или cursor); иначе отдаётся весь список"""
+    return args.get('limit') is not None or args.get('cursor') is not None
+
+
+def parse_limit(args) -> int:
+    raw = args.get('limit')
+    if raw is None:
+        return LIST_DEFAULT_LIMIT
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ListParamsError('limit must be an integer')
+    if limit < 1:
+        raise ListParamsError('limit must be positive')
+    return min(limit, LIST_MAX_LIMIT)
+
+
+def parse_fields(args, available: dict) -> list:
+    """Список полей из ?fields=a,b (по умолчанию все); неизвестные поля — ошибка"""
+    raw = args.get('fields')
+    if not raw:
+        return list(available)
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ListParamsError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}")
+    return list(dict.fromkeys(names))
+
+
+def parse_datetime(value, name: str):
+    """Дата YYYY-MM-DD или ISO 8601 из параметра запроса"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.rstrip('Z'))
+    except ValueError:
+        raise ListParamsError(f'{name} must be a date (YYYY-MM-DD) or ISO 8601 timestamp')
+
+
+def parse_bool(value, name: str):
+    if value is None or value == '':
+        return None
+    lowered = value.lower()
+    if lowered in ('1', 'true', 'yes'):
+        return True
+    if lowered in ('0', 'false', 'no'):
+        return False
+    raise ListParamsError(f'{name} must be true or false')
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    # NULL в sort — пустая строка
+    raw = f"{sort_value.isoformat() if sort_value is not None else ''}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_raw, id_raw = base64.urlsafe_b64decode(padded).decode().split('|')
+        return (datetime.fromisoformat(sort_raw) if sort_raw else None), int(id_raw)
+    except (ValueError, UnicodeDecodeError):
+        raise ListParamsError('Invalid cursor')
+
+
+def keyset_page(query, sort_column, id_column, fields: dict, selected: list, args,
+                chronological: bool = False):
+    """
+    Страница от новых к старым по (sort_column, id_column), записи без sort_column — в конце.
+    Без limit и cursor в args — весь список в том же порядке.
+
+    Args:
+        query: запрос с уже наложенными фильтрами (user_id, даты, ...)
+        fields (dict): имя поля -> field(column, serialize)
+        selected (list): запрошенные поля
+        args: request.args (limit, cursor)
+        chronological (bool): вернуть записи страницы в хронологическом порядке
+            (для графиков); следующая страница всё равно содержит более старые записи
+
+    Returns:
+        tuple: (items, next_cursor) — next_cursor None, если страница последняя
+    """
+    limit = parse_limit(args) if is_paginated(args) else None
+    cursor = decode_cursor(args.get('cursor'))
+
+    columns = []
+    for name in selected:
+        column = fields[name][0]
+        if not any(column is c for c in columns):
+            columns.append(column)
+    positions = {name: 2 + next(i for i, c in enumerate(columns) if c is fields[name][0]) for name in selected}
+
+    query = query.with_entities(sort_column, id_column, *columns)
+    if cursor is not None:
+        sort_value, row_id = cursor
+        if sort_value is None:
+            query = query.filter(sort_column.is_(None), id_column < row_id)
+        else:
+            query = query.filter(or_(
+                sort_column < sort_value,
+                and_(sort_column == sort_value, id_column < row_id),
+                sort_column.is_(None),
+            ))
+    query = query.order_by(sort_column.desc().nulls_last(), id_column.desc())
+    rows = query.limit(limit + 1).all() if limit is not None else query.all()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[0], last[1])
+
+    if chronological:
+        rows.reverse()
+
+    items = []
+    for row in rows:
+        item = {}
+        for name in selected:
+            serialize = fields[name][1]
+            value = row[positions[name]]
+            item[name] = serialize(value) if serialize is not None and value is not None else value
+        items.append(item)
+    return items, next_cursor
+
+
+def count_total(query, items: list, args) -> int:
+    """Число записей по фильтрам query: без пагинации — длина списка, иначе COUNT по индексу"""
+    if not is_paginated(args):
+        return len(items)
+    return query.order_by(None).count()
+
+
+def filter_date_range(query, column, args):
+    """Фильтр ?from=...&to=... по колонке (to — включительно для даты без времени)"""
+    date_from = parse_datetime(args.get('from'), 'from')
+    date_to = parse_datetime(args.get('to'), 'to')
+    if date_from is not None:
+        query = query.filter(column >= date_from)
+    if date_to is not None:
+        if len(args.get('to')) == 10:
+            date_to = date_to.replace(hour=23, minute=59, second=59, microsecond=999999)
+        query = query.filter(column <= date_to)
+    return query
@@ -0,0 +1,106 @@
+"""
+Кэш сериализованных профилей пользователей для /auth/verify и /auth/me.
+
+Запись кэша — (profile_version, user.to_dict()) по ID пользователя. Версия
+профиля хранится в users.profile_version, увеличивается при изменении полей
+профиля и передаётся в JWT (claim "pv"). Запись отдаётся без обращения к БД,
+если её версия не старше версии из токена; более новый токен (профиль изменён
+в другом процессе) означает промах и перечитывание из БД.
+
+В текущем процессе запись удаляется после коммита любого изменения User.
+Эндпоинты, меняющие поля профиля, отдают новый токен в заголовке
+X-Access-Token (attach_token), клиент подменяет им сохранённый — иначе другие
+процессы отдавали бы ему прежний профиль до истечения PROFILE_CACHE_TTL.
+
+Изменения в обход ORM (сырой SQL, массовые query.update()/delete(), удаление
+прежних пользователей в generate-org --replace) событий маппера не вызывают: если
+они не увеличивают profile_version сами, профиль обновится только по TTL или
+после перезапуска процесса.
+"""
+import os
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .cache import TTLCache
+from ..db.db_models import User
+
+PROFILE_CACHE_TTL = float(os.getenv('PROFILE_CACHE_TTL', '300'))
+PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', '10000'))
+PROFILE_VERSION_CLAIM = 'pv'
+TOKEN_HEADER = 'X-Access-Token'
+
+# Колонки, попадающие в User.to_dict(): их изменение увеличивает версию профиля
+PROFILE_FIELDS = (
+    'email', 'name', 'position', 'department', 'join_date',
+    'days_in_system', 'completed_recommendations', 'avatar_hash',
+)
+
+profile_cache = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL, name='user_profiles')
+
+_PENDING_KEY = 'profile_cache_invalidate'
+
+
+def issue_token(user: User) -> str:
+    """JWT пользователя с текущей версией профиля"""
+    return create_access_token(
+        identity=str(user.id),
+        additional_claims={PROFILE_VERSION_CLAIM: user.profile_version or 1},
+    )
+
+
+def attach_token(response, user: User):
+    """Добавить в ответ новый токен с версией профиля после её изменения"""
+    response.headers[TOKEN_HEADER] = issue_token(user)
+    return response
+
+
+def get_profile(user_id: int, token_version=None):
+    """
+    Профиль пользователя (словарь User.to_dict()) или None, если пользователя нет.
+
+    Args:
+        token_version: версия профиля из JWT; None для токенов без claim "pv"
+    """
+    cached = profile_cache.get(user_id)
+    if cached is not None:
+        version, profile = cached
+        if token_version is None or version >= token_version:
+            return profile
+
+    user = User.query.get(user_id)
+    if user is None:
+        return None
+    profile = user.to_dict()
+    profile_cache.set(user_id, (user.profile_version or 1, profile))
+    return profile
+
+
+def invalidate(user_id: int):
+    profile_cache.pop(user_id)
+
+
+@event.listens_for(User, 'before_update')
+def _bump_profile_version(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in PROFILE_FIELDS):
+        target.profile_version = (target.profile_version or 1) + 1
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _schedule_invalidation(mapper, connection, target):
+    # Удаляем запись и сразу, и после коммита: иначе параллельный запрос мог бы
+    # успеть закэшировать ещё не изменённую строку
+    invalidate(target.id)
+    session = inspect(target).session
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    for user_id in session.info.pop(_PENDING_KEY, ()):
+        invalidate(user_id)
+
@@ -0,0 +1,300 @@
+"""
+Профилирование работающего процесса по запросу администратора.
+
+CPU: сэмплирующий профилировщик в отдельном потоке раз в PROFILING_INTERVAL
+секунд снимает стеки потоков (sys._current_frames) — либо всех потоков в течение
+окна времени, либо только потоков, обрабатывающих следующие N запросов. Результат —
+collapsed stacks ("кадр;кадр;кадр число"), вход для flamegraph.pl / speedscope.
+
+Память: снимки tracemalloc и их сравнение по строкам или стекам выделения.
+
+Пока сессия не запущена, профилировщик не работает: нет потока сэмплирования,
+tracemalloc выключен, хуки запросов возвращаются после одной проверки.
+"""
+import itertools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+
+PROFILING_INTERVAL = float(os.getenv('PROFILING_INTERVAL', '0.005'))
+PROFILING_MAX_SECONDS = float(os.getenv('PROFILING_MAX_SECONDS', '300'))
+PROFILING_MAX_REQUESTS = int(os.getenv('PROFILING_MAX_REQUESTS', '1000'))
+PROFILING_MAX_SNAPSHOTS = int(os.getenv('PROFILING_MAX_SNAPSHOTS', '5'))
+PROFILING_KEEP_RESULTS = 5
+
+_ids = itertools.count(1)
+
+
+class ProfilingError(ValueError):
+    """Некорректный запрос профилирования — ответ 400"""
+
+
+class ProfilingBusyError(ProfilingError):
+    """Сессия CPU-профилирования уже идёт — ответ 409"""
+
+
+class SamplingProfiler:
+    """Сэмплирование стеков потоков; threads=None — все потоки, кроме собственного"""
+
+    def __init__(self, interval: float = PROFILING_INTERVAL, threads=None):
+        self.interval = interval
+        self.threads = threads
+        self.counts = Counter()
+        self.samples = 0
+        self._names = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _frame_name(self, code) -> str:
+        name = self._names.get(code)
+        if name is None:
+            filename = code.co_filename
+            for prefix in sys.path:
+                if prefix and filename.startswith(prefix):
+                    filename = filename[len(prefix):].lstrip(os.sep)
+                    break
+            name = self._names[code] = f'{code.co_name} ({filename}:{code.co_firstlineno})'.replace(';', ',')
+        return name
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (self.threads is not None and ident not in self.threads):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(thread_names.get(ident, str(ident)).replace(';', ','))
+                self.counts[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def collapsed(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in self.counts.most_common())
+
+
+class CpuSession:
+    """Сессия CPU-профилирования: окно времени (seconds) или следующие N запросов (requests)"""
+
+    def __init__(self, seconds: float = None, requests: int = None, interval: float = PROFILING_INTERVAL):
+        self.id = next(_ids)
+        self.mode = 'requests' if requests else 'window'
+        self.seconds = min(seconds or PROFILING_MAX_SECONDS, PROFILING_MAX_SECONDS)
+        self.requests = requests
+        self.started_requests = 0
+        self.finished_requests = 0
+        self.started_at = time.time()
+        self.finished_at = None
+        self._threads = set()
+        self._lock = threading.Lock()
+        self.profiler = SamplingProfiler(interval, self._threads if self.mode == 'requests' else None)
+        self._timer = threading.Timer(self.seconds, finish_cpu_session, args=(self,))
+        self._timer.daemon = True
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    def start(self):
+        self.profiler.start()
+        self._timer.start()
+
+    def enter_request(self) -> bool:
+        """Учесть начало запроса; False — лимит запросов сессии уже набран"""
+        with self._lock:
+            if self.done or self.started_requests >= self.requests:
+                return False
+            self.started_requests += 1
+            self._threads.add(threading.get_ident())
+            return True
+
+    def exit_request(self) -> bool:
+        """Учесть конец запроса; True — это был последний запрос сессии"""
+        with self._lock:
+            self._threads.discard(threading.get_ident())
+            self.finished_requests += 1
+            return self.finished_requests >= self.requests
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'pid': os.getpid(),
+            'mode': self.mode,
+            'status': 'done' if self.done else 'running',
+            'seconds': self.seconds,
+            'requests': self.requests,
+            'profiledRequests': self.finished_requests,
+            'samples': self.profiler.samples,
+            'interval': self.profiler.interval,
+            'startedAt': self.started_at,
+            'finishedAt': self.finished_at,
+        }
+
+
+_cpu_session = None
+_cpu_results = OrderedDict()
+_cpu_lock = threading.Lock()
+
+
+def start_cpu_session(seconds: float = None, requests: int = None, interval: float = None) -> CpuSession:
+    global _cpu_session
+    if seconds is not None and seconds <= 0:
+        raise ProfilingError('seconds must be positive')
+    if requests is not None and not 0 < requests <= PROFILING_MAX_REQUESTS:
+        raise ProfilingError(f'requests must be between 1 and {PROFILING_MAX_REQUESTS}')
+    if seconds is None and requests is None:
+        raise ProfilingError('Either seconds or requests is required')
+    if interval is not None and interval < 0.001:
+        raise ProfilingError('interval must be at least 0.001 seconds')
+
+    with _cpu_lock:
+        if _cpu_session is not None:
+            raise ProfilingBusyError(f'CPU profiling session {_cpu_session.id} is already running')
+        session = CpuSession(seconds, requests, interval or PROFILING_INTERVAL)
+        _cpu_results[session.id] = session
+        while len(_cpu_results) > PROFILING_KEEP_RESULTS:
+            _cpu_results.popitem(last=False)
+        session.start()
+        _cpu_session = session
+    return session
+
+
+def finish_cpu_session(session: CpuSession):
+    global _cpu_session
+    with _cpu_lock:
+        if session.done:
+            return
+        session.finished_at = time.time()
+        if _cpu_session is session:
+            _cpu_session = None
+    session._timer.cancel()
+    session.profiler.stop()
+
+
+def get_cpu_session(session_id: int):
+    return _cpu_results.get(session_id)
+
+
+def request_started():
+    """Хук before_request: при активной сессии по запросам — профилировать поток запроса"""
+    session = _cpu_session
+    if session is None or session.mode != 'requests':
+        return None
+    return session if session.enter_request() else None
+
+
+def request_finished(session):
+    if session is not None and session.exit_request():
+        finish_cpu_session(session)
+
+
+# --- Память ----------------------------------------------------------------
+
+_snapshots = OrderedDict()
+_memory_lock = threading.Lock()
+
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def memory_status() -> dict:
+    tracing = tracemalloc.is_tracing()
+    current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+    return {
+        'pid': os.getpid(),
+        'tracing': tracing,
+        'frames': tracemalloc.get_traceback_limit() if tracing else None,
+        'tracedBytes': current,
+        'peakBytes': peak,
+        'snapshots': [{'id': sid, 'takenAt': taken_at} for sid, (taken_at, _) in _snapshots.items()],
+    }
+
+
+def start_memory_tracing(frames: int = 10) -> dict:
+    if not 1 <= frames <= 100:
+        raise ProfilingError('frames must be between 1 and 100')
+    with _memory_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+    return memory_status()
+
+
+def stop_memory_tracing() -> dict:
+    with _memory_lock:
+        tracemalloc.stop()
+        _snapshots.clear()
+    return memory_status()
+
+
+def _take_snapshot():
+    if not tracemalloc.is_tracing():
+        raise ProfilingError('Memory tracing is not started')
+    snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+    with _memory_lock:
+        snapshot_id = next(_ids)
+        _snapshots[snapshot_id] = (time.time(), snapshot)
+        while len(_snapshots) > PROFILING_MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+    return snapshot_id, snapshot
+
+
+def take_snapshot() -> int:
+    return _take_snapshot()[0]
+
+
+def _format_trace(traceback) -> list:
+    return [f'{frame.filename}:{frame.lineno}' for frame in traceback]
+
+
+def diff_snapshots(from_id: int = None, to_id: int = None, group_by: str = 'lineno', limit: int = 25) -> dict:
+    """
+    Рост памяти между снимками: from_id — базовый (по умолчанию первый сохранённый),
+    to_id — сравниваемый (по умолчанию новый снимок, сделанный сейчас)
+    """
+    if group_by not in ('lineno', 'traceback', 'filename'):
+        raise ProfilingError('group_by must be lineno, traceback or filename')
+    # Снимки берутся до нового: он может вытеснить базовый из _snapshots
+    with _memory_lock:
+        if not _snapshots:
+            raise ProfilingError('No snapshots taken')
+        if from_id is None:
+            from_id = next(iter(_snapshots))
+        if from_id not in _snapshots or (to_id is not None and to_id not in _snapshots):
+            raise ProfilingError('Unknown snapshot id')
+        base = _snapshots[from_id][1]
+        current = _snapshots[to_id][1] if to_id is not None else None
+    if current is None:
+        to_id, current = _take_snapshot()
+
+    stats = current.compare_to(base, group_by)
+    return {
+        'from': from_id,
+        'to': to_id,
+        'groupBy': group_by,
+        'sizeDiff': sum(stat.size_diff for stat in stats),
+        'top': [{
+            'sizeDiff': stat.size_diff,
+            'size': stat.size,
+            'countDiff': stat.count_diff,
+            'count': stat.count,
+            'trace': _format_trace(stat.traceback),
+        } for stat in stats[:limit]],
+    }
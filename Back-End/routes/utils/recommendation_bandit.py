@@ -0,0 +1,301 @@
+"""
+Контекстный бандит для персонализации рекомендаций по обратной связи о выполнении.
+
+Сегмент — пара (уровень выгорания, отдел). Для каждого сегмента в памяти хранятся
+счётчики показов и выполнений по элементам каталога и готовая таблица ранжирования.
+Отметки «выполнено / не выполнено» обновляют счётчики и пересчитывают таблицы
+затронутых сегментов; выбор рекомендаций — поиск в таблице без обращения к LLM.
+
+Оценка элемента — сглаженная доля выполнений (априорное значение берётся из
+сегмента уровня выгорания без учёта отдела) плюс бонус за неопределённость
+(UCB), чтобы редко показанные рекомендации тоже получали показы.
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+import click
+import numpy as np
+from flask.cli import with_appcontext
+from sqlalchemy import func, case
+
+from ..db.database import db
+from ..db.db_models import Assessment, Recommendation, User
+from ..data.logger import recommendations_logger
+
+BANDIT_PRIOR = float(os.getenv('BANDIT_PRIOR', '0.2'))
+BANDIT_PRIOR_WEIGHT = float(os.getenv('BANDIT_PRIOR_WEIGHT', '5'))
+BANDIT_EXPLORATION = float(os.getenv('BANDIT_EXPLORATION', '1.0'))
+BANDIT_MIN_IMPRESSIONS = int(os.getenv('BANDIT_MIN_IMPRESSIONS', '30'))
+BANDIT_REFRESH_INTERVAL = float(os.getenv('BANDIT_REFRESH_INTERVAL', '600'))
+
+ANY_DEPARTMENT = '*'
+
+
+def _department_key(department) -> str:
+    return (department or '').strip() or ANY_DEPARTMENT
+
+
+class _Segment:
+    """Счётчики и таблица ранжирования одного сегмента"""
+
+    __slots__ = ('shown', 'completed', 'expected', 'ranking')
+
+    def __init__(self, size: int):
+        self.shown = np.zeros(size, dtype=np.float64)
+        self.completed = np.zeros(size, dtype=np.float64)
+        self.expected = None
+        self.ranking = None
+
+    @property
+    def impressions(self) -> int:
+        return int(self.shown.sum())
+
+
+class RecommendationBandit:
+    """Ранжирование каталога по доле выполнений в сегменте (уровень выгорания, отдел)"""
+
+    def __init__(self, titles: list, prior: float = BANDIT_PRIOR, prior_weight: float = BANDIT_PRIOR_WEIGHT,
+                 exploration: float = BANDIT_EXPLORATION, min_impressions: int = BANDIT_MIN_IMPRESSIONS,
+                 refresh_interval: float = BANDIT_REFRESH_INTERVAL):
+        self.titles = list(titles)
+        self.index = {title: i for i, title in enumerate(self.titles)}
+        self.prior = prior
+        self.prior_weight = prior_weight
+        self.exploration = exploration
+        self.min_impressions = min_impressions
+        self.refresh_interval = refresh_interval
+        self._segments = {}
+        self._lock = threading.RLock()
+        self._loaded_at = None
+
+    # --- счётчики ---
+
+    def _segment(self, level: str, department: str) -> _Segment:
+        segment = self._segments.get((level, department))
+        if segment is None:
+            segment = _Segment(len(self.titles))
+            self._segments[(level, department)] = segment
+        return segment
+
+    def _add(self, level: str, department, title: str, shown: float, completed: float) -> bool:
+        position = self.index.get(title)
+        if position is None:
+            return False
+        department = _department_key(department)
+        for key in {department, ANY_DEPARTMENT}:
+            segment = self._segment(level, key)
+            segment.shown[position] += shown
+            segment.completed[position] = max(segment.completed[position] + completed, 0.0)
+        return True
+
+    def record_impressions(self, level: str, department, titles):
+        """Учесть показ рекомендаций сотруднику из сегмента"""
+        with self._lock:
+            if any([self._add(level, department, title, 1, 0) for title in titles]):
+                self._rebuild_level(level)
+
+    def record_completion(self, level: str, department, title: str, completed: bool = True):
+        """Учесть отметку выполнения (completed=False — отмена отметки)"""
+        with self._lock:
+            if self._add(level, department, title, 0, 1 if completed else -1):
+                self._rebuild_level(level)
+
+    # --- таблицы ранжирования ---
+
+    def _rebuild(self, segment: _Segment, prior):
+        weight = self.prior_weight
+        expected = (segment.completed + weight * prior) / (segment.shown + weight)
+        bonus = self.exploration * np.sqrt(expected * (1 - expected) / (segment.shown + weight))
+        segment.expected = expected
+        # Стабильная сортировка: при равных оценках сохраняется порядок каталога
+        segment.ranking = np.argsort(-(expected + bonus), kind='stable').tolist()
+
+    def _rebuild_level(self, level: str):
+        """Пересчитать таблицу уровня и таблицы всех отделов, для которых она служит априорной"""
+        base = self._segment(level, ANY_DEPARTMENT)
+        self._rebuild(base, self.prior)
+        for (segment_level, department), segment in self._segments.items():
+            if segment_level == level and department != ANY_DEPARTMENT:
+                self._rebuild(segment, base.expected)
+
+    def rank(self, level: str, department=None, k: int = 6):
+        """
+        Индексы каталога из таблицы сегмента (отдел, иначе весь уровень).
+        None — если данных в сегменте меньше min_impressions.
+        """
+        with self._lock:
+            for key in (_department_key(department), ANY_DEPARTMENT):
+                segment = self._segments.get((level, key))
+                if segment is None or segment.ranking is None:
+                    continue
+                if segment.impressions >= self.min_impressions:
+                    return segment.ranking[:k]
+            return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'segments': len(self._segments),
+                'impressions': int(sum(s.impressions for (_, d), s in self._segments.items() if d == ANY_DEPARTMENT)),
+                'completions': int(sum(s.completed.sum() for (_, d), s in self._segments.items() if d == ANY_DEPARTMENT)),
+                'loaded_at': self._loaded_at,
+            }
+
+    # --- загрузка из БД ---
+
+    def load(self, rows):
+        """Заменить счётчики агрегатами (level, department, title, shown, completed)"""
+        fresh = RecommendationBandit(self.titles, self.prior, self.prior_weight,
+                                     self.exploration, self.min_impressions, self.refresh_interval)
+        levels = set()
+        for level, department, title, shown, completed in rows:
+            if fresh._add(level, department, title, shown, completed or 0):
+                levels.add(level)
+        for level in levels:
+            fresh._rebuild_level(level)
+
+        with self._lock:
+            self._segments = fresh._segments
+            self._loaded_at = time.time()
+
+    def ensure_loaded(self):
+        """Загрузить счётчики из БД при первом обращении и раз в refresh_interval секунд"""
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.time() - loaded_at < self.refresh_interval:
+            return
+        try:
+            started = time.perf_counter()
+            rows = load_feedback_counts()
+            self.load(rows)
+            recommendations_logger.info(
+                "Статистика выполнения рекомендаций загружена: %s строк за %.2f с", len(rows), time.perf_counter() - started
+            )
+        except Exception as e:
+            # Повторная попытка — через refresh_interval, до этого работаем с тем, что есть в памяти
+            self._loaded_at = time.time()
+            recommendations_logger.warning("Не удалось загрузить статистику выполнения рекомендаций: %s", e)
+
+
+def load_feedback_counts() -> list:
+    """Показы и выполнения по (уровень выгорания, отдел, название) одним агрегирующим запросом"""
+    rows = db.session.query(
+        Assessment.burnout_level,
+        User.department,
+        Recommendation.title,
+        func.count(Recommendation.id),
+        func.sum(case((Recommendation.completed.is_(True), 1), else_=0)),
+    ).join(
+        Assessment, Recommendation.assessment_id == Assessment.id
+    ).join(
+        User, Recommendation.user_id == User.id
+    ).group_by(
+        Assessment.burnout_level, User.department, Recommendation.title
+    ).all()
+    return [tuple(row) for row in rows]
+
+
+def load_feedback_events(since=None) -> list:
+    """
+    История показов по диагностикам в хронологическом порядке:
+    [(level, department, [(title, completed), ...]), ...]
+    """
+    query = db.session.query(
+        Assessment.id,
+        Assessment.burnout_level,
+        User.department,
+        Recommendation.title,
+        Recommendation.completed,
+    ).join(
+        Assessment, Recommendation.assessment_id == Assessment.id
+    ).join(
+        User, Recommendation.user_id == User.id
+    )
+    if since is not None:
+        query = query.filter(Assessment.date >= since)
+
+    events = []
+    current_id = None
+    for assessment_id, level, department, title, completed in query.order_by(
+            Assessment.date, Assessment.id, Recommendation.id).yield_per(5000):
+        if assessment_id != current_id:
+            current_id = assessment_id
+            events.append((level, department, []))
+        events[-1][2].append((title, bool(completed)))
+    return events
+
+
+def evaluate_replay(titles: list, events: list, k: int = 6, **bandit_options) -> dict:
+    """
+    Офлайн-оценка воспроизведением истории: перед каждой диагностикой бандит
+    ранжирует каталог по накопленной статистике; засчитываются показанные
+    рекомендации, попавшие в его top-k. Затем статистика пополняется исходами
+    диагностики.
+    """
+    bandit = RecommendationBandit(titles, min_impressions=0, **bandit_options)
+    logged_shown = logged_completed = 0
+    matched_shown = matched_completed = 0
+    cold_events = 0
+
+    for level, department, outcomes in events:
+        ranking = bandit.rank(level, department, k)
+        if ranking is None:
+            cold_events += 1
+            top = set()
+        else:
+            top = {bandit.titles[i] for i in ranking}
+
+        for title, completed in outcomes:
+            logged_shown += 1
+            logged_completed += completed
+            if title in top:
+                matched_shown += 1
+                matched_completed += completed
+
+        with bandit._lock:
+            changed = False
+            for title, completed in outcomes:
+                changed |= bandit._add(level, department, title, 1, 1 if completed else 0)
+            if changed:
+                bandit._rebuild_level(level)
+
+    logged_rate = logged_completed / logged_shown if logged_shown else 0.0
+    policy_rate = matched_completed / matched_shown if matched_shown else 0.0
+    return {
+        'events': len(events),
+        'cold_events': cold_events,
+        'top_k': k,
+        'logged_impressions': logged_shown,
+        'logged_completion_rate': round(logged_rate, 4),
+        'matched_impressions': matched_shown,
+        'match_rate': round(matched_shown / logged_shown, 4) if logged_shown else 0.0,
+        'policy_completion_rate': round(policy_rate, 4),
+        'lift': round(policy_rate / logged_rate, 4) if logged_rate else None,
+    }
+
+
+@click.command('evaluate-bandit')
+@click.option('--top-k', 'top_k', type=int, default=6, show_default=True,
+              help='Сколько рекомендаций выбирает бандит на диагностику')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Учитывать диагностики начиная с даты YYYY-MM-DD')
+@click.option('--exploration', type=float, default=BANDIT_EXPLORATION, show_default=True,
+              help='Коэффициент бонуса за неопределённость (0 — только доля выполнений)')
+@click.option('--prior-weight', 'prior_weight', type=float, default=BANDIT_PRIOR_WEIGHT, show_default=True,
+              help='Вес априорной доли выполнений (в показах)')
+@with_appcontext
+def evaluate_bandit_command(top_k, since, exploration, prior_weight):
+    """Офлайн-оценка бандита на истории выполнения рекомендаций"""
+    from .recommendations_selector import RECOMMENDATIONS_DB
+
+    started = time.perf_counter()
+    events = load_feedback_events(since)
+    report = evaluate_replay([rec['title'] for rec in RECOMMENDATIONS_DB], events, k=top_k,
+                             exploration=exploration, prior_weight=prior_weight)
+    elapsed = time.perf_counter() - started
+
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    click.echo()
+    click.echo(f"Воспроизведено {report['events']} диагностик за {elapsed:.2f} с", err=True)
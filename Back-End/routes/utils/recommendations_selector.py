@@ -1,10 +1,18 @@
 """
 Модуль для выбора рекомендаций на основе метрик выгорания
 """
-import requests
-import os
 import json
+import os
+import re
+from concurrent.futures import Future
+
 from ..data.logger import ai_logger
+from .llm_providers import complete
+from .cache import TTLCache
+from .title_matcher import TitleMatcher
+from .local_ranker import LocalRanker
+from .recommendation_bandit import RecommendationBandit
+from .batcher import MicroBatcher
 
 RECOMMENDATIONS_DB = [
     {
@@ -262,124 +270,469 @@ RECOMMENDATIONS_DB = [
 ]
 
 
+# Индекс названий каталога для разбора ответов AI (строится один раз при импорте)
+RECOMMENDATION_MATCH_THRESHOLD = float(os.getenv('RECOMMENDATION_MATCH_THRESHOLD', '0.6'))
+_TITLE_MATCHER = TitleMatcher(RECOMMENDATIONS_DB, threshold=RECOMMENDATION_MATCH_THRESHOLD)
+
+# Протокол выбора: в промпте каталог с ID, модель возвращает JSON со списком ID
+RECOMMENDATIONS_BY_ID = {rec['id']: rec for rec in RECOMMENDATIONS_DB}
+RECOMMENDATIONS_MAX_TOKENS = int(os.getenv('RECOMMENDATIONS_MAX_TOKENS', '100'))
+MAX_RECOMMENDATIONS = 7
+
+RECOMMENDATION_IDS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'ids': {'type': 'array', 'items': {'type': 'integer'}},
+    },
+    'required': ['ids'],
+    'additionalProperties': False,
+}
+
+RECOMMENDATION_BATCH_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'results': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'profile': {'type': 'integer'},
+                    'ids': {'type': 'array', 'items': {'type': 'integer'}},
+                },
+                'required': ['profile', 'ids'],
+                'additionalProperties': False,
+            },
+        },
+    },
+    'required': ['results'],
+    'additionalProperties': False,
+}
+
+_JSON_PATTERN = re.compile(r'\{.*\}|\[.*\]', re.DOTALL)
+
+
+def _format_recommendations_for_prompt() -> str:
+    """Форматирует каталог рекомендаций для промпта: «ID: название (категория)»"""
+    return ''.join(f"{rec['id']}: {rec['title']} ({rec['category']})\n" for rec in RECOMMENDATIONS_DB)
+
+
+def _escape_braces(text: str) -> str:
+    return text.replace('{', '{{').replace('}', '}}')
+
+
+_PROFILE_LINE = (
+    "уровень выгорания: {burnout_level}; "
+    "профессиональная активность: {emotional_exhaustion:.2f}; "
+    "психическая стабильность: {depersonalization:.2f}; "
+    "эмоциональное отношение: {reduced_accomplishment:.2f}; "
+    "итоговый балл: {final_burnout_score:.2f}"
+)
+_PROMPT_HEADER = (
+    "Метрики выгорания сотрудника (0..1):\n"
+    + _PROFILE_LINE + "\n\n"
+    "Выбери 5-7 наиболее подходящих рекомендаций из каталога (ID: название (категория)):\n"
+)
+_PROMPT_FOOTER = '\nОтветь только JSON без пояснений: {{"ids": [ID, ...]}}'
+
+# Шаблон собирается один раз при импорте, в запросе подставляются только метрики
+PROMPT_TEMPLATE = _PROMPT_HEADER + _escape_braces(_format_recommendations_for_prompt()) + _PROMPT_FOOTER
+
+# Шаблон для переранжирования короткого списка локального ранжировщика
+RERANK_PROMPT_TEMPLATE = _PROMPT_HEADER + '{catalog}' + _PROMPT_FOOTER
+
+# Шаблон для пачки профилей: один запрос к LLM на несколько диагностик
+BATCH_PROMPT_TEMPLATE = (
+    "Метрики выгорания нескольких сотрудников (0..1), по одному профилю в строке:\n"
+    "{profiles}\n"
+    "Для каждого профиля выбери 5-7 наиболее подходящих рекомендаций из каталога (ID: название (категория)):\n"
+    + _escape_braces(_format_recommendations_for_prompt())
+    + '\nОтветь только JSON без пояснений: {{"results": [{{"profile": N, "ids": [ID, ...]}}, ...]}}'
+)
+
+# Микробатчинг выбора рекомендаций: задания из параллельных диагностик собираются
+# за RECOMMENDATIONS_BATCH_WINDOW секунд (или до RECOMMENDATIONS_BATCH_SIZE профилей)
+# и отправляются одним запросом. 0 — отключить, каждый профиль отдельным запросом.
+# Окно — добавочная задержка каждой диагностики (не больше RECOMMENDATIONS_BATCH_WINDOW
+# сверх ответа LLM); фоновые потоки пачку не ждут, см. request_ai_recommendations.
+# RECOMMENDATIONS_BATCH_TIMEOUT ограничивает ожидание только в get_ai_recommendations.
+RECOMMENDATIONS_BATCH_WINDOW = float(os.getenv('RECOMMENDATIONS_BATCH_WINDOW', '0.2'))
+RECOMMENDATIONS_BATCH_SIZE = int(os.getenv('RECOMMENDATIONS_BATCH_SIZE', '20'))
+RECOMMENDATIONS_BATCH_TIMEOUT = float(os.getenv('RECOMMENDATIONS_BATCH_TIMEOUT', '120'))
+
+# Стратегия выбора:
+# - llm: LLM выбирает из всего каталога (при ошибке — рекомендации по умолчанию)
+# - local: только локальный ранжировщик, без сетевых вызовов
+# - local_rerank: локальный ранжировщик даёт короткий список, LLM его переранжирует
+# - bandit: таблица бандита по доле выполнений в сегменте (уровень, отдел);
+#   пока данных в сегменте мало — локальный ранжировщик
+RECOMMENDATIONS_STRATEGY = os.getenv('RECOMMENDATIONS_STRATEGY', 'llm').strip().lower()
+LOCAL_RANKER_TOP_K = int(os.getenv('LOCAL_RANKER_TOP_K', '6'))
+LOCAL_RERANK_SHORTLIST = int(os.getenv('LOCAL_RERANK_SHORTLIST', '12'))
+
+# Кэш выбора рекомендаций по квантованному профилю выгорания
+RECOMMENDATIONS_CACHE_STEP = float(os.getenv('RECOMMENDATIONS_CACHE_STEP', '0.1'))
+RECOMMENDATIONS_CACHE_SIZE = int(os.getenv('RECOMMENDATIONS_CACHE_SIZE', '1024'))
+RECOMMENDATIONS_CACHE_TTL = float(os.getenv('RECOMMENDATIONS_CACHE_TTL', '3600'))
+
+recommendations_cache = TTLCache(
+    maxsize=RECOMMENDATIONS_CACHE_SIZE,
+    ttl=RECOMMENDATIONS_CACHE_TTL,
+    name='recommendations'
+)
+
+
+def _quantize(value: float, step: float = RECOMMENDATIONS_CACHE_STEP) -> float:
+    if value is None:
+        return None
+    if step <= 0:
+        return round(value, 2)
+    return round(round(value / step) * step, 4)
+
+
+def _profile_key(burnout_level: str, emotional_exhaustion: float, depersonalization: float,
+                 reduced_accomplishment: float, final_burnout_score: float) -> tuple:
+    """Ключ кэша: уровень выгорания и квантованный вектор баллов"""
+    return (
+        burnout_level,
+        _quantize(emotional_exhaustion),
+        _quantize(depersonalization),
+        _quantize(reduced_accomplishment),
+        _quantize(final_burnout_score),
+    )
+
+
 def get_ai_recommendations(burnout_level: str, emotional_exhaustion: float,
                           depersonalization: float, reduced_accomplishment: float,
-                          employee_burnout_score: float = None) -> list:
-    """Получить рекомендации от AI на основе метрик выгорания"""
+                          employee_burnout_score: float = None, department: str = None) -> list:
+    """Получить рекомендации от AI на основе метрик выгорания (с ожиданием ответа)"""
     try:
-        final_burnout_score = employee_burnout_score if employee_burnout_score else emotional_exhaustion
+        return request_ai_recommendations(
+            burnout_level, emotional_exhaustion, depersonalization, reduced_accomplishment,
+            employee_burnout_score, department
+        ).result(timeout=RECOMMENDATIONS_BATCH_TIMEOUT)
+    except Exception as e:
+        ai_logger.error("Ошибка при получении рекомендаций от AI: %s", e, exc_info=True)
+        return _get_default_recommendations(burnout_level)
 
-        prompt = f"""На основе следующих метрик выгорания сотрудника:
-- Уровень выгорания: {burnout_level}
-- Профессиональная активность: {emotional_exhaustion:.2f}/1.0
-- Психическая стабильность: {depersonalization:.2f}/1.0
-- Эмоциональное отношение: {reduced_accomplishment:.2f}/1.0
-- Итоговый балл выгорания: {final_burnout_score:.2f}/1.0
 
-Выбери 5-7 наиболее подходящих рекомендаций из следующего списка:
+def request_ai_recommendations(burnout_level: str, emotional_exhaustion: float,
+                               depersonalization: float, reduced_accomplishment: float,
+                               employee_burnout_score: float = None, department: str = None) -> Future:
+    """
+    То же, что get_ai_recommendations, но без ожидания: возвращает Future со списком
+    рекомендаций. При микробатчинге Future завершается вместе с пачкой, и вызывающий
+    поток не простаивает, пока она собирается; в остальных случаях Future уже готов.
+    Future не завершается ошибкой: при сбое в нём рекомендации по умолчанию.
+    """
+    try:
+        final_burnout_score = employee_burnout_score if employee_burnout_score else emotional_exhaustion
 
-{_format_recommendations_for_prompt()}
+        if RECOMMENDATIONS_STRATEGY == 'local':
+            return _resolved(_rank_locally(emotional_exhaustion, depersonalization,
+                                           reduced_accomplishment, final_burnout_score))
 
-Верни ТОЛЬКО список в таком формате (без других текстов):
-1. Название рекомендации
-2. Название рекомендации
-3. Название рекомендации
-и т.д.
+        if RECOMMENDATIONS_STRATEGY == 'bandit':
+            return _resolved(_rank_with_bandit(burnout_level, department, emotional_exhaustion, depersonalization,
+                                               reduced_accomplishment, final_burnout_score))
 
-Не добавляй описания, номера ID или категории. Только названия рекомендаций."""
+        cache_key = _profile_key(burnout_level, emotional_exhaustion, depersonalization,
+                                 reduced_accomplishment, final_burnout_score)
+        cached = recommendations_cache.get(cache_key)
+        if cached is not None:
+            ai_logger.info("Рекомендации для профиля %s взяты из кэша", cache_key)
+            return _resolved([dict(rec) for rec in cached])
 
-        ai_logger.info(f"Отправляю запрос на выбор рекомендаций для уровня {burnout_level}. Итоговый балл: {final_burnout_score}")
+        metrics = {
+            'burnout_level': burnout_level,
+            'emotional_exhaustion': emotional_exhaustion,
+            'depersonalization': depersonalization,
+            'reduced_accomplishment': reduced_accomplishment,
+            'final_burnout_score': final_burnout_score,
+        }
 
-        reply = _call_ai_chat(prompt)
+        if RECOMMENDATIONS_STRATEGY == 'local_rerank':
+            return _resolved(_rerank_with_ai(metrics, cache_key))
 
-        if not reply:
-            ai_logger.warning("AI вернула пустой ответ, используем рекомендации по умолчанию")
-            return _get_default_recommendations(burnout_level)
+        if RECOMMENDATIONS_BATCH_WINDOW <= 0:
+            return _resolved(_finish_ai_selection(_select_with_ai(metrics), burnout_level, cache_key))
 
-        recommendations = _parse_ai_response(reply)
+        result = Future()
 
-        if not recommendations:
-            ai_logger.warning("Не удалось распарсить ответ AI, используем рекомендации по умолчанию")
-            return _get_default_recommendations(burnout_level)
+        def finish(batch_future):
+            try:
+                recommendations = _finish_ai_selection(batch_future.result(), burnout_level, cache_key)
+            except Exception as e:
+                ai_logger.error("Ошибка при получении рекомендаций от AI: %s", e, exc_info=True)
+                recommendations = _get_default_recommendations(burnout_level)
+            result.set_result(recommendations)
 
-        ai_logger.info(f"Успешно получены {len(recommendations)} рекомендаций от AI")
-        return recommendations
+        _recommendations_batcher.submit((cache_key, metrics)).add_done_callback(finish)
+        return result
 
     except Exception as e:
-        ai_logger.error(f"Ошибка при получении рекомендаций от AI: {e}", exc_info=True)
-        return _get_default_recommendations(burnout_level)
+        ai_logger.error("Ошибка при получении рекомендаций от AI: %s", e, exc_info=True)
+        return _resolved(_get_default_recommendations(burnout_level))
 
 
-def _format_recommendations_for_prompt() -> str:
-    """Форматирует список рекомендаций для промпта"""
-    formatted = ""
-    for rec in RECOMMENDATIONS_DB:
-        formatted += f"- {rec['title']} (категория: {rec['category']})\n"
-    return formatted
+def _resolved(value) -> Future:
+    future = Future()
+    future.set_result(value)
+    return future
 
 
-def _call_ai_chat(message: str) -> str:
-    """Вызывает AI chat endpoint и возвращает ответ"""
-    try:
-        ai_endpoint = os.environ.get('AI_CHAT_ENDPOINT', 'http://localhost:5000/ai/chat')
-        payload = {'message': message}
+def _finish_ai_selection(recommendations: list, burnout_level: str, cache_key: tuple) -> list:
+    """Ответ LLM -> рекомендации: пустой ответ заменяется рекомендациями по умолчанию, успешный кэшируется"""
+    if not recommendations:
+        ai_logger.warning("AI не вернула рекомендаций, используем рекомендации по умолчанию")
+        return _get_default_recommendations(burnout_level)
 
-        ai_logger.info(f"Calling AI endpoint: {ai_endpoint}")
+    ai_logger.info("Успешно получены %s рекомендаций от AI", len(recommendations))
+    recommendations_cache.set(cache_key, [dict(rec) for rec in recommendations])
+    return recommendations
 
-        response = requests.post(
-            ai_endpoint,
-            json=payload,
-            timeout=60
-        )
 
-        if response.status_code == 200:
-            data = response.json()
-            reply = data.get('reply', '')
+def _select_with_ai(metrics: dict) -> list:
+    """Один профиль — один запрос к LLM; пустой список, если ответа нет или его не удалось разобрать"""
+    ai_logger.info("Отправляю запрос на выбор рекомендаций для уровня %s. Итоговый балл: %s", metrics['burnout_level'], metrics['final_burnout_score'])
+
+    reply = _call_ai_chat(PROMPT_TEMPLATE.format(**metrics), json_schema=RECOMMENDATION_IDS_SCHEMA,
+                          max_tokens=RECOMMENDATIONS_MAX_TOKENS)
+    if not reply:
+        ai_logger.warning("AI вернула пустой ответ")
+        return []
+    return _parse_ai_response(reply)
+
+
+def _request_batch(keys: list, profiles: dict) -> dict:
+    """
+    Один запрос к LLM на несколько профилей: {cache_key: рекомендации} для профилей,
+    найденных в ответе. Пустой словарь — ответа нет или его не удалось разобрать.
+    """
+    lines = ''.join(f"{n}. {_PROFILE_LINE.format(**profiles[key])}\n" for n, key in enumerate(keys, start=1))
+    reply = _call_ai_chat(BATCH_PROMPT_TEMPLATE.format(profiles=lines), json_schema=RECOMMENDATION_BATCH_SCHEMA,
+                          max_tokens=RECOMMENDATIONS_MAX_TOKENS * len(keys))
+    if not reply:
+        ai_logger.warning("AI не ответила на пачку из %s профилей", len(keys))
+        return {}
+
+    ids_by_profile = _parse_batch_ids(reply)
+    results = {}
+    for n, key in enumerate(keys, start=1):
+        recommendations = _recommendations_from_ids(ids_by_profile.get(n) or [])
+        if recommendations:
+            results[key] = recommendations
+    if not results:
+        ai_logger.warning("Ответ AI на пачку из %s профилей не удалось разобрать", len(keys))
+    return results
+
+
+def _select_batch_with_ai(jobs: list) -> list:
+    """
+    Обработчик пачки для MicroBatcher: jobs — [(cache_key, metrics), ...].
+    Профили с одинаковым ключом кэша отправляются один раз. Если ответ не удалось
+    разобрать совсем, вся пачка считается неудачной (пустые списки — рекомендации
+    по умолчанию): повторные запросы к отказывающей LLM только увеличили бы нагрузку.
+    Профили, пропущенные в разобранном ответе, запрашиваются ещё раз одной пачкой.
+    """
+    profiles = {}
+    for cache_key, metrics in jobs:
+        profiles.setdefault(cache_key, metrics)
+    keys = list(profiles)
+
+    if len(keys) == 1:
+        result = _select_with_ai(profiles[keys[0]])
+        return [result for _ in jobs]
+
+    ai_logger.info("Отправляю пачку из %s профилей (%s диагностик) на выбор рекомендаций", len(keys), len(jobs))
+    results = _request_batch(keys, profiles)
+
+    missing = [key for key in keys if key not in results]
+    if results and missing:
+        ai_logger.info("В ответе на пачку нет %s профилей, запрашиваю их повторно одной пачкой", len(missing))
+        if len(missing) == 1:
+            results[missing[0]] = _select_with_ai(profiles[missing[0]])
+        else:
+            results.update(_request_batch(missing, profiles))
+
+    return [[dict(rec) for rec in results.get(cache_key, [])] for cache_key, _ in jobs]
+
+
+_recommendations_batcher = MicroBatcher(
+    _select_batch_with_ai,
+    max_batch=RECOMMENDATIONS_BATCH_SIZE,
+    window=RECOMMENDATIONS_BATCH_WINDOW,
+    name='recommendations-batch'
+)
+
+
+def _rank_locally(emotional_exhaustion: float, depersonalization: float,
+                  reduced_accomplishment: float, final_burnout_score: float,
+                  k: int = LOCAL_RANKER_TOP_K) -> list:
+    """Рекомендации локального ранжировщика (детерминированно, без сетевых вызовов)"""
+    ranked = _LOCAL_RANKER.top_k(emotional_exhaustion, depersonalization,
+                                 reduced_accomplishment, final_burnout_score, k=k)
+    return [_to_recommendation(rec) for rec in ranked]
+
+
+def _rank_with_bandit(burnout_level: str, department: str, emotional_exhaustion: float,
+                      depersonalization: float, reduced_accomplishment: float,
+                      final_burnout_score: float) -> list:
+    """Рекомендации из таблицы бандита сегмента; без накопленной статистики — локальный ранжировщик"""
+    recommendation_bandit.ensure_loaded()
+    ranking = recommendation_bandit.rank(burnout_level, department, k=LOCAL_RANKER_TOP_K)
+    if ranking is None:
+        ai_logger.info("Мало данных о выполнении для сегмента (%s, %s), используем локальное ранжирование", burnout_level, department)
+        return _rank_locally(emotional_exhaustion, depersonalization,
+                             reduced_accomplishment, final_burnout_score)
+    return [_to_recommendation(RECOMMENDATIONS_DB[i]) for i in ranking]
+
+
+def _rerank_with_ai(metrics: dict, cache_key: tuple) -> list:
+    """Короткий список от локального ранжировщика, переранжированный LLM; без ответа LLM — локальный top-k"""
+    shortlist = _LOCAL_RANKER.top_k(metrics['emotional_exhaustion'], metrics['depersonalization'],
+                                    metrics['reduced_accomplishment'], metrics['final_burnout_score'],
+                                    k=LOCAL_RERANK_SHORTLIST)
+    local_top = [_to_recommendation(rec) for rec in shortlist[:LOCAL_RANKER_TOP_K]]
+
+    catalog = ''.join(f"{rec['id']}: {rec['title']} ({rec['category']})\n" for rec in shortlist)
+    prompt = RERANK_PROMPT_TEMPLATE.format(catalog=catalog, **metrics)
+
+    reply = _call_ai_chat(prompt, json_schema=RECOMMENDATION_IDS_SCHEMA,
+                          max_tokens=RECOMMENDATIONS_MAX_TOKENS)
+    if not reply:
+        ai_logger.info("AI не ответила, используем локальное ранжирование")
+        return local_top
+
+    allowed = {rec['id'] for rec in shortlist}
+    reranked = []
+    for rec_id in _parse_recommendation_ids(reply):
+        rec = RECOMMENDATIONS_BY_ID.get(rec_id)
+        if rec_id in allowed and rec not in reranked:
+            reranked.append(rec)
+
+    if not reranked:
+        ai_logger.info("Ответ AI не содержит ID из короткого списка, используем локальное ранжирование")
+        return local_top
+
+    recommendations = [_to_recommendation(rec) for rec in reranked[:MAX_RECOMMENDATIONS]]
+    recommendations_cache.set(cache_key, [dict(rec) for rec in recommendations])
+    return recommendations
+
+
+def _call_ai_chat(message: str, json_schema: dict = None, max_tokens: int = None) -> str:
+    """Запрашивает ответ у LLM-провайдеров напрямую (без HTTP к /ai/chat)"""
+    try:
+        reply = complete(message, max_tokens=max_tokens, json_schema=json_schema)
+        if reply:
             ai_logger.info("Successfully got response from AI")
             return reply
-        else:
-            ai_logger.warning(f"AI endpoint returned status {response.status_code}")
-            return ""
+        ai_logger.warning("No LLM provider returned a reply")
+        return ""
 
     except Exception as e:
-        ai_logger.error(f"Error calling AI chat: {e}", exc_info=True)
+        ai_logger.error("Error calling AI chat: %s", e, exc_info=True)
         return ""
 
 
+def _parse_recommendation_ids(response: str) -> list:
+    """Извлекает список ID из JSON ответа: {"ids": [...]} или просто [...]"""
+    text = response.strip()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        match = _JSON_PATTERN.search(text)
+        if not match:
+            return []
+        try:
+            data = json.loads(match.group(0))
+        except ValueError:
+            return []
+
+    if isinstance(data, dict):
+        data = data.get('ids')
+    return _coerce_ids(data)
+
+
+def _coerce_ids(values) -> list:
+    """Целые ID из списка значений ответа (нечисловые пропускаются)"""
+    if not isinstance(values, list):
+        return []
+
+    ids = []
+    for value in values:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def _parse_batch_ids(response: str) -> dict:
+    """Разбирает ответ на пачку: {"results": [{"profile": N, "ids": [...]}, ...]} -> {N: [ID, ...]}"""
+    text = response.strip()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        match = _JSON_PATTERN.search(text)
+        if not match:
+            return {}
+        try:
+            data = json.loads(match.group(0))
+        except ValueError:
+            return {}
+
+    if isinstance(data, dict):
+        data = data.get('results')
+    if not isinstance(data, list):
+        return {}
+
+    ids_by_profile = {}
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        try:
+            profile = int(item.get('profile'))
+        except (TypeError, ValueError):
+            continue
+        ids_by_profile.setdefault(profile, _coerce_ids(item.get('ids')))
+    return ids_by_profile
+
+
+def _recommendations_from_ids(ids: list) -> list:
+    """Элементы каталога по списку ID (без повторов и неизвестных ID)"""
+    matched = []
+    for rec_id in ids:
+        rec = RECOMMENDATIONS_BY_ID.get(rec_id)
+        if rec is not None and rec not in matched:
+            matched.append(rec)
+    return [_to_recommendation(rec) for rec in matched[:MAX_RECOMMENDATIONS]]
+
+
+def _to_recommendation(rec: dict) -> dict:
+    return {
+        'category': rec['category'],
+        'title': rec['title'],
+        'description': rec['description'],
+        'priority': _get_priority(rec['title']),
+        'duration': _get_duration(rec['category']),
+    }
+
+
 def _parse_ai_response(response: str) -> list:
-    """Парсит ответ от AI в формате списка рекомендаций"""
+    """
+    Парсит ответ от AI: JSON со списком ID, проверенных по каталогу.
+    Если модель ответила текстом, названия сопоставляются через индекс каталога.
+    """
     try:
-        recommendations = []
-        lines = response.strip().split('\n')
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-
-            if line[0].isdigit() and '.' in line[:3]:
-                line = line.split('.', 1)[1].strip()
-
-            if line:
-                matched_rec = None
-                for rec in RECOMMENDATIONS_DB:
-                    if rec['title'].lower() in line.lower() or line.lower() in rec['title'].lower():
-                        matched_rec = rec
-                        break
-
-                if matched_rec:
-                    recommendations.append({
-                        'category': matched_rec['category'],
-                        'title': matched_rec['title'],
-                        'description': matched_rec['description'],
-                        'priority': _get_priority(matched_rec['title']),
-                        'duration': _get_duration(matched_rec['category']),
-                    })
-
-        return recommendations
+        recommendations = _recommendations_from_ids(_parse_recommendation_ids(response))
+        if recommendations:
+            return recommendations
+
+        matched = _TITLE_MATCHER.match_text(response)
+        return [_to_recommendation(rec) for rec in matched[:MAX_RECOMMENDATIONS]]
 
     except Exception as e:
-        ai_logger.error(f"Error parsing AI response: {e}", exc_info=True)
+        ai_logger.error("Error parsing AI response: %s", e, exc_info=True)
         return []
 
 
@@ -446,10 +799,12 @@ def _get_default_recommendations(burnout_level: str) -> list:
         ],
     }
 
-    result = defaults.get(burnout_level, defaults['medium'])
+    # Копии: общие словари RECOMMENDATIONS_DB не изменяются
+    return [
+        {**rec, 'priority': _get_priority(rec['title']), 'duration': _get_duration(rec['category'])}
+        for rec in defaults.get(burnout_level, defaults['medium'])
+    ]
 
-    for rec in result:
-        rec['priority'] = _get_priority(rec['title'])
-        rec['duration'] = _get_duration(rec['category'])
 
-    return result
+_LOCAL_RANKER = LocalRanker(RECOMMENDATIONS_DB, priority_fn=_get_priority)
+recommendation_bandit = RecommendationBandit([rec['title'] for rec in RECOMMENDATIONS_DB])
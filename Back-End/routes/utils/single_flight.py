@@ -0,0 +1,75 @@
+"""
+Single-flight: параллельные вызовы с одинаковым ключом ждут один общий вызов функции
+"""
+import threading
+import weakref
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Объединение одновременных одинаковых запросов в один вызов"""
+
+    instances = weakref.WeakSet()  # все экземпляры процесса (для метрик)
+
+    def __init__(self, name: str = 'single_flight'):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        SingleFlight.instances.add(self)
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Выполнить fn(*args, **kwargs), если вызова с таким ключом сейчас нет,
+        иначе дождаться результата уже идущего вызова.
+
+        Returns:
+            tuple: (результат, shared) — shared=True, если результат получен от чужого вызова
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.calls += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.result, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'name': self.name,
+                'calls': self.calls,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls),
+            }
@@ -0,0 +1,109 @@
+"""
+Индекс названий каталога рекомендаций для разбора ответов LLM.
+
+Строится один раз: точные совпадения ищутся по словарю кортежей токенов
+(окна строки длиной с название), нечёткие — по инвертированному индексу
+основ слов с весами IDF и порогом схожести (взвешенный коэффициент Дайса).
+"""
+import math
+import re
+from collections import defaultdict
+
+STOP_WORDS = {'и', 'в', 'во', 'на', 'по', 'с', 'со', 'за', 'к', 'ко', 'от', 'до', 'а', 'но', 'или', 'о', 'об'}
+STEM_LENGTH = 5
+
+_NON_WORD = re.compile(r'[^\w%]+')
+_LIST_MARKER = re.compile(r'^\s*(?:\d{1,2}\s*[.)]|[-*•–—])\s*')
+
+
+def normalize_tokens(text: str) -> list:
+    """Токены в нижнем регистре, ё -> е, без пунктуации и стоп-слов"""
+    text = text.lower().replace('ё', 'е')
+    return [t for t in _NON_WORD.sub(' ', text).split() if t not in STOP_WORDS]
+
+
+def _stem(token: str) -> str:
+    return token[:STEM_LENGTH]
+
+
+class TitleMatcher:
+    """Сопоставление строк ответа LLM с элементами каталога по названию"""
+
+    def __init__(self, entries: list, threshold: float = 0.6):
+        self.entries = entries
+        self.threshold = threshold
+        self._exact = {}
+        self._window_sizes = set()
+        self._postings = defaultdict(set)
+        self._entry_stems = []
+
+        for index, entry in enumerate(entries):
+            tokens = tuple(normalize_tokens(entry['title']))
+            if not tokens:
+                self._entry_stems.append(frozenset())
+                continue
+            self._exact.setdefault(tokens, index)
+            self._window_sizes.add(len(tokens))
+
+            stems = frozenset(_stem(t) for t in tokens)
+            self._entry_stems.append(stems)
+            for stem in stems:
+                self._postings[stem].add(index)
+
+        total = max(len(entries), 1)
+        self._idf = {stem: math.log(1 + total / len(ids)) for stem, ids in self._postings.items()}
+        self._entry_weight = [sum(self._idf[s] for s in stems) for stems in self._entry_stems]
+        self._window_sizes = sorted(self._window_sizes, reverse=True)
+
+    def _exact_match(self, tokens: list):
+        for size in self._window_sizes:
+            for start in range(len(tokens) - size + 1):
+                index = self._exact.get(tuple(tokens[start:start + size]))
+                if index is not None:
+                    return index
+        return None
+
+    def _fuzzy_match(self, tokens: list):
+        stems = {_stem(t) for t in tokens}
+        known = [s for s in stems if s in self._postings]
+        if not known:
+            return None, 0.0
+
+        # Неизвестные каталогу слова тоже входят в вес строки: случайные
+        # совпадения одного общего слова не проходят порог
+        line_weight = sum(self._idf.get(s, math.log(1 + len(self.entries))) for s in stems)
+        common = defaultdict(float)
+        for stem in known:
+            for index in self._postings[stem]:
+                common[index] += self._idf[stem]
+
+        best_index, best_score = None, 0.0
+        for index, weight in common.items():
+            score = 2 * weight / (line_weight + self._entry_weight[index])
+            if score > best_score or (score == best_score and index < best_index):
+                best_index, best_score = index, score
+        return best_index, best_score
+
+    def match_line(self, line: str):
+        """Лучший элемент каталога для строки или None, если схожесть ниже порога"""
+        tokens = normalize_tokens(_LIST_MARKER.sub('', line))
+        if not tokens:
+            return None
+
+        index = self._exact_match(tokens)
+        if index is None:
+            index, score = self._fuzzy_match(tokens)
+            if score < self.threshold:
+                return None
+        return self.entries[index]
+
+    def match_text(self, text: str) -> list:
+        """Элементы каталога для каждой строки текста (без повторов, в порядке появления)"""
+        matched = []
+        seen = set()
+        for line in text.splitlines():
+            entry = self.match_line(line)
+            if entry is not None and id(entry) not in seen:
+                seen.add(id(entry))
+                matched.append(entry)
+        return matched
@@ -0,0 +1,366 @@
+"""
+Трассировка запросов: span'ы по этапам обработки, SQL запросам и вызовам LLM.
+
+Трассируется доля TRACING_SAMPLE_RATE запросов; выбранный запрос с заголовком
+W3C traceparent продолжает трассу вызывающей стороны. Запрос с флагом sampled в
+traceparent трассируется всегда только при TRACING_TRUST_TRACEPARENT=true.
+Ответ трассированного запроса содержит заголовок Server-Timing с длительностью
+этапов (span'ов первого уровня), суммарным временем SQL и LLM — его видно во
+вкладке Network инструментов разработчика браузера.
+
+Готовые трассы экспортирует фоновый поток в формате OTLP/JSON:
+    TRACING_EXPORTER=file — строка ExportTraceServiceRequest на трассу в TRACING_FILE
+    TRACING_EXPORTER=otlp — POST в TRACING_OTLP_ENDPOINT (OTLP/HTTP, JSON)
+    TRACING_EXPORTER=none — только Server-Timing
+
+Вне трассированного запроса span() ничего не делает.
+"""
+import atexit
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+from ..data.logger import LOG_DIR, app_logger
+
+TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE', '0'))
+# Доверять флагу sampled входящего traceparent (только за своим шлюзом/прокси):
+# иначе любой клиент мог бы включить трассировку каждого своего запроса
+TRACING_TRUST_TRACEPARENT = os.getenv('TRACING_TRUST_TRACEPARENT', 'false').lower() in ('1', 'true', 'yes')
+TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', 'file').lower()
+TRACING_FILE = os.getenv('TRACING_FILE', os.path.join(LOG_DIR, 'traces.jsonl'))
+TRACING_OTLP_ENDPOINT = os.getenv('TRACING_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+TRACING_SERVICE_NAME = os.getenv('TRACING_SERVICE_NAME', 'burnout-backend')
+TRACING_QUEUE_SIZE = int(os.getenv('TRACING_QUEUE_SIZE', '1000'))
+
+# Коды видов span'ов OTLP
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'kind', 'start_ns', 'end_ns',
+                 'attributes', 'error', 'trace')
+
+    def __init__(self, name, trace, parent_id=None, kind=KIND_INTERNAL, attributes=None):
+        self.name = name
+        self.trace = trace
+        self.trace_id = trace.trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.trace.spans.append(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+class _Trace:
+    """Span'ы одной трассы, завершённые в текущем процессе (list.append потокобезопасен)"""
+
+    __slots__ = ('trace_id', 'spans')
+
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.spans = []
+
+
+_current = contextvars.ContextVar('tracing_span', default=None)
+
+
+def current_span():
+    return _current.get()
+
+
+def current_context():
+    """(trace_id, span_id) текущего span'а для продолжения трассы в другом потоке"""
+    span_ = _current.get()
+    return (span_.trace_id, span_.span_id) if span_ is not None else None
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes):
+    """Дочерний span текущей трассы; вне трассы — без накладных расходов (yield None)"""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(name, parent.trace, parent.span_id, kind, attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.error = repr(e)
+        raise
+    finally:
+        _current.reset(token)
+        child.end()
+
+
+def start_trace(name: str, context=None, kind: int = KIND_SERVER, **attributes):
+    """Корневой span (новая трасса или продолжение context=(trace_id, parent_span_id)); вернуть (span, token)"""
+    trace_id, parent_id = context if context else (None, None)
+    root = Span(name, _Trace(trace_id), parent_id, kind, attributes)
+    return root, _current.set(root)
+
+
+def finish_trace(root: Span, token=None):
+    """Завершить корневой span и отправить span'ы трассы на экспорт"""
+    if token is not None:
+        _current.reset(token)
+    root.end()
+    _export(root.trace.spans)
+    return root.trace.spans
+
+
+@contextmanager
+def continue_trace(context, name: str, **attributes):
+    """Продолжить трассу из другого потока (например, фоновая задача запроса)"""
+    if context is None:
+        yield None
+        return
+    root, token = start_trace(name, context, KIND_INTERNAL, **attributes)
+    try:
+        yield root
+    except Exception as e:
+        root.error = repr(e)
+        raise
+    finally:
+        finish_trace(root, token)
+
+
+def parse_traceparent(header: str):
+    """(trace_id, parent_id, sampled) из заголовка W3C traceparent или None"""
+    parts = (header or '').strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+
+def should_sample() -> bool:
+    return TRACING_SAMPLE_RATE > 0 and random.random() < TRACING_SAMPLE_RATE
+
+
+# --- Server-Timing ---------------------------------------------------------
+
+def _metric_name(name: str) -> str:
+    return ''.join(c if c.isalnum() or c in '._-' else '_' for c in name)
+
+
+def server_timing(root: Span, spans: list) -> str:
+    """
+    Заголовок Server-Timing: этапы первого уровня (одноимённые суммируются),
+    SQL (db) и LLM (llm) по всем span'ам трассы, общее время (total)
+    """
+    stages = {}
+    totals = {'db': [0.0, 0], 'llm': [0.0, 0]}
+    for item in spans:
+        prefix = item.name.split('.', 1)[0]
+        if prefix in totals:
+            totals[prefix][0] += item.duration_ms
+            totals[prefix][1] += 1
+        elif item.parent_id == root.span_id:
+            stage = stages.setdefault(item.name, [0.0, 0])
+            stage[0] += item.duration_ms
+            stage[1] += 1
+
+    entries = []
+    for name, (duration, count) in stages.items():
+        entry = f'{_metric_name(name)};dur={duration:.2f}'
+        if count > 1:
+            entry += f';desc="x{count}"'
+        entries.append(entry)
+    for name, (duration, count) in totals.items():
+        if count:
+            entries.append(f'{name};dur={duration:.2f};desc="{count} calls"')
+    entries.append(f'total;dur={root.duration_ms:.2f}')
+    return ', '.join(entries)
+
+
+# --- Экспорт ---------------------------------------------------------------
+
+def _attribute(key, value) -> dict:
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+def to_otlp(spans: list) -> dict:
+    """ExportTraceServiceRequest (OTLP/JSON)"""
+    return {'resourceSpans': [{
+        'resource': {'attributes': [_attribute('service.name', TRACING_SERVICE_NAME)]},
+        'scopeSpans': [{
+            'scope': {'name': __name__},
+            'spans': [{
+                'traceId': item.trace_id,
+                'spanId': item.span_id,
+                **({'parentSpanId': item.parent_id} if item.parent_id else {}),
+                'name': item.name,
+                'kind': item.kind,
+                'startTimeUnixNano': str(item.start_ns),
+                'endTimeUnixNano': str(item.end_ns),
+                'attributes': [_attribute(k, v) for k, v in item.attributes.items() if v is not None],
+                'status': {'code': 2, 'message': item.error} if item.error else {},
+            } for item in spans],
+        }],
+    }]}
+
+
+class _Exporter:
+    """Очередь готовых трасс и фоновый поток записи; при переполнении трассы отбрасываются"""
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self._queue = queue.Queue(TRACING_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._session = requests.Session() if mode == 'otlp' else None
+        self.dropped = 0
+
+    def submit(self, spans: list):
+        if self.mode not in ('file', 'otlp'):
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(list(spans))
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='tracing-export', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                app_logger.warning("Не удалось экспортировать %s трасс: %s", len(batch), e)
+
+    def _write(self, batch: list):
+        if self.mode == 'file':
+            with open(TRACING_FILE, 'a', encoding='utf-8') as f:
+                for spans in batch:
+                    f.write(json.dumps(to_otlp(spans), ensure_ascii=False) + '\n')
+        else:
+            spans = [item for trace_spans in batch for item in trace_spans]
+            self._session.post(TRACING_OTLP_ENDPOINT, json=to_otlp(spans), timeout=5)
+
+    def flush(self, timeout: float = 2.0):
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+exporter = _Exporter(TRACING_EXPORTER)
+
+
+def _export(spans: list):
+    exporter.submit(spans)
+
+
+atexit.register(exporter.flush)
+
+
+# --- Flask и SQLAlchemy ----------------------------------------------------
+
+def init_tracing(app):
+    """Трассировка запросов приложения и SQL запросов"""
+    from flask import g, request
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @app.before_request
+    def _start_request_trace():
+        incoming = parse_traceparent(request.headers.get('traceparent'))
+        if incoming is not None and incoming[2] and TRACING_TRUST_TRACEPARENT:
+            context = incoming[:2]
+        elif should_sample():
+            # Выбранный по TRACING_SAMPLE_RATE запрос продолжает трассу вызывающей стороны
+            context = incoming[:2] if incoming is not None else None
+        else:
+            return
+        rule = request.url_rule.rule if request.url_rule is not None else request.path
+        g.trace_root, g.trace_token = start_trace(
+            f'{request.method} {rule}', context,
+            **{'http.method': request.method, 'http.route': rule},
+        )
+
+    @app.after_request
+    def _finish_request_trace(response):
+        root = g.pop('trace_root', None)
+        if root is None:
+            return response
+        root.set('http.status_code', response.status_code)
+        spans = finish_trace(root, g.pop('trace_token', None))
+        response.headers['Server-Timing'] = server_timing(root, spans)
+        response.headers['Timing-Allow-Origin'] = '*'
+        response.headers['traceparent'] = f'00-{root.trace_id}-{root.span_id}-01'
+        return response
+
+    @app.teardown_request
+    def _reset_trace(exc):
+        # Ответ не сформирован (исключение вне обработчиков): трассу всё равно экспортируем
+        root = g.pop('trace_root', None)
+        if root is not None:
+            root.error = repr(exc) if exc else None
+            finish_trace(root, g.pop('trace_token', None))
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _start_query_span(conn, cursor, statement, parameters, context, executemany):
+        parent = _current.get()
+        if parent is None:
+            return
+        operation = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else 'query'
+        query_span = Span(f'db.{operation}', parent.trace, parent.span_id, KIND_CLIENT,
+                          {'db.statement': statement[:500]})
+        conn.info.setdefault('trace_spans', []).append(query_span)
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _end_query_span(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get('trace_spans')
+        if spans:
+            spans.pop().end()
+
+    @event.listens_for(Engine, 'handle_error')
+    def _fail_query_span(context):
+        spans = context.connection.info.get('trace_spans') if context.connection is not None else None
+        if spans:
+            query_span = spans.pop()
+            query_span.error = repr(context.original_exception)
+            query_span.end()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Тесты запускаются из Back-End: `python -m pytest tests`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,33 @@
+"""Локальный ранжировщик: выбор зависит и от соотношения шкал, и от тяжести выгорания"""
+from routes.utils.local_ranker import LocalRanker
+from routes.utils.recommendations_selector import RECOMMENDATIONS_DB, _get_priority
+
+RANKER = LocalRanker(RECOMMENDATIONS_DB, priority_fn=_get_priority)
+
+
+def _titles(*profile):
+    return [rec['title'] for rec in RANKER.top_k(*profile, k=6)]
+
+
+def test_severity_changes_top_k():
+    low = _titles(0.1, 0.1, 0.1, 0.1)
+    high = _titles(0.9, 0.9, 0.9, 0.9)
+    assert low != high
+
+
+def test_high_burnout_prefers_high_priority():
+    def share_high(titles):
+        return sum(_get_priority(title) == 'high' for title in titles)
+
+    assert share_high(_titles(0.9, 0.9, 0.9, 0.9)) > share_high(_titles(0.1, 0.1, 0.1, 0.1))
+
+
+def test_profile_direction_still_matters():
+    assert _titles(0.9, 0.2, 0.2, 0.4) != _titles(0.2, 0.9, 0.2, 0.4)
+
+
+def test_deterministic_and_group_limit():
+    titles = _titles(0.6, 0.4, 0.7, 0.5)
+    assert titles == _titles(0.6, 0.4, 0.7, 0.5)
+    groups = [RANKER.groups[i] for i, rec in enumerate(RANKER.entries) if rec['title'] in titles]
+    assert all(groups.count(group) <= RANKER.max_per_group for group in groups)
@@ -48,6 +48,12 @@ class ApiService {
                 throw new Error('Unauthorized');
             }
 
+            // Сервер выдал новый токен (изменился профиль) — подменяем сохранённый
+            const freshToken = response.headers.get('X-Access-Token');
+            if (freshToken) {
+                localStorage.setItem('token', freshToken);
+            }
+
             // Обработка других HTTP ошибок
             if (!response.ok) {
                 const errorData = await response.json().catch(() => ({}));